@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import UserModel, EmailVerificationModel, BlacklistedAccessTokenModel
+from .models import UserModel, EmailVerificationModel, BlacklistedAccessTokenModel, OutgoingEmailModel
 
 
 @admin.register(UserModel)
@@ -66,3 +66,11 @@ class UserAdmin(BaseUserAdmin):
 
 admin.site.register(EmailVerificationModel)
 admin.site.register(BlacklistedAccessTokenModel)
+
+
+@admin.register(OutgoingEmailModel)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("id", "subject", "recipients", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject",)
+    ordering = ("-created_at",)
@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.cache import cache_is_shared
+
+from .models import BlacklistedAccessTokenModel
+
+VERSION_KEY = "access_blacklist:version"
+# Re-read rows created shortly before the last sync so a row committed
+# after a concurrent sync started is not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def new_version():
+    # Not a plain 0: a re-created key must never match a version some
+    # process already synced against
+    return time.time_ns()
+
+
+class AccessTokenBlacklist:
+    """
+    Per-process copy of the blacklisted access token jtis.
+
+    Every lookup reads a version number from the shared cache; the database
+    is only queried when another process has blacklisted a token since the
+    last sync, and then only for the rows added since. Entries are dropped
+    once the token would have expired anyway.
+
+    Without a shared cache a version bump never reaches the other processes,
+    so every lookup goes to the database (jti is unique, hence indexed).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = None
+        self._synced_at = None
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, new_version(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _sync(self, version):
+        now = timezone.now()
+        rows = BlacklistedAccessTokenModel.objects.filter(expires_at__gt=now)
+        if self._synced_at is not None:
+            rows = rows.filter(created_at__gte=self._synced_at - SYNC_OVERLAP)
+        self._entries.update(rows.values_list("jti", "expires_at"))
+        self._entries = {jti: expires_at for jti, expires_at in self._entries.items() if expires_at > now}
+        self._synced_at = now
+        self._version = version
+
+    def is_blacklisted(self, jti):
+        if not cache_is_shared():
+            return BlacklistedAccessTokenModel.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+        version = self._current_version()
+        with self._lock:
+            if version is None or version != self._version:
+                self._sync(version)
+            expires_at = self._entries.get(jti)
+        return expires_at is not None and expires_at > timezone.now()
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+            self._version = None
+            self._synced_at = None
+
+
+access_token_blacklist = AccessTokenBlacklist()
+
+
+def blacklist_access_token(token):
+    """Blacklist an access token until it expires and notify all processes."""
+    access = token if isinstance(token, AccessToken) else AccessToken(token)
+    entry, _ = BlacklistedAccessTokenModel.objects.get_or_create(
+        jti=access["jti"],
+        defaults={"expires_at": datetime.fromtimestamp(access["exp"], tz=dt_timezone.utc)},
+    )
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, new_version(), None)
+    return entry
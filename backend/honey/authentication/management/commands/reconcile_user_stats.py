@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from authentication.models import UserModel
+from authentication.stats import compute_user_stats, save_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's stats row from the books, chats and messages tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        user_ids = UserModel.objects.order_by("id").values_list("id", flat=True)
+        done = 0
+        last_id = None
+        while True:
+            batch = user_ids.filter(id__gt=last_id) if last_id else user_ids
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            save_user_stats(compute_user_stats(batch))
+            done += len(batch)
+            last_id = batch[-1]
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Reconciled {done} users")
+        self.stdout.write(f"Reconciled stats for {done} users")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from authentication.outbox import MAX_ATTEMPTS, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox over a single reused SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Poll the outbox every N seconds. 0 drains it once and exits.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        while True:
+            sent, failed = drain_outbox(options["batch_size"], options["max_attempts"], connection)
+            if sent or failed or not options["interval"]:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -1,15 +1,21 @@
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.translation import gettext_lazy as _
-from .models import BlacklistedAccessTokenModel
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from .blacklist import access_token_blacklist
 
 
 class BlacklistAccessTokenMiddleware(MiddlewareMixin):
     def process_request(self, request):
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
-            access_token = auth_header.split(' ')[1]
-            if BlacklistedAccessTokenModel.objects.filter(token=access_token).exists():
+            try:
+                access = AccessToken(auth_header.split(' ')[1])
+            except TokenError:
+                # Invalid or expired tokens are rejected by the authentication class
+                return None
+            if access_token_blacklist.is_blacklisted(access['jti']):
                 return JsonResponse(
                     data={'detail': _('Access token in blacklist, re-login')},
                     status=401
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 18:40
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def token_to_jti(apps, schema_editor):
+    BlacklistedAccessTokenModel = apps.get_model('authentication', 'BlacklistedAccessTokenModel')
+    undecodable = []
+    for row in BlacklistedAccessTokenModel.objects.iterator():
+        try:
+            access = AccessToken(row.token, verify=False)
+            row.jti = access['jti']
+            row.expires_at = datetime.fromtimestamp(access['exp'], tz=timezone.utc)
+        except (TokenError, KeyError):
+            undecodable.append(row.pk)
+            continue
+        row.save(update_fields=['jti', 'expires_at'])
+    BlacklistedAccessTokenModel.objects.filter(pk__in=undecodable).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blacklistedaccesstokenmodel',
+            name='jti',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='blacklistedaccesstokenmodel',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(token_to_jti, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='blacklistedaccesstokenmodel',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='blacklistedaccesstokenmodel',
+            name='jti',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='blacklistedaccesstokenmodel',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='blacklistedaccesstokenmodel',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
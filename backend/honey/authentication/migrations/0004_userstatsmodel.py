@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_outgoingemailmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStatsModel',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('books_downloaded', models.IntegerField(default=0)),
+                ('books_read', models.IntegerField(default=0)),
+                ('chats_count', models.IntegerField(default=0)),
+                ('messages_sent', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Stats',
+                'verbose_name_plural': 'User Stats',
+                'db_table': 'user_stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_userstatsmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
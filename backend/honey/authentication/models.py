@@ -13,6 +13,12 @@ VerificationTypes = (
     (3, "PASSWORD_RESET"),
 )
 
+EmailStatuses = (
+    (1, "PENDING"),
+    (2, "SENT"),
+    (3, "FAILED"),
+)
+
 
 class UserModel(AbstractUser, BaseModel):
     username = models.CharField(max_length=150, unique=True, blank=False, null=False)
@@ -20,6 +26,7 @@ class UserModel(AbstractUser, BaseModel):
     phone = models.CharField(max_length=20, validators=[validate_phone_number], unique=True)
     google = models.CharField(max_length=255, blank=True, null=True)
     avatar = models.ImageField(upload_to='users/avatars/', null=True, blank=True)
+    avatar_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     bio = models.TextField(null=True, blank=True)
 
     is_verified = models.BooleanField(default=False)
@@ -55,13 +62,55 @@ class EmailVerificationModel(BaseModel):
 
 
 class BlacklistedAccessTokenModel(BaseModel):
-    token = models.CharField(max_length=1000, unique=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return str(self.id)
+        return self.jti
 
     class Meta:
         db_table = 'blacklisted_access_token'
         verbose_name = 'Blacklisted Access Token'
         verbose_name_plural = 'Blacklisted Access Tokens'
+
+
+class OutgoingEmailModel(BaseModel):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.IntegerField(choices=EmailStatuses, default=1)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{', '.join(self.recipients)} - {self.subject}"
+
+    class Meta:
+        db_table = 'outgoing_email'
+        verbose_name = 'Outgoing Email'
+        verbose_name_plural = 'Outgoing Emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+
+
+class UserStatsModel(models.Model):
+    # Keyed by user so the profile stats are a single primary-key read
+    user = models.OneToOneField(UserModel, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    books_downloaded = models.IntegerField(default=0)
+    books_read = models.IntegerField(default=0)
+    chats_count = models.IntegerField(default=0)
+    messages_sent = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.user_id)
+
+    class Meta:
+        db_table = 'user_stats'
+        verbose_name = 'User Stats'
+        verbose_name_plural = 'User Stats'
@@ -0,0 +1,164 @@
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import OutgoingEmailModel
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENT, FAILED = 1, 2, 3
+# A claimed email becomes due again after this long, so a crashed worker
+# doesn't lose it; a live worker finishes its batch well before that
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+MAX_ATTEMPTS = 5
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_emails(batch_size):
+    """Lock a batch of due emails for this sender; other senders skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmailModel.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        OutgoingEmailModel.objects.filter(id__in=[email.id for email in batch]).update(
+            next_attempt_at=now + CLAIM_TIMEOUT
+        )
+    return batch
+
+
+def send_emails(connection, batch, max_attempts=MAX_ATTEMPTS):
+    """Send a claimed batch over one SMTP connection; returns (sent, failed)."""
+    sent = failed = 0
+    for email in batch:
+        message = EmailMessage(
+            email.subject, email.body, email.from_email, email.recipients, connection=connection,
+        )
+        email.attempts += 1
+        try:
+            # No-op while the session is still open
+            connection.open()
+            message.send()
+        except Exception as e:
+            # The session may be broken; reconnect for the next email
+            connection.close()
+            email.last_error = str(e)
+            if email.attempts >= max_attempts:
+                email.status = FAILED
+                failed += 1
+            else:
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            logger.warning(f"Email {email.id} failed (attempt {email.attempts}): {e}")
+        else:
+            email.status = SENT
+            email.sent_at = timezone.now()
+            sent += 1
+
+    OutgoingEmailModel.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, failed
+
+
+def drain_outbox(batch_size=50, max_attempts=MAX_ATTEMPTS, connection=None):
+    """Send every due email; returns (sent, failed)."""
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        while True:
+            batch = claim_emails(batch_size)
+            if not batch:
+                break
+            batch_sent, batch_failed = send_emails(connection, batch, max_attempts)
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        # Don't hold the SMTP session open while the outbox is idle
+        connection.close()
+    return sent, failed
+
+
+def next_retry_at():
+    return (
+        OutgoingEmailModel.objects.filter(status=PENDING)
+        .order_by("next_attempt_at").values_list("next_attempt_at", flat=True).first()
+    )
+
+
+class OutboxDrainer:
+    """
+    Per-process sender for when there is no send_queued_emails worker
+    (EMAIL_OUTBOX_WORKER off).
+
+    At most one drain thread runs per process; wakes that arrive during a
+    drain make it go round once more instead of starting another thread.
+    After a drain a timer is set for the earliest email still pending, so
+    retries go out on time even if nothing else is queued.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._again = False
+        self._timer = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is not None:
+                self._again = True
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _drain(self):
+        """Drain the outbox; returns when it should be drained next, if ever."""
+        try:
+            drain_outbox()
+            return next_retry_at()
+        except Exception:
+            logger.exception("Could not send queued emails")
+            return timezone.now() + timedelta(seconds=RETRY_BASE_DELAY)
+
+    def _run(self):
+        try:
+            while True:
+                due = self._drain()
+                with self._lock:
+                    if self._again:
+                        self._again = False
+                        continue
+                    self._thread = None
+                    if due is not None:
+                        delay = max((due - timezone.now()).total_seconds(), 0)
+                        self._timer = threading.Timer(delay, self.wake)
+                        self._timer.daemon = True
+                        self._timer.start()
+                    return
+        finally:
+            # The thread's own database connection
+            db_connection.close()
+
+
+outbox_drainer = OutboxDrainer()
+
+
+def send_soon():
+    """Drain the outbox from this process once the queuing transaction commits."""
+    transaction.on_commit(outbox_drainer.wake)
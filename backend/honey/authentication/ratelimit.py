@@ -0,0 +1,84 @@
+import hashlib
+import math
+import time
+
+from django.core.cache import cache
+
+
+def client_ip(request):
+    # The proxy in front of Daphne appends the address it saw, so the last
+    # X-Forwarded-For entry is the one a client can't forge
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class SlidingWindowLimiter:
+    """
+    Counts hits per identity (email, username, IP, ...) in the Django cache.
+
+    The sliding window is approximated from two fixed windows: the previous
+    window's count is weighted by how much of it still overlaps the sliding
+    one. Once the limit is reached the identity is blocked for `block`
+    seconds, whatever happens to the counters meanwhile.
+    """
+
+    def __init__(self, scope, limit, window, block=None):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.block = block or window
+
+    def _key(self, identity, suffix):
+        digest = hashlib.sha256(str(identity).lower().encode()).hexdigest()[:32]
+        return f"ratelimit:{self.scope}:{digest}:{suffix}"
+
+    def _count(self, identity, now):
+        index = int(now // self.window)
+        counts = cache.get_many([self._key(identity, index - 1), self._key(identity, index)])
+        overlap = 1 - (now % self.window) / self.window
+        return (counts.get(self._key(identity, index - 1), 0) * overlap
+                + counts.get(self._key(identity, index), 0))
+
+    def blocked_for(self, *identities):
+        """Seconds until every identity may try again; 0 if none is blocked."""
+        now = time.time()
+        keys = [self._key(identity, "block") for identity in identities if identity]
+        until = max(cache.get_many(keys).values(), default=0)
+        return max(0, math.ceil(until - now))
+
+    def hit(self, *identities):
+        """Record one hit; returns the seconds blocked for if this reached the limit."""
+        now = time.time()
+        index = int(now // self.window)
+        blocked = 0
+        for identity in filter(None, identities):
+            key = self._key(identity, index)
+            # Kept for two windows so it can still serve as the previous one
+            cache.add(key, 0, self.window * 2)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, self.window * 2)
+            if self._count(identity, now) >= self.limit:
+                cache.set(self._key(identity, "block"), now + self.block, self.block)
+                blocked = self.block
+        return blocked
+
+    def reset(self, *identities):
+        now = time.time()
+        index = int(now // self.window)
+        cache.delete_many([
+            self._key(identity, suffix)
+            for identity in identities if identity
+            for suffix in (index - 1, index, "block")
+        ])
+
+
+# Failed logins per account
+login_limiter = SlidingWindowLimiter("login", limit=5, window=15 * 60)
+# Failed logins and verifications per client address, across accounts
+auth_ip_limiter = SlidingWindowLimiter("auth-ip", limit=50, window=15 * 60)
+# Verification emails per address, counted whether or not they succeed
+resend_limiter = SlidingWindowLimiter("resend", limit=3, window=10 * 60)
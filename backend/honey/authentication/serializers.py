@@ -1,18 +1,23 @@
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
-from authentication.models import UserModel, BlacklistedAccessTokenModel, EmailVerificationModel
-from authentication.utils import send_verification_email, generate_expiry_time
+from authentication.models import UserModel, BlacklistedAccessTokenModel
+from core.images import RenditionsField
+from authentication.utils import create_verification
 from authentication.validators import validate_tokens, validate_password_uppercase
 from django.contrib.auth import authenticate
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken
 
 
 class UserSerializer(serializers.ModelSerializer):
+    avatar_renditions = RenditionsField("avatar")
+
     class Meta:
         model = UserModel
-        fields = ("id", "username", "email", "phone", "is_verified", "avatar", "is_superuser", "is_staff")
+        fields = ("id", "username", "email", "phone", "is_verified", "avatar", "avatar_renditions", "is_superuser",
+                  "is_staff")
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -45,12 +50,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         raw_password = validated_data.pop("password")
         validated_data["password"] = make_password(raw_password)
         user = super().create(validated_data)
-        verification = EmailVerificationModel.objects.create(
-            user=user,
-            type=1,
-            expires_at=generate_expiry_time()
-        )
-        send_verification_email(user, verification.code)
+        create_verification(user, type=1)
         return user
 
     def validate_email(self, value):
@@ -89,6 +89,10 @@ class EmailVerifySerializer(serializers.Serializer):
     code = serializers.IntegerField(required=True, help_text="Verification code")
 
 
+class ResendVerificationSerializer(serializers.Serializer):
+    email = serializers.EmailField(required=True, help_text="User email address")
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField(required=True)
     password = serializers.CharField(required=True, write_only=True)
@@ -130,7 +134,7 @@ class LogoutSerializer(serializers.Serializer):
 
         refresh_blacklisted = BlacklistedToken.objects.filter(token__token=refresh_token).exists()
 
-        access_blacklisted = BlacklistedAccessTokenModel.objects.filter(token=access_token).exists()
+        access_blacklisted = BlacklistedAccessTokenModel.objects.filter(jti=AccessToken(access_token)['jti']).exists()
 
         if refresh_blacklisted or access_blacklisted:
             raise serializers.ValidationError('Tokens are already blacklisted')
@@ -146,9 +150,11 @@ class GoogleAuthResponseSerializer(serializers.Serializer):
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
+    avatar_renditions = RenditionsField("avatar")
+
     class Meta:
         model = UserModel
-        fields = ['username', 'email', 'phone', 'avatar', 'bio', 'is_active', 'deleted_at']
+        fields = ['username', 'email', 'phone', 'avatar', 'avatar_renditions', 'bio', 'is_active', 'deleted_at']
         read_only_fields = ['email', 'is_active', 'deleted_at']
 
 
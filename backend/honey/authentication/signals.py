@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from chat.models import ChatModel, MessageModel
+from library.models import UserBookModel
+from .stats import bump_user_stats
+
+
+@receiver(post_save, sender=MessageModel)
+def message_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user_stats([instance.sender_id], messages_sent=1)
+
+
+@receiver(post_delete, sender=MessageModel)
+def message_deleted(sender, instance, **kwargs):
+    bump_user_stats([instance.sender_id], messages_sent=-1)
+
+
+@receiver(post_save, sender=ChatModel)
+def chat_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user_stats([instance.user1_id, instance.user2_id], chats_count=1)
+
+
+@receiver(post_delete, sender=ChatModel)
+def chat_deleted(sender, instance, **kwargs):
+    bump_user_stats([instance.user1_id, instance.user2_id], chats_count=-1)
+
+
+@receiver(post_init, sender=UserBookModel)
+def user_book_loaded(sender, instance, **kwargs):
+    # Remembered so a later save can tell whether is_read flipped
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_save, sender=UserBookModel)
+def user_book_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_user_stats([instance.user_id], books_downloaded=1, books_read=int(instance.is_read))
+    elif instance.is_read != instance._loaded_is_read:
+        bump_user_stats([instance.user_id], books_read=1 if instance.is_read else -1)
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=UserBookModel)
+def user_book_deleted(sender, instance, **kwargs):
+    bump_user_stats([instance.user_id], books_downloaded=-1, books_read=-int(instance._loaded_is_read))
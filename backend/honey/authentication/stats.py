@@ -0,0 +1,67 @@
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import UserStatsModel
+
+STAT_FIELDS = ("books_downloaded", "books_read", "chats_count", "messages_sent")
+
+
+def compute_user_stats(user_ids):
+    """Recount the stats of the given users from the source tables: {user_id: {field: count}}."""
+    from chat.models import ChatModel, MessageModel
+    from library.models import UserBookModel
+
+    stats = {user_id: dict.fromkeys(STAT_FIELDS, 0) for user_id in user_ids}
+
+    books = (
+        UserBookModel.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(downloaded=Count("id"), read=Count("id", filter=Q(is_read=True)))
+    )
+    for row in books:
+        stats[row["user_id"]]["books_downloaded"] = row["downloaded"]
+        stats[row["user_id"]]["books_read"] = row["read"]
+
+    for field in ("user1_id", "user2_id"):
+        chats = ChatModel.objects.filter(**{f"{field}__in": user_ids})
+        if field == "user2_id":
+            # A chat with yourself was already counted in the user1 pass
+            chats = chats.exclude(user1_id=F("user2_id"))
+        for row in chats.values(field).annotate(n=Count("id")):
+            stats[row[field]]["chats_count"] += row["n"]
+
+    messages = MessageModel.objects.filter(sender_id__in=user_ids).values("sender_id").annotate(n=Count("id"))
+    for row in messages:
+        stats[row["sender_id"]]["messages_sent"] = row["n"]
+    return stats
+
+
+def save_user_stats(stats):
+    UserStatsModel.objects.bulk_create(
+        [UserStatsModel(user_id=user_id, updated_at=timezone.now(), **counts) for user_id, counts in stats.items()],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[*STAT_FIELDS, "updated_at"],
+    )
+
+
+def get_user_stats(user):
+    stats = UserStatsModel.objects.filter(user_id=user.id).first()
+    if stats is None:
+        # First read: build the row from the source tables
+        save_user_stats(compute_user_stats([user.id]))
+        stats = UserStatsModel.objects.get(user_id=user.id)
+    return stats
+
+
+def bump_user_stats(user_ids, **deltas):
+    """
+    Apply counter deltas in place. Users without a stats row are skipped;
+    their row is computed from scratch on first read.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if not user_ids or not deltas:
+        return
+    UserStatsModel.objects.filter(user_id__in=user_ids).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}, updated_at=timezone.now()
+    )
@@ -1,3 +1,279 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat.models import ChatModel, MessageModel
+from .blacklist import VERSION_KEY, AccessTokenBlacklist
+from . import outbox
+from .models import BlacklistedAccessTokenModel, EmailVerificationModel, OutgoingEmailModel, UserModel, UserStatsModel
+from .stats import STAT_FIELDS, compute_user_stats, get_user_stats
+from .utils import create_verification
+
+
+class AccessTokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.blacklist = AccessTokenBlacklist()
+
+    def blacklist_elsewhere(self, jti):
+        # What another process's logout leaves behind: the row, and a bumped version
+        BlacklistedAccessTokenModel.objects.create(jti=jti, expires_at=timezone.now() + timedelta(minutes=5))
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+
+    def test_without_shared_cache_every_lookup_reads_the_database(self):
+        self.assertFalse(self.blacklist.is_blacklisted("jti-1"))
+        BlacklistedAccessTokenModel.objects.create(jti="jti-1", expires_at=timezone.now() + timedelta(minutes=5))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.blacklist.is_blacklisted("jti-1"))
+
+    @mock.patch("authentication.blacklist.cache_is_shared", return_value=True)
+    def test_with_shared_cache_lookups_sync_only_after_a_bump(self, _):
+        self.assertFalse(self.blacklist.is_blacklisted("jti-1"))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.blacklist.is_blacklisted("jti-1"))
+
+        self.blacklist_elsewhere("jti-1")
+        self.assertTrue(self.blacklist.is_blacklisted("jti-1"))
+
+
+class EmailVerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = UserModel.objects.create_user("new", "new@example.com", "pass", phone="+998903000002")
+        self.code = create_verification(self.user).code
+
+    def verify(self, code):
+        return self.client.post("/api/v1/auth/verify-email/", {"email": "new@example.com", "code": str(code)})
+
+    def wrong(self):
+        return self.verify(100000 if self.code != 100000 else 100001)
+
+    def resend(self):
+        return self.client.post("/api/v1/auth/verify-email/resend/", {"email": "new@example.com"})
+
+    def test_third_wrong_code_blocks_even_the_right_one(self):
+        self.assertEqual(self.wrong().status_code, 400)
+        self.assertEqual(self.wrong().status_code, 400)
+        self.assertEqual(self.wrong().status_code, 429)
+
+        response = self.verify(self.code)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 29 * 60)
+
+    def test_block_outlives_the_cache(self):
+        for _ in range(3):
+            self.wrong()
+        cache.clear()
+
+        self.assertEqual(self.verify(self.code).status_code, 429)
+
+    def test_right_code_verifies_and_clears_the_count(self):
+        self.wrong()
+        self.wrong()
+        response = self.verify(self.code)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+        self.assertFalse(EmailVerificationModel.objects.filter(user=self.user).exists())
+
+        self.user.is_verified = False
+        self.user.save(update_fields=["is_verified"])
+        self.code = create_verification(self.user).code
+        self.wrong()
+        self.wrong()
+        self.assertEqual(self.verify(self.code).status_code, 200)
+
+    def test_resend_sends_a_new_code_that_replaces_the_old_one(self):
+        old = self.code
+        response = self.resend()
+
+        self.assertEqual(response.status_code, 200)
+        self.code = EmailVerificationModel.objects.filter(user=self.user).latest("created_at").code
+        self.assertEqual(OutgoingEmailModel.objects.filter(body__contains=str(self.code)).count(), 1)
+        if old != self.code:
+            self.assertEqual(self.verify(old).status_code, 400)
+        self.assertEqual(self.verify(self.code).status_code, 200)
+
+    def test_resend_keeps_the_wrong_code_count(self):
+        self.wrong()
+        self.wrong()
+        self.resend()
+        self.code = EmailVerificationModel.objects.filter(user=self.user).latest("created_at").code
+
+        self.assertEqual(self.wrong().status_code, 429)
+
+    def test_resend_is_limited_and_answers_the_same_for_unknown_emails(self):
+        for _ in range(3):
+            self.assertEqual(self.resend().status_code, 200)
+        self.assertEqual(self.resend().status_code, 429)
+
+        queued = OutgoingEmailModel.objects.count()
+        response = self.client.post("/api/v1/auth/verify-email/resend/", {"email": "nobody@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutgoingEmailModel.objects.count(), queued)
+
+
+class OutboxTests(TestCase):
+    def queue(self, **fields):
+        return OutgoingEmailModel.objects.create(
+            subject="Hello", body="Hi", from_email="honey@example.com", recipients=["to@example.com"], **fields,
+        )
+
+    def failing_connection(self):
+        return mock.Mock(send_messages=mock.Mock(side_effect=OSError("SMTP down")))
+
+    def test_claimed_emails_are_leased_until_the_claim_times_out(self):
+        email = self.queue()
+        self.assertEqual(outbox.claim_emails(10), [email])
+        self.assertEqual(outbox.claim_emails(10), [])
+
+        later = timezone.now() + outbox.CLAIM_TIMEOUT + timedelta(seconds=1)
+        with mock.patch("authentication.outbox.timezone.now", return_value=later):
+            self.assertEqual(outbox.claim_emails(10), [email])
+
+    def test_claims_go_oldest_due_first_and_skip_future_retries(self):
+        now = timezone.now()
+        newer = self.queue(next_attempt_at=now - timedelta(minutes=1))
+        older = self.queue(next_attempt_at=now - timedelta(minutes=2))
+        self.queue(next_attempt_at=now + timedelta(minutes=1))
+
+        self.assertEqual(outbox.claim_emails(10), [older, newer])
+
+    def test_drain_sends_due_emails(self):
+        email = self.queue()
+
+        self.assertEqual(outbox.drain_outbox(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (outbox.SENT, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failures_back_off_exponentially(self):
+        email = self.queue()
+        for attempts in (1, 2, 3):
+            OutgoingEmailModel.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            before = timezone.now()
+            with mock.patch("authentication.outbox.random.uniform", return_value=1), \
+                    self.assertLogs("authentication.outbox", "WARNING"):
+                self.assertEqual(outbox.drain_outbox(connection=self.failing_connection()), (0, 0))
+
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (outbox.PENDING, attempts))
+            self.assertEqual(email.last_error, "SMTP down")
+            delay = (email.next_attempt_at - before).total_seconds()
+            self.assertAlmostEqual(delay, outbox.RETRY_BASE_DELAY * 2 ** (attempts - 1), delta=1)
+
+    def test_retry_delay_is_capped(self):
+        with mock.patch("authentication.outbox.random.uniform", return_value=1):
+            self.assertEqual(outbox.retry_delay(50), timedelta(seconds=outbox.RETRY_MAX_DELAY))
+
+    def test_an_email_fails_for_good_after_max_attempts(self):
+        email = self.queue(attempts=outbox.MAX_ATTEMPTS - 1)
+
+        with self.assertLogs("authentication.outbox", "WARNING"):
+            self.assertEqual(outbox.drain_outbox(connection=self.failing_connection()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (outbox.FAILED, outbox.MAX_ATTEMPTS))
+        self.assertEqual(outbox.claim_emails(10), [])
+
+
+class OutboxDrainerTests(TestCase):
+    def setUp(self):
+        self.drainer = outbox.OutboxDrainer()
+        patcher = mock.patch("authentication.outbox.threading")
+        self.threading = patcher.start()
+        self.addCleanup(patcher.stop)
+        # The drain runs on the test's connection here, which must stay open
+        patcher = mock.patch("authentication.outbox.db_connection")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_thread(self):
+        self.threading.Thread.call_args.kwargs["target"]()
+
+    def test_wakes_during_a_drain_reuse_its_thread(self):
+        self.drainer.wake()
+        self.drainer.wake()
+        self.drainer.wake()
+        self.assertEqual(self.threading.Thread.call_count, 1)
+
+        with mock.patch("authentication.outbox.drain_outbox") as drain:
+            self.run_thread()
+        # Once for the first wake, once more for the ones that came during it
+        self.assertEqual(drain.call_count, 2)
+
+        self.drainer.wake()
+        self.assertEqual(self.threading.Thread.call_count, 2)
+
+    def test_a_pending_retry_sets_a_timer(self):
+        due = timezone.now() + timedelta(seconds=90)
+        OutgoingEmailModel.objects.create(
+            subject="Hello", body="Hi", from_email="honey@example.com", recipients=["to@example.com"],
+            attempts=1, next_attempt_at=due,
+        )
+        self.drainer.wake()
+        with mock.patch("authentication.outbox.drain_outbox"):
+            self.run_thread()
+
+        delay, callback = self.threading.Timer.call_args.args
+        self.assertAlmostEqual(delay, 90, delta=1)
+        self.assertEqual(callback, self.drainer.wake)
+
+    def test_an_empty_outbox_sets_no_timer(self):
+        self.drainer.wake()
+        with mock.patch("authentication.outbox.drain_outbox"):
+            self.run_thread()
+
+        self.threading.Timer.assert_not_called()
+
+    def test_a_failed_drain_is_retried_later(self):
+        self.drainer.wake()
+        with mock.patch("authentication.outbox.drain_outbox", side_effect=OSError), \
+                self.assertLogs("authentication.outbox", "ERROR"):
+            self.run_thread()
+
+        delay, _ = self.threading.Timer.call_args.args
+        self.assertAlmostEqual(delay, outbox.RETRY_BASE_DELAY, delta=1)
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user("me", "me@example.com", "pass", phone="+998903000000")
+        cls.other = UserModel.objects.create_user("other", "other@example.com", "pass", phone="+998903000001")
+
+    def stored(self, user):
+        return UserStatsModel.objects.filter(user=user).values(*STAT_FIELDS).get()
+
+    def test_chat_with_yourself_counts_once(self):
+        ChatModel.objects.get_or_create_between(self.user, self.user)
+        ChatModel.objects.get_or_create_between(self.user, self.other)
+
+        self.assertEqual(get_user_stats(self.user).chats_count, 2)
+        self.assertEqual(compute_user_stats([self.user.id])[self.user.id]["chats_count"], 2)
+
+    def test_signal_bumps_match_a_recount(self):
+        get_user_stats(self.user)
+        get_user_stats(self.other)
+
+        saved, _ = ChatModel.objects.get_or_create_between(self.user, self.user)
+        chat, _ = ChatModel.objects.get_or_create_between(self.user, self.other)
+        MessageModel.objects.create_in_chat(saved, sender=self.user, receiver=self.user, content="note")
+        reply = MessageModel.objects.create_in_chat(chat, sender=self.other, receiver=self.user, content="hi")
+        MessageModel.objects.create_in_chat(chat, sender=self.user, receiver=self.other, content="hey")
+        reply.delete()
 
-# Create your tests here.
+        recount = compute_user_stats([self.user.id, self.other.id])
+        self.assertEqual(self.stored(self.user), recount[self.user.id])
+        self.assertEqual(self.stored(self.other), recount[self.other.id])
@@ -7,6 +7,7 @@ app_name = "authentication"
 urlpatterns = [
     path("register/", UserRegisterViewSet.as_view({"post": "register"}), name="register"),
     path("verify-email/", UserRegisterViewSet.as_view({"post": "verify_register"}), name="verify-register"),
+    path("verify-email/resend/", UserRegisterViewSet.as_view({"post": "resend_verification"}), name="verify-resend"),
     path("login/", LoginViewSet.as_view({"post": "login"}), name="login"),
     path("logout/", LogoutViewSet.as_view({"post": "logout"}), name="logout"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
@@ -1,18 +1,41 @@
+import math
 import random
 import logging
 from datetime import timedelta
 from django.utils.timezone import now
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 
 logger = logging.getLogger(__name__)
 
+# Noto'g'ri kodlar: 3 ta urinishdan keyin 30 daqiqa blok
+VERIFY_MAX_ATTEMPTS = 3
+VERIFY_BLOCK = timedelta(minutes=30)
+
 
 def generate_code():
     # 6 xonali tasdiqlash kodi
     return random.randint(100000, 999999)
 
 
+def queue_email(subject, message, recipients, from_email=None):
+    # Navbatga qo'yiladi; worker bo'lmasa commit'dan keyin shu process yuboradi
+    from .models import OutgoingEmailModel
+    from .outbox import send_soon
+
+    email = OutgoingEmailModel.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+    logger.info(f"Email queued for {', '.join(email.recipients)}")
+    if not settings.EMAIL_OUTBOX_WORKER:
+        send_soon()
+    return email
+
+
 def send_verification_email(user, code):
     # Kod email headingda (subject) ham ko'rinadi
     subject = f"🍯 Tasdiqlash kodi: {code} — Honey Ecosystem"
@@ -27,18 +50,97 @@ def send_verification_email(user, code):
         f"ushbu xabarni e'tiborsiz qoldiring.\n\n"
         f"— Honey Ecosystem jamoasi 🍯"
     )
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
-        logger.info(f"Verification email sent to {user.email}")
-    except Exception as e:
-        logger.warning(f"Email yuborilmadi ({user.email}): {e}")
+    queue_email(subject, message, [user.email])
 
 
 def generate_expiry_time():
-    return now() + timedelta(minutes=10)
\ No newline at end of file
+    return now() + timedelta(minutes=10)
+
+
+def verification_cache_key(email):
+    return f"verification:{email.lower()}"
+
+
+def cache_verification(email, verification):
+    if verification:
+        data = {
+            "code": verification.code,
+            "expires_at": verification.expires_at,
+            "block_until": verification.block_until,
+        }
+    else:
+        data = {"code": None, "expires_at": None, "block_until": None}
+    timeout = (data["expires_at"] - now()).total_seconds() if data["expires_at"] else 600
+    cache.set(verification_cache_key(email), data, max(1, timeout))
+    return data
+
+
+def latest_verification(email):
+    from .models import EmailVerificationModel
+
+    return EmailVerificationModel.objects.filter(user__email__iexact=email).order_by("-created_at").first()
+
+
+def create_verification(user, type=1):
+    from .models import EmailVerificationModel
+
+    # Noto'g'ri urinishlar va blok yangi kodga o'tadi, aks holda qayta
+    # yuborish hisobni nolga tushirib yuborardi
+    previous = latest_verification(user.email)
+    verification = EmailVerificationModel.objects.create(
+        user=user,
+        type=type,
+        expires_at=generate_expiry_time(),
+        attempts=previous.attempts if previous else 0,
+        block_until=previous.block_until if previous else None,
+    )
+    cache_verification(user.email, verification)
+    send_verification_email(user, verification.code)
+    return verification
+
+
+def get_verification(email):
+    """
+    Latest verification code for the email as {"code", "expires_at",
+    "block_until"}. Served from the cache; the database is only read on a
+    miss, and a missing code is cached too so guesses for unknown emails
+    stay cheap. The database stays authoritative: an evicted entry is
+    simply read back, block included.
+    """
+    data = cache.get(verification_cache_key(email))
+    if data is None:
+        data = cache_verification(email, latest_verification(email))
+    return data
+
+
+def blocked_seconds(block_until):
+    """Seconds until block_until, 0 if it has passed or is unset."""
+    if not block_until:
+        return 0
+    return max(0, math.ceil((block_until - now()).total_seconds()))
+
+
+def record_wrong_code(email):
+    """
+    Count a wrong code against the email's latest verification; returns the
+    seconds it is now blocked for, 0 if it isn't.
+    """
+    from .models import EmailVerificationModel
+
+    with transaction.atomic():
+        verification = EmailVerificationModel.objects.select_for_update().filter(
+            user__email__iexact=email
+        ).order_by("-created_at").first()
+        if not verification:
+            return 0
+        blocked_for = blocked_seconds(verification.block_until)
+        if blocked_for:
+            # A concurrent guess got here first
+            return blocked_for
+        verification.attempts += 1
+        if verification.attempts >= VERIFY_MAX_ATTEMPTS:
+            verification.block_until = now() + VERIFY_BLOCK
+            verification.attempts = 0
+        verification.save(update_fields=["attempts", "block_until", "updated_at"])
+    cache_verification(email, verification)
+    return blocked_seconds(verification.block_until)
\ No newline at end of file
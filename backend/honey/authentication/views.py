@@ -5,15 +5,18 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.utils.timezone import now
-from django.db.models import Q
 from django.http import HttpResponseRedirect
 from django.utils.timezone import now as timezone_now
-from .models import UserModel, EmailVerificationModel, BlacklistedAccessTokenModel
-from library.models import UserBookModel
-from chat.models import MessageModel, ChatModel
+from .models import UserModel, EmailVerificationModel
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from .blacklist import blacklist_access_token
+from .ratelimit import login_limiter, auth_ip_limiter, resend_limiter, client_ip
+from .utils import blocked_seconds, create_verification, get_verification, record_wrong_code, verification_cache_key
+from .stats import get_user_stats
 from .oauth import oauth
 from .serializers import UserRegistrationSerializer, LoginSerializer, LogoutSerializer, EmailVerifySerializer, \
-    GoogleAuthResponseSerializer, UserSerializer, UserProfileSerializer, ChangePasswordSerializer
+    ResendVerificationSerializer, GoogleAuthResponseSerializer, UserSerializer, UserProfileSerializer, ChangePasswordSerializer
 from datetime import timedelta
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.urls import reverse
@@ -21,6 +24,15 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.utils import timezone
 
 
+def too_many_attempts(seconds, key="message"):
+    minutes = max(1, -(-seconds // 60))
+    return Response(
+        data={key: f"You have exceeded the maximum attempts. Try again after {minutes} minutes."},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(seconds)},
+    )
+
+
 class UserRegisterViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
 
@@ -53,44 +65,50 @@ class UserRegisterViewSet(viewsets.ViewSet):
         request_body=EmailVerifySerializer,
         responses={
             200: openapi.Response(description="Email verified successfully"),
-            400: openapi.Response(description="Invalid or expired code")
+            400: openapi.Response(description="Invalid or expired code"),
+            429: openapi.Response(description="Too many wrong codes")
         },
         tags=["Authentication"]
     )
     def verify_register(self, request):
         email = request.data.get("email")
         code = request.data.get("code")
-
-        user = UserModel.objects.filter(email=email).first()
-        if not user:
-            return Response(data={"message": "User not found."}, status=status.HTTP_400_BAD_REQUEST)
-
-        verification = EmailVerificationModel.objects.filter(user=user).order_by("-created_at").first()
-        if not verification:
+        if not email or not code:
+            return Response(data={"message": "Email and code are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ip = client_ip(request)
+        blocked_for = auth_ip_limiter.blocked_for(ip)
+        if blocked_for:
+            return too_many_attempts(blocked_for)
+
+        verification = get_verification(email)
+        # Kept on the verification row; the cache only fronts it
+        blocked_for = blocked_seconds(verification.get("block_until"))
+        if blocked_for:
+            return too_many_attempts(blocked_for)
+
+        if verification["code"] is None:
+            auth_ip_limiter.hit(ip)
             return Response(data={"message": "Verification code not found."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if verification.block_until and verification.block_until > now():
-            remaining_minutes = int((verification.block_until - now()).total_seconds() // 60)
-            return Response(
-                data={
-                    "message": f"You have exceeded the maximum attempts. Try again after {remaining_minutes} minutes."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        if verification.expires_at and verification.expires_at < now():
+        if verification["expires_at"] and verification["expires_at"] < now():
             return Response(data={"message": "The verification code has expired."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if verification.code != int(code):
-            verification.attempts += 1
-            if verification.attempts >= 3:
-                verification.block_until = now() + timedelta(minutes=30)
-                verification.attempts = 0
-            verification.save(update_fields=["attempts", "block_until"])
+        if str(verification["code"]) != str(code).strip():
+            blocked_for = record_wrong_code(email)
+            auth_ip_limiter.hit(ip)
+            if blocked_for:
+                return too_many_attempts(blocked_for)
             return Response({"message": "The verification code is incorrect."}, status=status.HTTP_400_BAD_REQUEST)
 
+        user = UserModel.objects.filter(email__iexact=email).first()
+        if not user:
+            return Response(data={"message": "User not found."}, status=status.HTTP_400_BAD_REQUEST)
+
         user.is_verified = True
         user.save(update_fields=["is_verified"])
-        verification.delete()
+        EmailVerificationModel.objects.filter(user=user).delete()
+        cache.delete(verification_cache_key(email))
 
         refresh = RefreshToken.for_user(user)
 
@@ -100,6 +118,36 @@ class UserRegisterViewSet(viewsets.ViewSet):
             "access": str(refresh.access_token)
         }, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        operation_summary="Resend verification code",
+        operation_description="Sends a new verification code to an unverified user's email.",
+        request_body=ResendVerificationSerializer,
+        responses={
+            200: openapi.Response(description="A new code was sent if the email belongs to an unverified user"),
+            429: openapi.Response(description="Too many requests")
+        },
+        tags=["Authentication"]
+    )
+    def resend_verification(self, request):
+        serializer = ResendVerificationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        email = serializer.validated_data["email"]
+
+        blocked_for = resend_limiter.blocked_for(email)
+        if blocked_for:
+            return too_many_attempts(blocked_for)
+        resend_limiter.hit(email)
+
+        user = UserModel.objects.filter(email__iexact=email, is_verified=False, is_active=True).first()
+        if user:
+            create_verification(user, type=2)
+        # Same answer either way, so the endpoint can't be used to probe emails
+        return Response(
+            {"message": "If this email is awaiting verification, a new code has been sent."},
+            status=status.HTTP_200_OK,
+        )
+
 
 class LoginViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
@@ -111,13 +159,26 @@ class LoginViewSet(viewsets.ViewSet):
         responses={
             200: openapi.Response(description="Login successful. JWT tokens are returned.", ),
             401: "Invalid username or password.",
+            429: "Too many failed logins.",
         },
         tags=["Authentication"]
     )
     def login(self, request):
+        username = request.data.get("username")
+        ip = client_ip(request)
+        blocked_for = login_limiter.blocked_for(username) or auth_ip_limiter.blocked_for(ip)
+        if blocked_for:
+            return too_many_attempts(blocked_for, key="detail")
+
         serializer = LoginSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except AuthenticationFailed:
+            login_limiter.hit(username)
+            auth_ip_limiter.hit(ip)
+            raise
         user = serializer.validated_data['user']
+        login_limiter.reset(username)
 
         if not user.is_active:
             return Response(
@@ -167,7 +228,7 @@ class LogoutViewSet(viewsets.ViewSet):
             refresh = RefreshToken(refresh_token)
             refresh.blacklist()
 
-            BlacklistedAccessTokenModel.objects.create(token=access_token)
+            blacklist_access_token(access_token)
 
             return Response(
                 data={"message": "Logged out successfully", "ok": True},
@@ -328,21 +389,12 @@ class UserProfileViewSet(viewsets.ViewSet):
         tags=['Profile']
     )
     def stats(self, request):
-        user = request.user
-        books_read = UserBookModel.objects.filter(user=user, is_read=True).count()
-        books_downloaded = UserBookModel.objects.filter(user=user).count()
-        
-        chats_count = ChatModel.objects.filter(
-            Q(user1=user) | Q(user2=user)
-        ).count()
-        
-        messages_sent = MessageModel.objects.filter(sender=user).count()
-        
+        stats = get_user_stats(request.user)
         return Response({
-            "books_read": books_read,
-            "books_downloaded": books_downloaded,
-            "chats_count": chats_count,
-            "messages_sent": messages_sent
+            "books_read": stats.books_read,
+            "books_downloaded": stats.books_downloaded,
+            "chats_count": stats.chats_count,
+            "messages_sent": stats.messages_sent
         }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
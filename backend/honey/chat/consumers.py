@@ -1,13 +1,20 @@
-import json
+import asyncio
+import uuid
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from authentication.models import UserModel
-from .models import MessageModel, GroupModel
-from .serializers import MessageSerializer
+from .models import MessageModel, GroupModel, ChatModel
+from .serializers import CompactMessageSerializer, get_side_loaded_users
+from .presence import get_presence_backend
+from .read_state import mark_read
+from .events import read_receipt_event, chat_updated_event
+from .protocol import FrameCodecMixin
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(FrameCodecMixin, AsyncWebsocketConsumer):
 
     async def connect(self):
         self.user = self.scope.get('user')
@@ -32,8 +39,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.update_user_status(True)
-        await self.accept()
+        await self.join_presence()
+        await self.accept_negotiated()
 
     async def disconnect(self, close_code):
         if self.user and self.user.is_authenticated:
@@ -47,21 +54,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
-            await self.update_user_status(False)
+            await self.leave_presence()
 
     async def receive(self, text_data=None, bytes_data=None):
-        if not text_data:
-            return
-
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
-                "type": "error",
-                "message": "Invalid JSON"
-            }))
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError as e:
+            await self.send_frame({"type": "error", "message": str(e)})
+            return
+        if data is None:
             return
 
+        await self.handle_frame(data)
+
+    async def handle_frame(self, data):
         msg_type = data.get("type")
 
         if msg_type == "message":
@@ -70,16 +76,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.handle_typing(data)
         elif msg_type == "call":
             await self.handle_call(data)
+        elif msg_type == "read":
+            await self.handle_read(data)
+        elif msg_type == "heartbeat":
+            await sync_to_async(get_presence_backend().heartbeat)(self.user.id, self.channel_name)
 
     async def handle_message(self, data):
         receiver_id = data.get("receiver_id")
         content = data.get("content")
 
         if not content or not receiver_id:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": "Missing receiver_id or content"
-            }))
+            })
             return
 
         try:
@@ -89,26 +99,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 content=content,
                 message_type=data.get("message_type", "text")
             )
-            message_data = await self.serialize_message(message)
+            message_data, users = await self.serialize_message(message)
 
             await self.channel_layer.group_send(
                 f"user_{receiver_id}",
                 {
                     "type": "chat_message",
-                    "message": message_data
+                    "message": message_data,
+                    "users": users
                 }
             )
 
-            await self.send(text_data=json.dumps({
+            event = chat_updated_event(message.chat, message_data)
+            for user_id in {str(self.user.id), str(receiver_id)}:
+                await self.channel_layer.group_send(f"user_{user_id}", event)
+
+            await self.send_frame({
                 "type": "message_sent",
-                "message": message_data
-            }))
+                "message": message_data,
+                "users": users
+            })
 
         except Exception as e:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": f"Failed to send message: {str(e)}"
-            }))
+            })
+
+    async def handle_read(self, data):
+        try:
+            result = await self.mark_chat_read(data.get("chat_id"), data.get("message_id"))
+        except (ChatModel.DoesNotExist, MessageModel.DoesNotExist, ValidationError):
+            await self.send_frame({"type": "error", "message": "Chat or message not found"})
+            return
+        if result is None:
+            return
+
+        other_user_id, event = result
+        await self.channel_layer.group_send(f"user_{other_user_id}", event)
 
     async def handle_typing(self, data):
         receiver_id = data.get("receiver_id")
@@ -147,32 +175,45 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             "type": "message",
-            "message": event["message"]
-        }))
+            "message": event["message"],
+            "users": event.get("users", {})
+        })
+
+    async def read_receipt(self, event):
+        await self.send_frame(event)
+
+    async def chat_updated(self, event):
+        await self.send_frame(event)
+
+    async def group_membership_revoked(self, event):
+        # Only MultiplexConsumer holds group subscriptions on this channel
+        pass
 
     async def typing_indicator(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             "type": "typing",
             "user_id": event["user_id"],
             "username": event["username"],
             "is_typing": event["is_typing"]
-        }))
+        })
 
     async def call_signal(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             "type": "call",
             "call_type": event["call_type"],
             "signal_data": event["signal_data"],
             "sender_id": event["sender_id"],
             "sender_username": event["sender_username"]
-        }))
+        })
 
     @database_sync_to_async
     def create_message(self, sender, receiver_id, content, message_type="text"):
         receiver = UserModel.objects.get(id=receiver_id)
-        return MessageModel.objects.create(
+        chat, _ = ChatModel.objects.get_or_create_between(sender, receiver)
+        return MessageModel.objects.create_in_chat(
+            chat,
             sender=sender,
             receiver=receiver,
             content=content,
@@ -181,86 +222,95 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def serialize_message(self, message):
-        from .serializers import MessageSerializer  # Import your serializer
-
-        serializer = MessageSerializer(message)
-        return serializer.data
+        return CompactMessageSerializer(message).data, get_side_loaded_users([message])
 
     @database_sync_to_async
+    def mark_chat_read(self, chat_id, message_id=None):
+        chat = ChatModel.objects.filter(Q(user1=self.user) | Q(user2=self.user)).get(id=chat_id)
+        last_read_at = mark_read(self.user, chat=chat, message_id=message_id)
+        if last_read_at is None:
+            return None
+        other_user_id = chat.user2_id if chat.user1_id == self.user.id else chat.user1_id
+        return other_user_id, read_receipt_event(self.user, last_read_at, chat=chat)
+
+    async def join_presence(self):
+        await self.update_user_status(True)
+        self.presence_task = asyncio.ensure_future(self.keep_presence())
+
+    async def leave_presence(self):
+        task = getattr(self, "presence_task", None)
+        if task:
+            task.cancel()
+        await self.update_user_status(False)
+
+    async def keep_presence(self):
+        # Refreshed from here while the socket is open, so clients don't have to
+        # send heartbeats; a dead worker stops refreshing and its entries expire
+        presence = get_presence_backend()
+        while True:
+            await asyncio.sleep(presence.timeout / 3)
+            await sync_to_async(presence.heartbeat)(self.user.id, self.channel_name)
+
+    @sync_to_async
     def update_user_status(self, online):
-        self.user.online = online
-        self.user.last_seen = timezone.now()
-        self.user.save(update_fields=["online", "last_seen"])
-
-
-class GroupConsumer(AsyncWebsocketConsumer):
-
-    async def connect(self):
-        self.user = self.scope.get('user')
-        self.group_id = self.scope['url_route']['kwargs'].get("group_id")
+        # Presence lives in the presence backend, which writes last_seen to the database in batches
+        presence = get_presence_backend()
+        if online:
+            presence.connect(self.user.id, self.channel_name)
+        else:
+            presence.disconnect(self.user.id, self.channel_name)
 
-        if not self.user or not self.user.is_authenticated or not self.group_id:
-            await self.close()
-            return
-
-        await self.channel_layer.group_add(
-            f"group_{self.group_id}",
-            self.channel_name
-        )
-        await self.accept()
-
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            f"group_{self.group_id}",
-            self.channel_name
-        )
 
-    async def receive(self, text_data=None, bytes_data=None):
-        if not text_data:
-            return
+class GroupMessagingMixin:
+    """Group chat handlers shared by GroupConsumer and MultiplexConsumer."""
 
+    async def handle_group_read(self, data, group_id):
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({"type": "error", "message": "Invalid JSON"}))
+            event = await self.mark_group_read(group_id, data.get("message_id"))
+        except (GroupModel.DoesNotExist, MessageModel.DoesNotExist, ValidationError):
+            await self.send_frame({"type": "error", "message": "Group or message not found"})
             return
+        if event is not None:
+            await self.channel_layer.group_send(f"group_{group_id}", event)
 
-        if data.get("type") == "group_message":
-            await self.handle_group_message(data)
-
-    async def handle_group_message(self, data):
+    async def handle_group_message(self, data, group_id):
         content = data.get("content")
         if not content:
-            await self.send(text_data=json.dumps({"type": "error", "message": "Missing content"}))
+            await self.send_frame({"type": "error", "message": "Missing content"})
             return
 
         try:
             message = await self.create_group_message(
                 sender=self.user,
-                group_id=self.group_id,
+                group_id=group_id,
                 content=content,
                 message_type=data.get("message_type", "text")
             )
 
-            message_data = await self.serialize_message(message)
+            message_data, users = await self.serialize_message(message)
 
             await self.channel_layer.group_send(
-                f"group_{self.group_id}",
+                f"group_{group_id}",
                 {
                     "type": "group_message",
-                    "message": message_data
+                    "message": message_data,
+                    "users": users
                 }
             )
         except GroupModel.DoesNotExist:
-            await self.send(text_data=json.dumps({"type": "error", "message": "Group not found"}))
+            await self.send_frame({"type": "error", "message": "Group not found"})
         except Exception as e:
-            await self.send(text_data=json.dumps({"type": "error", "message": str(e)}))
+            await self.send_frame({"type": "error", "message": str(e)})
+
+    async def read_receipt(self, event):
+        await self.send_frame(event)
 
     async def group_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             "type": "group_message",
-            "message": event["message"]
-        }))
+            "message": event["message"],
+            "users": event.get("users", {})
+        })
 
     @database_sync_to_async
     def create_group_message(self, sender, group_id, content, message_type="text"):
@@ -274,5 +324,154 @@ class GroupConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def serialize_message(self, message):
-        serializer = MessageSerializer(message)
-        return serializer.data
+        return CompactMessageSerializer(message).data, get_side_loaded_users([message])
+
+    @database_sync_to_async
+    def mark_group_read(self, group_id, message_id=None):
+        group = GroupModel.objects.get(id=group_id, members=self.user)
+        last_read_at = mark_read(self.user, group=group, message_id=message_id)
+        if last_read_at is None:
+            return None
+        return read_receipt_event(self.user, last_read_at, group=group)
+
+
+class GroupConsumer(GroupMessagingMixin, FrameCodecMixin, AsyncWebsocketConsumer):
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.group_id = self.scope['url_route']['kwargs'].get("group_id")
+
+        if not self.user or not self.user.is_authenticated or not self.group_id:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(
+            f"group_{self.group_id}",
+            self.channel_name
+        )
+        await self.accept_negotiated()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            f"group_{self.group_id}",
+            self.channel_name
+        )
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+        except ValueError as e:
+            await self.send_frame({"type": "error", "message": str(e)})
+            return
+        if data is None:
+            return
+
+        if data.get("type") == "group_message":
+            await self.handle_group_message(data, self.group_id)
+        elif data.get("type") == "read":
+            await self.handle_group_read(data, self.group_id)
+
+
+class MultiplexConsumer(GroupMessagingMixin, ChatConsumer):
+    """
+    One socket per client. Direct chats arrive through the user_<id> group as
+    in ChatConsumer; groups are joined and left at runtime with control frames:
+
+        {"type": "subscribe", "group_ids": [...]}
+        {"type": "unsubscribe", "group_ids": [...]}
+
+    Group frames (group_message, read) carry a group_id. A member removed from
+    a group is unsubscribed from it with an "unsubscribed" frame.
+    """
+
+    max_subscriptions = 500
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.subscriptions = set()
+        await self.channel_layer.group_add(f"user_{self.user.id}", self.channel_name)
+        await self.join_presence()
+        await self.accept_negotiated()
+
+    async def disconnect(self, close_code):
+        if not self.user or not self.user.is_authenticated:
+            return
+
+        await self.channel_layer.group_discard(f"user_{self.user.id}", self.channel_name)
+        for group_id in self.subscriptions:
+            await self.channel_layer.group_discard(f"group_{group_id}", self.channel_name)
+        await self.leave_presence()
+
+    async def handle_frame(self, data):
+        msg_type = data.get("type")
+
+        if msg_type == "subscribe":
+            await self.handle_subscribe(data)
+        elif msg_type == "unsubscribe":
+            await self.handle_unsubscribe(data)
+        elif msg_type == "group_message" or (msg_type == "read" and data.get("group_id")):
+            group_id = str(data.get("group_id"))
+            if group_id not in self.subscriptions:
+                await self.send_frame({"type": "error", "message": "Not subscribed to this group"})
+            elif msg_type == "group_message":
+                await self.handle_group_message(data, group_id)
+            else:
+                await self.handle_group_read(data, group_id)
+        else:
+            await super().handle_frame(data)
+
+    async def handle_subscribe(self, data):
+        requested = self.parse_group_ids(data)
+        capacity = max(self.max_subscriptions - len(self.subscriptions), 0)
+        allowed = await self.get_member_group_ids(requested[:capacity])
+
+        for group_id in allowed - self.subscriptions:
+            await self.channel_layer.group_add(f"group_{group_id}", self.channel_name)
+        self.subscriptions |= allowed
+
+        await self.send_frame({
+            "type": "subscribed",
+            "group_ids": sorted(allowed),
+            "rejected": sorted(set(requested) - allowed),
+        })
+
+    async def handle_unsubscribe(self, data):
+        removed = set(self.parse_group_ids(data)) & self.subscriptions
+        for group_id in removed:
+            await self.channel_layer.group_discard(f"group_{group_id}", self.channel_name)
+        self.subscriptions -= removed
+
+        await self.send_frame({"type": "unsubscribed", "group_ids": sorted(removed)})
+
+    async def group_membership_revoked(self, event):
+        # Removed from the group (or it was deleted) while subscribed
+        group_id = event["group_id"]
+        if group_id not in self.subscriptions:
+            return
+        await self.channel_layer.group_discard(f"group_{group_id}", self.channel_name)
+        self.subscriptions.discard(group_id)
+        await self.send_frame({"type": "unsubscribed", "group_ids": [group_id], "reason": "membership_revoked"})
+
+    @staticmethod
+    def parse_group_ids(data):
+        raw_ids = data.get("group_ids") or ([data["group_id"]] if data.get("group_id") else [])
+        group_ids = []
+        for raw_id in raw_ids if isinstance(raw_ids, list) else []:
+            try:
+                group_ids.append(str(uuid.UUID(str(raw_id))))
+            except ValueError:
+                continue
+        return group_ids
+
+    @database_sync_to_async
+    def get_member_group_ids(self, group_ids):
+        if not group_ids:
+            return set()
+        return {
+            str(group_id) for group_id in
+            GroupModel.objects.filter(id__in=group_ids, members=self.user).values_list("id", flat=True)
+        }
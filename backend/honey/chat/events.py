@@ -0,0 +1,51 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def send_on_commit(messages):
+    """
+    group_send each (group, event) once the transaction commits. The change
+    is saved by then, so a failing channel layer is logged rather than
+    turned into an error the client would retry.
+    """
+    def send():
+        channel_layer = get_channel_layer()
+        for group, event in messages:
+            try:
+                async_to_sync(channel_layer.group_send)(group, event)
+            except Exception:
+                logger.exception(f"Could not send {event['type']} to {group}")
+
+    if messages:
+        transaction.on_commit(send)
+
+
+def read_receipt_event(user, last_read_at, chat=None, group=None):
+    return {
+        "type": "read_receipt",
+        "chat_id": str(chat.id) if chat else None,
+        "group_id": str(group.id) if group else None,
+        "user_id": str(user.id),
+        "last_read_at": last_read_at.isoformat(),
+    }
+
+
+def chat_updated_event(chat, message_data):
+    return {
+        "type": "chat_updated",
+        "chat_id": str(chat.id),
+        "last_message": message_data,
+        "updated_at": chat.updated_at.isoformat(),
+    }
+
+
+def membership_revoked_event(group_id):
+    return {
+        "type": "group_membership_revoked",
+        "group_id": str(group_id),
+    }
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.presence import get_presence_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered presence (last_seen/online) from the Redis presence backend to the users table. "
+        "The in-memory backend flushes itself inside the ASGI process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Repeat every N seconds. 0 flushes once and exits.")
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = get_presence_backend().flush(options["batch_size"])
+            self.stdout.write(f"Flushed presence for {flushed} users")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+from django.db import models, transaction
+
+
+class ChatManager(models.Manager):
+    def get_or_create_between(self, user, other_user):
+        # user1/user2 are stored sorted by id so a pair maps to exactly one chat
+        user1, user2 = sorted([user, other_user], key=lambda u: u.id)
+        return self.get_or_create(user1=user1, user2=user2)
+
+
+class MessageManager(models.Manager):
+    def create_in_chat(self, chat, **fields):
+        """
+        Insert a direct message and point the chat's last_message/updated_at at it
+        in one transaction, without re-reading the chat row. A send that
+        commits after a newer one leaves the newer one in place.
+        """
+        with transaction.atomic():
+            message = self.create(chat=chat, **fields)
+            updated = chat._meta.model.objects.filter(pk=chat.pk, updated_at__lte=message.created_at).update(
+                last_message=message, updated_at=message.created_at
+            )
+        if updated:
+            chat.last_message = message
+            chat.updated_at = message.created_at
+        return message
@@ -1,16 +1,71 @@
+import logging
+from urllib.parse import parse_qs
+
 from django.contrib.auth.models import AnonymousUser
 from channels.db import database_sync_to_async
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import AccessToken
+from authentication.blacklist import access_token_blacklist
 from authentication.models import UserModel
 
+logger = logging.getLogger(__name__)
+
+SUBPROTOCOL_TOKEN_PREFIX = "bearer."
+
+
+@database_sync_to_async
+def is_blacklisted(jti):
+    return access_token_blacklist.is_blacklisted(jti)
+
 
 @database_sync_to_async
 def get_user(user_id):
+    # Looked up on every handshake, so logouts and deactivations apply to the next one
+    return UserModel.objects.filter(id=user_id, is_active=True).first()
+
+
+async def authenticate_token(token):
     try:
-        return UserModel.objects.get(id=user_id)
-    except UserModel.DoesNotExist:
+        access = AccessToken(token)
+    except TokenError:
         return AnonymousUser()
 
+    user_id = access.get("user_id")
+    if not user_id:
+        return AnonymousUser()
+
+    jti = access.get("jti")
+    if await is_blacklisted(jti):
+        return AnonymousUser()
+
+    return await get_user(user_id) or AnonymousUser()
+
+
+def get_token_from_scope(scope):
+    """
+    Browsers can't set headers on a WebSocket handshake, so besides
+    "Authorization: Bearer <token>" the token is also accepted as
+    ?token=<token> or as a "bearer.<token>" subprotocol entry. Browser
+    clients using the subprotocol should also offer honey.json.v1 or
+    honey.msgpack.v1, which the consumer echoes back.
+    """
+    headers = {
+        k.decode().lower(): v.decode()
+        for k, v in scope.get("headers", [])
+    }
+    auth_header = headers.get("authorization")
+    if auth_header and auth_header.lower().startswith("bearer "):
+        return auth_header.split(" ", 1)[1].strip()
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if query.get("token"):
+        return query["token"][0]
+
+    for subprotocol in scope.get("subprotocols", []):
+        if subprotocol.startswith(SUBPROTOCOL_TOKEN_PREFIX):
+            return subprotocol[len(SUBPROTOCOL_TOKEN_PREFIX):]
+    return None
+
 
 class JWTHeaderAuthMiddleware:
     def __init__(self, inner):
@@ -19,25 +74,11 @@ class JWTHeaderAuthMiddleware:
     async def __call__(self, scope, receive, send):
         scope = dict(scope)
 
-        token = None
-        headers = {
-            k.decode().lower(): v.decode()
-            for k, v in scope.get("headers", [])
-        }
-        auth_header = headers.get("authorization")
-
-        if auth_header and auth_header.lower().startswith("bearer "):
-            token = auth_header.split(" ", 1)[1].strip()
-
+        token = get_token_from_scope(scope)
         if token:
-            try:
-                access = AccessToken(token)
-                user = await get_user(access["user_id"])
-                scope["user"] = user
-            except Exception:
-                scope["user"] = AnonymousUser()
+            scope["user"] = await authenticate_token(token)
         else:
-            print("JWTHeaderAuthMiddleware: no valid Authorization header found")
+            logger.debug("JWTHeaderAuthMiddleware: no access token in handshake")
             scope["user"] = AnonymousUser()
 
         return await self.inner(scope, receive, send)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 18:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_groupmodel_group_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['group', 'created_at', 'id'], name='message_group_created_idx'),
+        ),
+    ]
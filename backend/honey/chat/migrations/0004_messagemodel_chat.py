@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 18:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def backfill_message_chat(apps, schema_editor):
+    ChatModel = apps.get_model('chat', 'ChatModel')
+    MessageModel = apps.get_model('chat', 'MessageModel')
+    direct = MessageModel.objects.filter(group__isnull=True, receiver__isnull=False)
+
+    # Conversations that only ever went over the WebSocket have no chat row yet;
+    # create them in get_or_create_between's sorted order
+    pairs = {
+        tuple(sorted(pair))
+        for pair in direct.filter(chat__isnull=True).values_list('sender_id', 'receiver_id').distinct()
+    }
+    for user1_id, user2_id in pairs:
+        if ChatModel.objects.filter(
+            Q(user1_id=user1_id, user2_id=user2_id) | Q(user1_id=user2_id, user2_id=user1_id)
+        ).exists():
+            continue
+        messages = direct.filter(
+            Q(sender_id=user1_id, receiver_id=user2_id) | Q(sender_id=user2_id, receiver_id=user1_id)
+        ).order_by('created_at')
+        first, latest = messages.first(), messages.last()
+        chat = ChatModel.objects.create(user1_id=user1_id, user2_id=user2_id, last_message=latest)
+        # Date the chat by its messages, not by when the migration ran
+        ChatModel.objects.filter(pk=chat.pk).update(created_at=first.created_at, updated_at=latest.created_at)
+
+    for chat in ChatModel.objects.only('id', 'user1_id', 'user2_id').iterator():
+        direct.filter(
+            Q(sender_id=chat.user1_id, receiver_id=chat.user2_id)
+            | Q(sender_id=chat.user2_id, receiver_id=chat.user1_id),
+            chat__isnull=True,
+        ).update(chat_id=chat.id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagemodel',
+            name='chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.chatmodel'),
+        ),
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['chat', 'created_at', 'id'], name='message_chat_created_idx'),
+        ),
+        migrations.RunPython(backfill_message_chat, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-18 18:29
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_read_cursors(apps, schema_editor):
+    """
+    Start everyone at their conversations' latest message; without a cursor
+    the whole existing history would show up as unread.
+    """
+    ChatModel = apps.get_model('chat', 'ChatModel')
+    GroupModel = apps.get_model('chat', 'GroupModel')
+    MessageModel = apps.get_model('chat', 'MessageModel')
+    ReadCursorModel = apps.get_model('chat', 'ReadCursorModel')
+
+    cursors = []
+    chats = ChatModel.objects.annotate(latest=Max('messages__created_at')).filter(latest__isnull=False)
+    for chat_id, user1_id, user2_id, latest in chats.values_list('id', 'user1_id', 'user2_id', 'latest').iterator():
+        for user_id in {user1_id, user2_id}:
+            cursors.append(ReadCursorModel(user_id=user_id, chat_id=chat_id, last_read_at=latest))
+
+    latest_by_group = dict(
+        MessageModel.objects.filter(group__isnull=False).values('group_id')
+        .annotate(latest=Max('created_at')).values_list('group_id', 'latest')
+    )
+    memberships = GroupModel.members.through.objects.filter(groupmodel_id__in=latest_by_group)
+    for group_id, user_id in memberships.values_list('groupmodel_id', 'usermodel_id').iterator():
+        cursors.append(ReadCursorModel(user_id=user_id, group_id=group_id, last_read_at=latest_by_group[group_id]))
+
+    ReadCursorModel.objects.bulk_create(cursors, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_messagemodel_chat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursorModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_read_at', models.DateTimeField()),
+                ('chat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.chatmodel')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.groupmodel')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Read Cursor',
+                'verbose_name_plural': 'Read Cursors',
+                'db_table': 'read_cursor',
+                'constraints': [models.UniqueConstraint(fields=('user', 'chat'), name='unique_read_cursor_per_chat'), models.UniqueConstraint(fields=('user', 'group'), name='unique_read_cursor_per_group')],
+            },
+        ),
+        migrations.RunPython(backfill_read_cursors, migrations.RunPython.noop),
+    ]
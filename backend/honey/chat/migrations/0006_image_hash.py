@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_readcursormodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmodel',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
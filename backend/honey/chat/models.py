@@ -1,6 +1,7 @@
 from django.db import models
 from authentication.models import UserModel
 from core.base import BaseModel
+from .managers import ChatManager, MessageManager
 
 
 class MessageType(models.TextChoices):
@@ -19,6 +20,7 @@ class GroupModel(BaseModel):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     avatar = models.ImageField(upload_to='chat/group/', null=True, blank=True)
+    avatar_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     admin = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name='group_admin')
     members = models.ManyToManyField(UserModel, related_name='group_members')
     is_public = models.BooleanField(default=True)
@@ -39,11 +41,15 @@ class MessageModel(BaseModel):
                                  related_name='message_receiver')
     group = models.ForeignKey(GroupModel, on_delete=models.CASCADE, null=True, blank=True,
                               related_name='message_group')
+    chat = models.ForeignKey('ChatModel', on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='messages')
     content = models.TextField()
     message_type = models.CharField(max_length=10, choices=MessageType.choices, default=MessageType.TEXT)
     file = models.FileField(upload_to='chat/message/file/', null=True, blank=True)
     read_by = models.ManyToManyField(UserModel, related_name='message_read_by', blank=True)
 
+    objects = MessageManager()
+
     class Meta:
         db_table = 'message'
         verbose_name = 'Message'
@@ -51,6 +57,8 @@ class MessageModel(BaseModel):
         indexes = [
             models.Index(fields=['sender', 'receiver']),
             models.Index(fields=['group']),
+            models.Index(fields=['group', 'created_at', 'id'], name='message_group_created_idx'),
+            models.Index(fields=['chat', 'created_at', 'id'], name='message_chat_created_idx'),
         ]
 
     def __str__(self):
@@ -62,6 +70,8 @@ class ChatModel(BaseModel):
     user2 = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name='chat_user2')
     last_message = models.ForeignKey(MessageModel, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = ChatManager()
+
     class Meta:
         db_table = 'chat'
         verbose_name = 'Chat'
@@ -72,3 +82,23 @@ class ChatModel(BaseModel):
 
     def __str__(self):
         return f"{self.user1.username} - {self.user2.username}"
+
+
+class ReadCursorModel(BaseModel):
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name='read_cursors')
+    chat = models.ForeignKey(ChatModel, on_delete=models.CASCADE, null=True, blank=True, related_name='read_cursors')
+    group = models.ForeignKey(GroupModel, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='read_cursors')
+    last_read_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'read_cursor'
+        verbose_name = 'Read Cursor'
+        verbose_name_plural = 'Read Cursors'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat'], name='unique_read_cursor_per_chat'),
+            models.UniqueConstraint(fields=['user', 'group'], name='unique_read_cursor_per_group'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.last_read_at}"
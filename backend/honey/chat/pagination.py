@@ -0,0 +1,126 @@
+import base64
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(obj, field="created_at"):
+    raw = f"{getattr(obj, field).isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        timestamp = parse_datetime(timestamp)
+        pk = uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor"})
+    if timestamp is None:
+        raise ValidationError({"cursor": "Invalid cursor"})
+    return timestamp, pk
+
+
+class MessageCursorPagination:
+    """
+    Keyset pagination over (created_at, id).
+
+    ?before=<cursor>  older messages (scroll back through history)
+    ?since=<cursor>   newer messages (page forward / reconnect delta)
+    ?limit=<n>        page size, capped at MAX_PAGE_SIZE
+
+    Without a cursor the newest page is returned. Results are always in
+    chronological order.
+    """
+
+    def __init__(self, request):
+        self.before = request.query_params.get("before")
+        self.since = request.query_params.get("since")
+        self.limit = self.get_limit(request.query_params.get("limit"))
+
+    @staticmethod
+    def get_limit(value):
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset):
+        if self.before and self.since:
+            raise ValidationError({"cursor": "Use either before or since, not both"})
+
+        if self.since:
+            created_at, pk = decode_cursor(self.since)
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by("created_at", "id")
+            page = list(queryset[:self.limit + 1])
+            self.has_more = len(page) > self.limit
+            page = page[:self.limit]
+            self.has_older = True
+        else:
+            if self.before:
+                created_at, pk = decode_cursor(self.before)
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            queryset = queryset.order_by("-created_at", "-id")
+            page = list(queryset[:self.limit + 1])
+            self.has_older = len(page) > self.limit
+            page = page[:self.limit][::-1]
+            self.has_more = False
+
+        self.page = page
+        return page
+
+    def get_paginated_data(self, data):
+        if self.page:
+            previous_cursor = encode_cursor(self.page[0]) if self.has_older else None
+            next_cursor = encode_cursor(self.page[-1])
+        else:
+            previous_cursor = None
+            next_cursor = self.since
+        return {
+            "results": data,
+            "previous_cursor": previous_cursor,
+            "next_cursor": next_cursor,
+            "has_more": self.has_more,
+        }
+
+
+class ChatCursorPagination:
+    """
+    Keyset pagination for the chat list, newest activity first.
+
+    ?before=<cursor>  chats updated before this one (next page)
+    ?limit=<n>        page size, capped at MAX_PAGE_SIZE
+    """
+
+    def __init__(self, request):
+        self.before = request.query_params.get("before")
+        self.limit = MessageCursorPagination.get_limit(request.query_params.get("limit"))
+
+    def paginate_queryset(self, queryset):
+        if self.before:
+            updated_at, pk = decode_cursor(self.before)
+            queryset = queryset.filter(
+                Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk)
+            )
+        page = list(queryset.order_by("-updated_at", "-id")[:self.limit + 1])
+        self.has_more = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            "results": data,
+            "next_cursor": encode_cursor(self.page[-1], "updated_at") if self.has_more else None,
+            "has_more": self.has_more,
+        }
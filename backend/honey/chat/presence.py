@@ -0,0 +1,305 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BasePresenceBackend:
+    """
+    Tracks live WebSocket connections per user.
+
+    Every connection is stored with an expiry that its consumer keeps pushing
+    forward while the socket is open, so connections of a crashed worker drop
+    out on their own. Connect/disconnect only mark the user as dirty;
+    last_seen is written to the database in batches by flush().
+    """
+
+    def __init__(self, timeout=90, **options):
+        self.timeout = timeout
+
+    def connect(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def heartbeat(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def disconnect(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def connection_counts(self, user_ids):
+        raise NotImplementedError
+
+    def pending_last_seen(self, user_ids):
+        raise NotImplementedError
+
+    def pop_last_seen(self):
+        raise NotImplementedError
+
+    def restore_last_seen(self, last_seen):
+        """Put popped values back after a failed flush, keeping newer bumps."""
+        raise NotImplementedError
+
+    def is_online(self, user_id):
+        return self.connection_counts([user_id]).get(str(user_id), 0) > 0
+
+    def flush(self, batch_size=1000):
+        """Write buffered last_seen/online to the users table; returns the number of users."""
+        from authentication.models import UserModel
+
+        pending = self.pop_last_seen()
+        if not pending:
+            return 0
+        try:
+            counts = self.connection_counts(pending.keys())
+            users = [
+                UserModel(id=user_id, last_seen=to_datetime(timestamp), online=counts.get(user_id, 0) > 0)
+                for user_id, timestamp in pending.items()
+            ]
+            UserModel.objects.bulk_update(users, ["last_seen", "online"], batch_size=batch_size)
+        except Exception:
+            self.restore_last_seen(pending)
+            raise
+        return len(users)
+
+
+class InMemoryPresenceBackend(BasePresenceBackend):
+    """
+    Single-process stand-in used together with InMemoryChannelLayer.
+
+    No other process can see this memory, so the ASGI process flushes it
+    itself: a timer runs flush() within flush_interval seconds of a change,
+    and whatever is left is flushed at exit. A process that died without
+    that last flush leaves users online; they are reset before the first
+    connection of the next one.
+    """
+
+    def __init__(self, timeout=90, flush_interval=30, **options):
+        super().__init__(timeout=timeout)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._last_seen = {}
+        self._timer = None
+        self._stale_reset = False
+        atexit.register(self._flush_quietly)
+
+    def reset_stale_online(self):
+        """Mark everyone offline who is online in the database but not connected here."""
+        from authentication.models import UserModel
+
+        with self._lock:
+            connected = list(self._connections)
+        return UserModel.objects.filter(online=True).exclude(id__in=connected).update(online=False)
+
+    def _mark_seen(self, user_id, now):
+        # Called with the lock held
+        self._last_seen[user_id] = now
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _touch(self, user_id, channel_name, now):
+        self._connections.setdefault(user_id, {})[channel_name] = now + self.timeout
+        self._mark_seen(user_id, now)
+
+    def connect(self, user_id, channel_name):
+        if not self._stale_reset:
+            # Once per process; not at construction, which may run in async code
+            self._stale_reset = True
+            try:
+                self.reset_stale_online()
+            except Exception:
+                logger.exception("Could not reset stale online flags")
+        now = time.time()
+        with self._lock:
+            self._touch(str(user_id), channel_name, now)
+            return self._count(str(user_id), now)
+
+    def heartbeat(self, user_id, channel_name):
+        now = time.time()
+        with self._lock:
+            connections = self._connections.get(str(user_id), {})
+            connections[channel_name] = now + self.timeout
+            self._connections[str(user_id)] = connections
+
+    def disconnect(self, user_id, channel_name):
+        now = time.time()
+        user_id = str(user_id)
+        with self._lock:
+            self._connections.get(user_id, {}).pop(channel_name, None)
+            self._mark_seen(user_id, now)
+            return self._count(user_id, now)
+
+    def _count(self, user_id, now):
+        connections = self._connections.get(user_id)
+        if not connections:
+            return 0
+        for channel_name, expires_at in list(connections.items()):
+            if expires_at <= now:
+                del connections[channel_name]
+        if not connections:
+            del self._connections[user_id]
+            return 0
+        return len(connections)
+
+    def connection_counts(self, user_ids):
+        now = time.time()
+        with self._lock:
+            return {str(user_id): self._count(str(user_id), now) for user_id in user_ids}
+
+    def pending_last_seen(self, user_ids):
+        with self._lock:
+            return {str(user_id): self._last_seen[str(user_id)]
+                    for user_id in user_ids if str(user_id) in self._last_seen}
+
+    def pop_last_seen(self):
+        with self._lock:
+            popped, self._last_seen = self._last_seen, {}
+            return popped
+
+    def restore_last_seen(self, last_seen):
+        with self._lock:
+            for user_id, timestamp in last_seen.items():
+                self._mark_seen(user_id, max(timestamp, self._last_seen.get(user_id, 0)))
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        self._flush_quietly()
+        # The timer thread's own connection
+        connection.close()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not flush presence")
+
+
+class RedisPresenceBackend(BasePresenceBackend):
+    """
+    Presence kept in the channel layer's Redis.
+
+    presence:conn:<user_id>  sorted set, channel_name scored by expiry time
+    presence:last_seen       hash, user_id -> last activity not yet flushed
+    """
+
+    key_prefix = "presence:conn:"
+    last_seen_key = "presence:last_seen"
+
+    def __init__(self, url, timeout=90, **options):
+        super().__init__(timeout=timeout)
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def connect(self, user_id, channel_name):
+        now = time.time()
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {channel_name: now + self.timeout})
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zcard(key)
+        pipe.expire(key, self.timeout)
+        pipe.hset(self.last_seen_key, str(user_id), now)
+        return pipe.execute()[2]
+
+    def heartbeat(self, user_id, channel_name):
+        now = time.time()
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {channel_name: now + self.timeout})
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def disconnect(self, user_id, channel_name):
+        now = time.time()
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zrem(key, channel_name)
+        pipe.zcount(key, now, "+inf")
+        pipe.hset(self.last_seen_key, str(user_id), now)
+        return pipe.execute()[1]
+
+    def connection_counts(self, user_ids):
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return {}
+        now = time.time()
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.zcount(self._key(user_id), now, "+inf")
+        return dict(zip(user_ids, pipe.execute()))
+
+    def pending_last_seen(self, user_ids):
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return {}
+        values = self.client.hmget(self.last_seen_key, user_ids)
+        return {user_id: float(value) for user_id, value in zip(user_ids, values) if value is not None}
+
+    def pop_last_seen(self):
+        # RENAME is atomic: bumps that arrive meanwhile land in a fresh hash
+        flushing_key = f"{self.last_seen_key}:flushing"
+        try:
+            self.client.rename(self.last_seen_key, flushing_key)
+        except redis.exceptions.ResponseError:
+            # Nothing buffered since the last flush
+            return {}
+        pipe = self.client.pipeline()
+        pipe.hgetall(flushing_key)
+        pipe.delete(flushing_key)
+        values = pipe.execute()[0]
+        return {key.decode(): float(value) for key, value in values.items()}
+
+    def restore_last_seen(self, last_seen):
+        # HSETNX: a bump that arrived after the pop is newer, leave it
+        pipe = self.client.pipeline()
+        for user_id, timestamp in last_seen.items():
+            pipe.hsetnx(self.last_seen_key, user_id, timestamp)
+        pipe.execute()
+
+
+@lru_cache(maxsize=None)
+def get_presence_backend():
+    config = dict(getattr(settings, "PRESENCE", {}))
+    backend_class = import_string(config.pop("BACKEND", "chat.presence.InMemoryPresenceBackend"))
+    options = config.pop("OPTIONS", {})
+    return backend_class(timeout=config.get("TIMEOUT", 90), **options)
+
+
+def to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def get_presence(user_ids):
+    """
+    Bulk presence lookup: {user_id: {"online": bool, "last_seen": datetime}}.
+    One Redis round-trip plus one query for the stored last_seen values.
+    """
+    from authentication.models import UserModel
+
+    backend = get_presence_backend()
+    user_ids = [str(user_id) for user_id in user_ids]
+    counts = backend.connection_counts(user_ids)
+    pending = backend.pending_last_seen(user_ids)
+    stored = dict(UserModel.objects.filter(id__in=user_ids).values_list("id", "last_seen"))
+
+    presence = {}
+    for user_id, last_seen in stored.items():
+        user_id = str(user_id)
+        if user_id in pending:
+            last_seen = max(last_seen, to_datetime(pending[user_id]))
+        presence[user_id] = {"online": counts.get(user_id, 0) > 0, "last_seen": last_seen}
+    return presence
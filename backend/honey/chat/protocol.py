@@ -0,0 +1,50 @@
+import json
+
+import msgpack
+
+JSON_PROTOCOL = "honey.json.v1"
+MSGPACK_PROTOCOL = "honey.msgpack.v1"
+
+
+class FrameCodecMixin:
+    """
+    Lets a consumer speak either JSON text frames (default) or MessagePack
+    binary frames, chosen by the client through Sec-WebSocket-Protocol.
+    """
+
+    protocol = JSON_PROTOCOL
+
+    def negotiate_protocol(self):
+        offered = self.scope.get("subprotocols", [])
+        if MSGPACK_PROTOCOL in offered:
+            self.protocol = MSGPACK_PROTOCOL
+            return MSGPACK_PROTOCOL
+        # Plain JSON clients may offer nothing at all; only echo what was offered
+        return JSON_PROTOCOL if JSON_PROTOCOL in offered else None
+
+    async def accept_negotiated(self):
+        await self.accept(subprotocol=self.negotiate_protocol())
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        """Returns the decoded frame, or raises ValueError for a malformed one."""
+        if bytes_data is not None:
+            try:
+                data = msgpack.unpackb(bytes_data, raw=False)
+            except Exception as e:
+                raise ValueError("Invalid MessagePack") from e
+        elif text_data:
+            try:
+                data = json.loads(text_data)
+            except json.JSONDecodeError as e:
+                raise ValueError("Invalid JSON") from e
+        else:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("Frame must be an object")
+        return data
+
+    async def send_frame(self, payload):
+        if self.protocol == MSGPACK_PROTOCOL:
+            await self.send(bytes_data=msgpack.packb(payload, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(payload))
@@ -0,0 +1,77 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, DateTimeField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import MessageModel, ReadCursorModel
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def advance_read_cursor(user, read_at, chat=None, group=None):
+    """Move the user's read cursor forward to read_at. Never moves it back."""
+    lookup = {"user": user, "chat": chat, "group": group}
+    updated = ReadCursorModel.objects.filter(last_read_at__lt=read_at, **lookup).update(last_read_at=read_at)
+    if not updated:
+        cursor, _ = ReadCursorModel.objects.get_or_create(defaults={"last_read_at": read_at}, **lookup)
+        return cursor.last_read_at
+    return read_at
+
+
+def start_read_cursors(group_id, user_ids):
+    """
+    Put new members' cursors at the group's latest message, so they join
+    with nothing unread rather than the whole history. Returning members'
+    cursors only move forward.
+    """
+    latest = (
+        MessageModel.objects.filter(group_id=group_id)
+        .order_by("-created_at").values_list("created_at", flat=True).first()
+    )
+    if latest is None:
+        return
+    cursors = ReadCursorModel.objects.filter(group_id=group_id, user_id__in=user_ids)
+    cursors.filter(last_read_at__lt=latest).update(last_read_at=latest)
+    ReadCursorModel.objects.bulk_create(
+        [ReadCursorModel(user_id=user_id, group_id=group_id, last_read_at=latest) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def with_unread_counts(queryset, user, field):
+    """
+    Annotate chats (field="chat") or groups (field="group") with unread_count:
+    messages from others newer than the user's read cursor. Both parts are
+    correlated subqueries, so the whole list stays one SQL statement.
+    """
+    last_read = ReadCursorModel.objects.filter(user=user, **{field: OuterRef("pk")}).values("last_read_at")[:1]
+    unread = (
+        MessageModel.objects
+        .filter(**{field: OuterRef("pk")}, created_at__gt=OuterRef("last_read_at"))
+        .exclude(sender=user)
+        .order_by()
+        .values(field)
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return queryset.annotate(
+        last_read_at=Coalesce(Subquery(last_read), Value(EPOCH), output_field=DateTimeField()),
+    ).annotate(
+        unread_count=Coalesce(Subquery(unread), Value(0), output_field=IntegerField()),
+    )
+
+
+def mark_read(user, chat=None, group=None, message_id=None):
+    """
+    Mark everything up to message_id (or the latest message) as read.
+    Returns the resulting cursor, or None when there is nothing to read.
+    Raises MessageModel.DoesNotExist for a message outside the conversation.
+    """
+    messages = MessageModel.objects.filter(chat=chat) if chat else MessageModel.objects.filter(group=group)
+    if message_id:
+        read_at = messages.values_list("created_at", flat=True).get(id=message_id)
+    else:
+        read_at = messages.order_by("-created_at").values_list("created_at", flat=True).first()
+        if read_at is None:
+            return None
+    return advance_read_cursor(user, read_at, chat=chat, group=group)
@@ -1,7 +1,8 @@
 from django.urls import re_path
-from .consumers import ChatConsumer,GroupConsumer
+from .consumers import ChatConsumer, GroupConsumer, MultiplexConsumer
 
 websocket_urlpatterns = [
+    re_path(r'ws/chat/$', MultiplexConsumer.as_asgi()),
     re_path(r'ws/chat/(?P<room_name>[\w-]+)/$', ChatConsumer.as_asgi()),
     re_path(r'ws/chat/group/(?P<group_id>[^/]+)/$', GroupConsumer.as_asgi()),
 ]
\ No newline at end of file
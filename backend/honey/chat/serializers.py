@@ -1,15 +1,20 @@
 from rest_framework import serializers
+from authentication.models import UserModel
 from authentication.serializers import UserSerializer
+from core.images import RenditionsField
 from .models import GroupModel, MessageModel, ChatModel
 
 
 class GroupSerializer(serializers.ModelSerializer):
     admin = UserSerializer(read_only=True)
     members = UserSerializer(many=True, read_only=True)
+    unread_count = serializers.IntegerField(read_only=True, default=0)
+    avatar_renditions = RenditionsField('avatar')
 
     class Meta:
         model = GroupModel
-        fields = ['id', 'name', 'description', 'avatar', 'admin', 'members', 'is_public', 'group_type']
+        fields = ['id', 'name', 'description', 'avatar', 'avatar_renditions', 'admin', 'members', 'is_public', 'group_type',
+                  'unread_count']
 
 
 class AddMemberSerializer(serializers.Serializer):
@@ -28,9 +33,40 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ("id", "sender", "receiver", "group", "content", "message_type", "file", "read_by", "created_at")
 
 
+class CompactMessageSerializer(serializers.ModelSerializer):
+    """
+    Message with related objects as ids. Users are side-loaded once per page
+    via get_side_loaded_users instead of being nested into every message.
+    """
+    sender = serializers.PrimaryKeyRelatedField(read_only=True, pk_field=serializers.UUIDField())
+    receiver = serializers.PrimaryKeyRelatedField(read_only=True, pk_field=serializers.UUIDField())
+    group = serializers.PrimaryKeyRelatedField(read_only=True, pk_field=serializers.UUIDField())
+    chat = serializers.PrimaryKeyRelatedField(read_only=True, pk_field=serializers.UUIDField())
+    read_by = serializers.PrimaryKeyRelatedField(many=True, read_only=True, pk_field=serializers.UUIDField())
+    file = serializers.FileField(required=False, allow_null=True)
+
+    class Meta:
+        model = MessageModel
+        fields = ("id", "sender", "receiver", "group", "chat", "content", "message_type", "file", "read_by",
+                  "created_at")
+
+
+def get_side_loaded_users(messages, context=None):
+    user_ids = set()
+    for message in messages:
+        user_ids.add(message.sender_id)
+        if message.receiver_id:
+            user_ids.add(message.receiver_id)
+    if not user_ids:
+        return {}
+    users = UserModel.objects.filter(id__in=user_ids)
+    return {str(user["id"]): user for user in UserSerializer(users, many=True, context=context).data}
+
+
 class ChatSerializer(serializers.ModelSerializer):
     other_user = serializers.SerializerMethodField()
-    last_message = MessageSerializer(read_only=True)
+    last_message = CompactMessageSerializer(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True, default=0)
 
     class Meta:
         model = ChatModel
@@ -38,6 +74,7 @@ class ChatSerializer(serializers.ModelSerializer):
             "id",
             "other_user",
             "last_message",
+            "unread_count",
             "updated_at",
         )
 
@@ -45,8 +82,12 @@ class ChatSerializer(serializers.ModelSerializer):
         request = self.context.get("request")
         user = request.user
 
-        other = obj.user2 if obj.user1 == user else obj.user1
-        return UserSerializer(other).data
+        other = obj.user2 if obj.user1_id == user.id else obj.user1
+        return UserSerializer(other, context=self.context).data
+
+
+class MarkReadSerializer(serializers.Serializer):
+    message_id = serializers.UUIDField(required=False, help_text="Read up to this message. Defaults to the latest.")
 
 
 class SendMessageSerializer(serializers.ModelSerializer):
@@ -0,0 +1,42 @@
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from .events import membership_revoked_event, send_on_commit
+from .models import GroupModel
+from .read_state import start_read_cursors
+
+
+def revoke_group_access(pairs):
+    """Tell (user_id, group_id) pairs' open sockets to drop the group once the change commits."""
+    send_on_commit([(f"user_{user_id}", membership_revoked_event(group_id)) for user_id, group_id in pairs])
+
+
+@receiver(m2m_changed, sender=GroupModel.members.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # pk_set is None for clear(); remember who is about to go
+        if reverse:
+            instance._cleared_pairs = [(instance.pk, group_id) for group_id in
+                                       instance.group_members.values_list("id", flat=True)]
+        else:
+            instance._cleared_pairs = [(user_id, instance.pk) for user_id in
+                                       instance.members.values_list("id", flat=True)]
+    elif action == "post_clear":
+        revoke_group_access(getattr(instance, "_cleared_pairs", []))
+    elif action == "post_add":
+        if reverse:
+            for group_id in pk_set:
+                start_read_cursors(group_id, [instance.pk])
+        else:
+            start_read_cursors(instance.pk, pk_set)
+    elif action == "post_remove":
+        if reverse:
+            revoke_group_access([(instance.pk, group_id) for group_id in pk_set])
+        else:
+            revoke_group_access([(user_id, instance.pk) for user_id in pk_set])
+
+
+@receiver(pre_delete, sender=GroupModel)
+def group_deleted(sender, instance, **kwargs):
+    # Membership rows go with the group without m2m_changed
+    revoke_group_access([(user_id, instance.pk) for user_id in instance.members.values_list("id", flat=True)])
@@ -1,3 +1,635 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.blacklist import blacklist_access_token
+from authentication.models import UserModel
+from .consumers import MultiplexConsumer
+from .middleware import JWTHeaderAuthMiddleware
+from .models import ChatModel, GroupModel, MessageModel
+from .presence import InMemoryPresenceBackend
+from .protocol import JSON_PROTOCOL, MSGPACK_PROTOCOL, FrameCodecMixin
+
+
+class ChatListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user("owner", "owner@example.com", "pass", phone="+998900000000")
+        for i in range(1, 13):
+            other = UserModel.objects.create_user(f"user{i}", f"user{i}@example.com", "pass",
+                                                  phone=f"+9989000000{i:02d}")
+            chat, _ = ChatModel.objects.get_or_create_between(cls.user, other)
+            for j in range(3):
+                message = MessageModel.objects.create(sender=other, receiver=cls.user, chat=chat, content=str(j))
+                message.read_by.add(other)
+            chat.last_message = message
+            chat.save(update_fields=["last_message", "updated_at"])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_does_not_grow_with_chats(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/v1/chat/chats/")
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[0]["other_user"]["username"], "user12")
+        self.assertEqual(results[0]["unread_count"], 3)
+        self.assertEqual(results[0]["last_message"]["content"], "2")
+
+    def test_list_is_paginated_by_updated_at(self):
+        first = self.client.get("/api/v1/chat/chats/?limit=5").json()
+        self.assertTrue(first["has_more"])
+
+        second = self.client.get(f"/api/v1/chat/chats/?limit=5&before={first['next_cursor']}").json()
+        usernames = [chat["other_user"]["username"] for chat in first["results"] + second["results"]]
+        self.assertEqual(usernames, [f"user{i}" for i in range(12, 2, -1)])
+
+
+class SendMessageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user("sender", "sender@example.com", "pass", phone="+998902000000")
+        cls.other = UserModel.objects.create_user("receiver", "receiver@example.com", "pass", phone="+998902000001")
+        cls.chat, _ = ChatModel.objects.get_or_create_between(cls.user, cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, content):
+        return self.client.post(f"/api/v1/chat/chats/{self.chat.pk}/send/", {"content": content}, format="json")
+
+    def test_both_users_are_told_once_the_message_commits(self):
+        with mock.patch("chat.events.get_channel_layer") as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.send("hi")
+            self.assertEqual(response.status_code, 201)
+            layer.return_value.group_send.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        groups = sorted(call.args[0] for call in layer.return_value.group_send.call_args_list)
+        self.assertEqual(groups, sorted([f"user_{self.user.id}", f"user_{self.other.id}"]))
+
+    def test_a_failing_channel_layer_does_not_fail_the_send(self):
+        with mock.patch("chat.events.get_channel_layer") as layer, self.assertLogs("chat.events", "ERROR"):
+            layer.return_value.group_send = mock.AsyncMock(side_effect=ConnectionError("redis down"))
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.send("hi")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MessageModel.objects.filter(chat=self.chat).count(), 1)
+
+    def test_a_send_committing_late_does_not_replace_a_newer_last_message(self):
+        newer = MessageModel.objects.create_in_chat(self.chat, sender=self.user, receiver=self.other, content="new")
+        # Stamped before the newer one, as if its transaction had stalled
+        with mock.patch("django.utils.timezone.now", return_value=newer.created_at - timedelta(seconds=1)):
+            MessageModel.objects.create_in_chat(self.chat, sender=self.other, receiver=self.user, content="old")
+
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.last_message_id, newer.pk)
+        self.assertEqual(self.chat.updated_at, newer.created_at)
+
+
+class MessageHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user("history", "history@example.com", "pass", phone="+998905000000")
+        cls.other = UserModel.objects.create_user("friend", "friend@example.com", "pass", phone="+998905000001")
+        cls.chat, _ = ChatModel.objects.get_or_create_between(cls.user, cls.other)
+        cls.messages = [
+            MessageModel.objects.create_in_chat(cls.chat, sender=cls.other, receiver=cls.user, content=str(i))
+            for i in range(7)
+        ]
+        # A tie in created_at, which only the id breaks
+        MessageModel.objects.filter(pk__in=[m.pk for m in cls.messages[2:5]]).update(
+            created_at=cls.messages[2].created_at,
+        )
+        cls.expected = [
+            str(m.pk) for m in MessageModel.objects.filter(chat=cls.chat).order_by("created_at", "id")
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def page(self, **params):
+        response = self.client.get(f"/api/v1/chat/chats/{self.chat.pk}/messages/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, page):
+        return [message["id"] for message in page["results"]]
+
+    def test_the_first_page_is_the_newest_in_chronological_order(self):
+        page = self.page(limit=3)
+
+        self.assertEqual(self.ids(page), self.expected[-3:])
+        self.assertIsNotNone(page["previous_cursor"])
+        self.assertFalse(page["has_more"])
+
+    def test_before_walks_back_through_ties_without_gaps(self):
+        pages, cursor = [], None
+        while True:
+            page = self.page(limit=2, **({"before": cursor} if cursor else {}))
+            pages.insert(0, self.ids(page))
+            cursor = page["previous_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual([len(ids) for ids in pages], [1, 2, 2, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_since_pages_forward(self):
+        oldest = self.page(limit=2, before=self.page(limit=5)["previous_cursor"])
+        self.assertEqual(self.ids(oldest), self.expected[:2])
+
+        newer = self.page(limit=3, since=oldest["next_cursor"])
+        self.assertEqual(self.ids(newer), self.expected[2:5])
+        self.assertTrue(newer["has_more"])
+
+        rest = self.page(limit=3, since=newer["next_cursor"])
+        self.assertEqual(self.ids(rest), self.expected[5:])
+        self.assertFalse(rest["has_more"])
+
+    def test_since_the_newest_message_is_empty_and_keeps_the_cursor(self):
+        cursor = self.page()["next_cursor"]
+        page = self.page(since=cursor)
+
+        self.assertEqual(page["results"], [])
+        self.assertEqual(page["next_cursor"], cursor)
+        MessageModel.objects.create_in_chat(self.chat, sender=self.user, receiver=self.other, content="new")
+        self.assertEqual([m["content"] for m in self.page(since=cursor)["results"]], ["new"])
+
+    def test_invalid_cursors_are_rejected(self):
+        cursor = self.page()["next_cursor"]
+        for params in [{"before": "garbage"}, {"since": "bm90fGEtdXVpZA"}, {"before": cursor, "since": cursor}]:
+            with self.subTest(params):
+                response = self.client.get(f"/api/v1/chat/chats/{self.chat.pk}/messages/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_group_history_is_paginated_the_same_way(self):
+        group = GroupModel.objects.create(name="group", admin=self.user)
+        group.members.add(self.user)
+        sent = [MessageModel.objects.create(sender=self.user, group=group, content=str(i)) for i in range(3)]
+
+        response = self.client.get(f"/api/v1/chat/groups/{group.pk}/messages/", {"limit": 2})
+        self.assertEqual(self.ids(response.json()), [str(m.pk) for m in sent[1:]])
+        response = self.client.get(
+            f"/api/v1/chat/groups/{group.pk}/messages/", {"before": response.json()["previous_cursor"]},
+        )
+        self.assertEqual(self.ids(response.json()), [str(sent[0].pk)])
+
+
+class MessageChatBackfillTests(TransactionTestCase):
+    before = [("chat", "0003_message_history_indexes")]
+    after = [("chat", "0004_messagemodel_chat")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.before)
+        # Back to the latest migrations afterwards, for the tests that follow
+        self.addCleanup(self.migrate, MigrationExecutor(connection).loader.graph.leaf_nodes())
+        self.ChatModel = apps.get_model("chat", "ChatModel")
+        self.MessageModel = apps.get_model("chat", "MessageModel")
+        # Only the chat app is rolled back; users are made with the current model and referenced by id
+        self.users = [
+            UserModel.objects.create_user(f"user{i}", f"user{i}@example.com", "pass", phone=f"+99890600000{i}").pk
+            for i in range(3)
+        ]
+
+    def message(self, sender, receiver, content):
+        return self.MessageModel.objects.create(sender_id=sender, receiver_id=receiver, content=content).pk
+
+    def test_messages_get_their_chat_and_missing_chats_are_created(self):
+        a, b, c = self.users
+        existing = self.ChatModel.objects.create(user1_id=a, user2_id=b)
+        with_chat = [self.message(a, b, "1"), self.message(b, a, "2")]
+        # Only ever sent over the WebSocket, so there is no chat row
+        without_chat = [self.message(c, a, "3"), self.message(a, c, "4")]
+
+        apps = self.migrate(self.after)
+        ChatModel = apps.get_model("chat", "ChatModel")
+        MessageModel = apps.get_model("chat", "MessageModel")
+
+        self.assertEqual(
+            set(MessageModel.objects.filter(pk__in=with_chat).values_list("chat_id", flat=True)), {existing.pk},
+        )
+        created = ChatModel.objects.exclude(pk=existing.pk).get()
+        self.assertEqual(sorted([created.user1_id, created.user2_id]), sorted([a, c]))
+        self.assertEqual(
+            set(MessageModel.objects.filter(pk__in=without_chat).values_list("chat_id", flat=True)), {created.pk},
+        )
+        latest = MessageModel.objects.get(pk=without_chat[-1])
+        self.assertEqual(created.last_message_id, latest.pk)
+        self.assertEqual(created.updated_at, latest.created_at)
+
+    def test_group_messages_are_left_alone(self):
+        a = self.users[0]
+        group = self.MessageModel._meta.get_field("group").related_model.objects.create(name="group", admin_id=a)
+        message = self.MessageModel.objects.create(sender_id=a, group=group, content="hi")
+
+        apps = self.migrate(self.after)
+        self.assertIsNone(apps.get_model("chat", "MessageModel").objects.get(pk=message.pk).chat_id)
+        self.assertFalse(apps.get_model("chat", "ChatModel").objects.exists())
+
+
+class CompactMessageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserModel.objects.create_user("admin", "admin@example.com", "pass", phone="+998907000000")
+        cls.members = [
+            UserModel.objects.create_user(f"member{i}", f"member{i}@example.com", "pass", phone=f"+9989070001{i:02d}")
+            for i in range(20)
+        ]
+        cls.group = GroupModel.objects.create(name="group", admin=cls.admin)
+        cls.group.members.add(cls.admin, *cls.members)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, sender, read_by=()):
+        message = MessageModel.objects.create(sender=sender, group=self.group, content="hi")
+        message.read_by.add(*read_by)
+        return message
+
+    def history(self, **params):
+        response = self.client.get(f"/api/v1/chat/groups/{self.group.pk}/messages/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_related_objects_are_ids_and_users_are_side_loaded_once(self):
+        first = self.post(self.members[0], read_by=self.members[:5])
+        self.post(self.members[0])
+        self.post(self.members[1])
+
+        page = self.history()
+        message = page["results"][0]
+        self.assertEqual(message["id"], str(first.pk))
+        self.assertEqual(message["sender"], str(self.members[0].pk))
+        self.assertEqual(message["group"], str(self.group.pk))
+        self.assertIsNone(message["receiver"])
+        self.assertEqual(sorted(message["read_by"]), sorted(str(user.pk) for user in self.members[:5]))
+        # Senders only; group members and readers are not expanded
+        self.assertEqual(set(page["users"]), {str(self.members[0].pk), str(self.members[1].pk)})
+        self.assertEqual(page["users"][str(self.members[1].pk)]["username"], "member1")
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.post(self.members[0], read_by=self.members)
+        with CaptureQueriesContext(connection) as small:
+            self.history()
+
+        for member in self.members:
+            self.post(member, read_by=self.members)
+        with CaptureQueriesContext(connection) as large:
+            page = self.history()
+
+        self.assertEqual(len(page["results"]), 21)
+        self.assertEqual(len(large), len(small))
+
+
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserModel.objects.create_user("admin", "admin@example.com", "pass", phone="+998903000000")
+        cls.user = UserModel.objects.create_user("reader", "reader@example.com", "pass", phone="+998903000001")
+        cls.group = GroupModel.objects.create(name="group", admin=cls.admin)
+        cls.group.members.add(cls.admin)
+        cls.chat, _ = ChatModel.objects.get_or_create_between(cls.user, cls.admin)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_to_group(self, count=1):
+        return [MessageModel.objects.create(sender=self.admin, group=self.group, content=str(i)) for i in range(count)]
+
+    def post_to_chat(self, count=1, sender=None):
+        return [
+            MessageModel.objects.create_in_chat(
+                self.chat, sender=sender or self.admin, receiver=self.user, content=str(i),
+            )
+            for i in range(count)
+        ]
+
+    def group_unread(self):
+        [group] = self.client.get("/api/v1/chat/groups/").json()
+        return group["unread_count"]
+
+    def chat_unread(self):
+        [chat] = self.client.get("/api/v1/chat/chats/").json()["results"]
+        return chat["unread_count"]
+
+    def read_chat(self, message=None):
+        data = {"message_id": str(message.pk)} if message else {}
+        return self.client.post(f"/api/v1/chat/chats/{self.chat.pk}/read/", data, format="json")
+
+    def test_a_new_member_starts_with_nothing_unread(self):
+        self.post_to_group(3)
+        self.group.members.add(self.user)
+        self.assertEqual(self.group_unread(), 0)
+
+        self.post_to_group()
+        self.assertEqual(self.group_unread(), 1)
+
+    def test_a_member_added_from_the_user_side_starts_with_nothing_unread(self):
+        self.post_to_group(3)
+        self.user.group_members.add(self.group)
+
+        self.assertEqual(self.group_unread(), 0)
+
+    def test_a_returning_member_skips_what_was_sent_while_away(self):
+        self.group.members.add(self.user)
+        self.post_to_group(2)
+        self.group.members.remove(self.user)
+        self.post_to_group(2)
+        self.group.members.add(self.user)
+
+        self.assertEqual(self.group_unread(), 0)
+
+    def test_own_messages_are_never_unread(self):
+        self.post_to_chat(2)
+        self.post_to_chat(2, sender=self.user)
+
+        self.assertEqual(self.chat_unread(), 2)
+
+    def test_mark_read_up_to_a_message(self):
+        first, second, third = self.post_to_chat(3)
+
+        response = self.read_chat(second)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.chat_unread(), 1)
+
+        self.assertEqual(self.read_chat().status_code, 200)
+        self.assertEqual(self.chat_unread(), 0)
+
+    def test_mark_read_never_moves_the_cursor_back(self):
+        first, second = self.post_to_chat(2)
+        self.read_chat()
+
+        response = self.read_chat(first)
+        self.assertEqual(parse_datetime(response.json()["last_read_at"]), second.created_at)
+        self.assertEqual(self.chat_unread(), 0)
+
+    def test_mark_read_of_a_message_from_another_conversation(self):
+        [message] = self.post_to_group()
+
+        self.assertEqual(self.read_chat(message).status_code, 404)
+
+
+class WebSocketAuthTests(TransactionTestCase):
+    # The handshake queries run on another thread, outside TestCase's transaction
+    def setUp(self):
+        self.user = UserModel.objects.create_user("socket", "socket@example.com", "pass", phone="+998904000000")
+        self.token = AccessToken.for_user(self.user)
+
+    def handshake_user(self, headers=(), query_string=b"", subprotocols=()):
+        scopes = []
+
+        async def inner(scope, receive, send):
+            scopes.append(scope)
+
+        scope = {
+            "type": "websocket", "path": "/ws/", "headers": list(headers),
+            "query_string": query_string, "subprotocols": list(subprotocols),
+        }
+        async_to_sync(JWTHeaderAuthMiddleware(inner))(scope, None, None)
+        return scopes[0]["user"]
+
+    def test_authorization_header(self):
+        user = self.handshake_user(headers=[(b"authorization", f"Bearer {self.token}".encode())])
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_query_string(self):
+        user = self.handshake_user(query_string=f"token={self.token}".encode())
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_subprotocol(self):
+        user = self.handshake_user(subprotocols=["honey.json.v1", f"bearer.{self.token}"])
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_missing_or_invalid_tokens_are_anonymous(self):
+        self.assertFalse(self.handshake_user().is_authenticated)
+        self.assertFalse(self.handshake_user(query_string=b"token=garbage").is_authenticated)
+
+    def test_a_blacklisted_token_is_rejected(self):
+        self.assertTrue(self.handshake_user(query_string=f"token={self.token}".encode()).is_authenticated)
+        blacklist_access_token(self.token)
+
+        self.assertFalse(self.handshake_user(query_string=f"token={self.token}".encode()).is_authenticated)
+
+    def test_deactivation_applies_to_the_next_handshake(self):
+        self.assertTrue(self.handshake_user(query_string=f"token={self.token}".encode()).is_authenticated)
+        UserModel.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertFalse(self.handshake_user(query_string=f"token={self.token}".encode()).is_authenticated)
+
+
+class FrameCodec(FrameCodecMixin):
+    def __init__(self, *subprotocols):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.sent = []
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent.append(text_data if bytes_data is None else bytes_data)
+
+
+class FrameCodecTests(SimpleTestCase):
+    def test_negotiation(self):
+        for offered, chosen, protocol in [
+            ([], None, JSON_PROTOCOL),
+            ([JSON_PROTOCOL], JSON_PROTOCOL, JSON_PROTOCOL),
+            ([JSON_PROTOCOL, MSGPACK_PROTOCOL], MSGPACK_PROTOCOL, MSGPACK_PROTOCOL),
+            (["bearer.token", MSGPACK_PROTOCOL], MSGPACK_PROTOCOL, MSGPACK_PROTOCOL),
+            (["something.else"], None, JSON_PROTOCOL),
+        ]:
+            with self.subTest(offered):
+                codec = FrameCodec(*offered)
+                self.assertEqual(codec.negotiate_protocol(), chosen)
+                self.assertEqual(codec.protocol, protocol)
+
+    def test_msgpack_frames_are_binary(self):
+        codec = FrameCodec(MSGPACK_PROTOCOL)
+        codec.negotiate_protocol()
+        payload = {"type": "message", "message": {"content": "salom 🍯", "id": 1}}
+
+        async_to_sync(codec.send_frame)(payload)
+        [frame] = codec.sent
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(msgpack.unpackb(frame, raw=False), payload)
+        self.assertEqual(codec.decode_frame(bytes_data=frame), payload)
+
+    def test_json_fallback(self):
+        codec = FrameCodec()
+        codec.negotiate_protocol()
+
+        async_to_sync(codec.send_frame)({"type": "pong"})
+        self.assertEqual(codec.sent, ['{"type": "pong"}'])
+        # A JSON client's frames are read whatever was negotiated, and so are binary ones
+        self.assertEqual(codec.decode_frame(text_data='{"type": "ping"}'), {"type": "ping"})
+        self.assertEqual(codec.decode_frame(bytes_data=msgpack.packb({"type": "ping"})), {"type": "ping"})
+
+    def test_malformed_frames(self):
+        codec = FrameCodec()
+        self.assertIsNone(codec.decode_frame())
+        for frame, error in [
+            ({"text_data": "{"}, "Invalid JSON"),
+            ({"bytes_data": b"\xc1"}, "Invalid MessagePack"),
+            ({"text_data": "[1, 2]"}, "Frame must be an object"),
+            ({"bytes_data": msgpack.packb("text")}, "Frame must be an object"),
+        ]:
+            with self.subTest(frame):
+                with self.assertRaisesMessage(ValueError, error):
+                    codec.decode_frame(**frame)
+
+
+class InMemoryPresenceTests(TransactionTestCase):
+    # The flush timer writes from its own thread, so the rows must be committed
+
+    def setUp(self):
+        self.user = UserModel.objects.create_user("online", "online@example.com", "pass", phone="+998901000000")
+        self.backend = InMemoryPresenceBackend(timeout=90, flush_interval=0.05)
+        # Whatever the test leaves buffered is flushed now rather than at exit
+        self.addCleanup(self.backend.flush)
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the presence flush")
+            time.sleep(0.01)
+
+    def stored(self, user=None):
+        return UserModel.objects.values("online", "last_seen").get(pk=(user or self.user).pk)
+
+    def test_connect_and_disconnect_are_flushed_by_the_timer(self):
+        self.backend.connect(self.user.id, "channel-1")
+        self.wait_for(lambda: self.stored()["online"])
+        self.assertIsNotNone(self.stored()["last_seen"])
+
+        self.backend.disconnect(self.user.id, "channel-1")
+        self.wait_for(lambda: not self.stored()["online"])
+
+    def test_a_failed_flush_is_retried_without_another_change(self):
+        bulk_update = UserModel.objects.bulk_update
+        failures = [RuntimeError]
+
+        def fail_once(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(UserModel.objects, "bulk_update", side_effect=fail_once), \
+                self.assertLogs("chat.presence", "ERROR"):
+            self.backend.connect(self.user.id, "channel-1")
+            self.wait_for(lambda: self.stored()["online"])
+
+    def test_a_failed_flush_keeps_the_pending_last_seen(self):
+        backend = InMemoryPresenceBackend(timeout=90, flush_interval=3600)
+        backend.connect(self.user.id, "channel-1")
+        with mock.patch.object(UserModel.objects, "bulk_update", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                backend.flush()
+
+        self.assertIn(str(self.user.id), backend.pending_last_seen([self.user.id]))
+        self.assertEqual(backend.flush(), 1)
+        self.assertTrue(self.stored()["online"])
+
+    def test_users_left_online_by_a_dead_process_are_reset(self):
+        stale = UserModel.objects.create_user("stale", "stale@example.com", "pass", phone="+998901000001")
+        UserModel.objects.filter(pk__in=[stale.pk, self.user.pk]).update(online=True)
+
+        self.backend.connect(self.user.id, "channel-1")
+        self.assertFalse(self.stored(stale)["online"])
+        self.wait_for(lambda: self.stored()["online"])
+
+
+class MultiplexMembershipTests(TransactionTestCase):
+    # Membership changes are announced on commit, so this can't run inside TestCase's transaction
+
+    def test_msgpack_clients_get_binary_frames(self):
+        admin = UserModel.objects.create_user("admin", "admin@example.com", "pass", phone="+998902000000")
+        group = GroupModel.objects.create(name="group", admin=admin)
+        group.members.add(admin)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                MultiplexConsumer.as_asgi(), "/ws/", subprotocols=[JSON_PROTOCOL, MSGPACK_PROTOCOL],
+            )
+            communicator.scope["user"] = admin
+            _, subprotocol = await communicator.connect()
+            await communicator.send_to(bytes_data=msgpack.packb({"type": "subscribe", "group_ids": [str(group.id)]}))
+            subscribed = await communicator.receive_from()
+            await communicator.send_to(bytes_data=b"\xc1")
+            error = await communicator.receive_from()
+            await communicator.disconnect()
+            return subprotocol, subscribed, error
+
+        subprotocol, subscribed, error = async_to_sync(scenario)()
+        self.assertEqual(subprotocol, MSGPACK_PROTOCOL)
+        self.assertEqual(msgpack.unpackb(subscribed)["group_ids"], [str(group.id)])
+        self.assertEqual(msgpack.unpackb(error), {"type": "error", "message": "Invalid MessagePack"})
+
+    def test_json_clients_get_text_frames(self):
+        admin = UserModel.objects.create_user("admin", "admin@example.com", "pass", phone="+998902000000")
+
+        async def scenario():
+            communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), "/ws/")
+            communicator.scope["user"] = admin
+            _, subprotocol = await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"type": "subscribe", "group_ids": []}))
+            subscribed = await communicator.receive_from()
+            await communicator.disconnect()
+            return subprotocol, subscribed
+
+        subprotocol, subscribed = async_to_sync(scenario)()
+        self.assertIsNone(subprotocol)
+        self.assertEqual(json.loads(subscribed)["type"], "subscribed")
+
+    def test_removed_member_is_unsubscribed(self):
+        admin = UserModel.objects.create_user("admin", "admin@example.com", "pass", phone="+998902000000")
+        member = UserModel.objects.create_user("member", "member@example.com", "pass", phone="+998902000001")
+        group = GroupModel.objects.create(name="group", admin=admin)
+        group.members.add(admin, member)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), "/ws/")
+            communicator.scope["user"] = member
+            await communicator.connect()
+            await communicator.send_json_to({"type": "subscribe", "group_ids": [str(group.id)]})
+            await communicator.receive_json_from()
+
+            await sync_to_async(group.members.remove)(member)
+            revoked = await communicator.receive_json_from()
+            await communicator.send_json_to({"type": "group_message", "group_id": str(group.id), "content": "hi"})
+            rejected = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return revoked, rejected
+
+        revoked, rejected = async_to_sync(scenario)()
+        self.assertEqual(revoked["type"], "unsubscribed")
+        self.assertEqual(revoked["group_ids"], [str(group.id)])
+        self.assertEqual(rejected, {"type": "error", "message": "Not subscribed to this group"})
@@ -1,5 +1,5 @@
 from django.urls import path
-from chat.views import GroupViewSet, ChatViewSet, GlobalSearchViewSet, MessageViewSet
+from chat.views import GroupViewSet, ChatViewSet, GlobalSearchViewSet, MessageViewSet, PresenceViewSet
 from chat.ai_views import AIChatViewSet
 
 app_name = "chat"
@@ -13,11 +13,13 @@ urlpatterns = [
     path("groups/<uuid:pk>/add-member/", GroupViewSet.as_view({"post": "add_member"}), name="group-add-member"),
     path("groups/<uuid:pk>/messages/", GroupViewSet.as_view({"get": "messages"}), name="group-messages"),
     path("groups/<uuid:pk>/send/", GroupViewSet.as_view({"post": "send_message"}), name="group-send"),
+    path("groups/<uuid:pk>/read/", GroupViewSet.as_view({"post": "mark_read"}), name="group-read"),
     # Chats
     path("chats/", ChatViewSet.as_view({"get": "list", "post": "create"})),
     path("chats/<uuid:pk>/", ChatViewSet.as_view({"get": "retrieve"})),
     path("chats/<uuid:pk>/messages/", ChatViewSet.as_view({"get": "messages"})),
     path("chats/<uuid:pk>/send/", ChatViewSet.as_view({"post": "send_message"})),
+    path("chats/<uuid:pk>/read/", ChatViewSet.as_view({"post": "mark_read"})),
     
     # AI
     path("ai/chat/", AIChatViewSet.as_view({"post": "chat"}), name="ai-chat"),
@@ -29,4 +31,7 @@ urlpatterns = [
     
     # Messages
     path("messages/<uuid:pk>/", MessageViewSet.as_view({"delete": "destroy"}), name="message-detail"),
+
+    # Presence
+    path("presence/", PresenceViewSet.as_view({"get": "lookup"}), name="presence-lookup"),
 ]
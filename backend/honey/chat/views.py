@@ -1,4 +1,5 @@
-from django.db.models import Q
+import uuid
+from django.db.models import Q, Prefetch
 from drf_yasg import openapi
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -9,7 +10,48 @@ from drf_yasg.utils import swagger_auto_schema
 from .models import GroupModel, MessageModel, ChatModel
 from authentication.models import UserModel
 from authentication.serializers import UserSerializer
-from .serializers import GroupSerializer, MessageSerializer, AddMemberSerializer, ChatSerializer, SendMessageSerializer
+from .serializers import GroupSerializer, MessageSerializer, AddMemberSerializer, ChatSerializer, SendMessageSerializer, \
+    CompactMessageSerializer, get_side_loaded_users, MarkReadSerializer
+from .pagination import MessageCursorPagination, ChatCursorPagination
+from .presence import get_presence
+from .read_state import with_unread_counts, mark_read
+from .events import read_receipt_event, chat_updated_event, send_on_commit
+
+message_page_parameters = [
+    openapi.Parameter("before", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Cursor: return messages older than this one"),
+    openapi.Parameter("since", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Cursor: return messages newer than this one (reconnect delta)"),
+    openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Page size (max 100)"),
+]
+
+
+def message_page_queryset(**filters):
+    return MessageModel.objects.filter(**filters).prefetch_related(
+        Prefetch("read_by", queryset=UserModel.objects.only("id"))
+    )
+
+
+def mark_read_response(request, chat=None, group=None, notify_group=None):
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        last_read_at = mark_read(request.user, chat=chat, group=group,
+                                 message_id=serializer.validated_data.get("message_id"))
+    except MessageModel.DoesNotExist:
+        return Response({"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if last_read_at is not None:
+        send_on_commit([(notify_group, read_receipt_event(request.user, last_read_at, chat=chat, group=group))])
+    return Response({"last_read_at": last_read_at}, status=status.HTTP_200_OK)
+
+
+def message_page_data(paginator, messages, request):
+    context = {"request": request}
+    data = paginator.get_paginated_data(CompactMessageSerializer(messages, many=True, context=context).data)
+    data["users"] = get_side_loaded_users(messages, context=context)
+    return data
 
 
 class GroupViewSet(viewsets.ViewSet):
@@ -43,7 +85,7 @@ class GroupViewSet(viewsets.ViewSet):
         tags=["Groups"]
     )
     def list(self, request):
-        groups = GroupModel.objects.filter(members=request.user)
+        groups = with_unread_counts(GroupModel.objects.filter(members=request.user), request.user, "group")
         serializer = GroupSerializer(groups, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -141,10 +183,11 @@ class GroupViewSet(viewsets.ViewSet):
         return Response({'status': 'added'}, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
-        operation_summary="Get all messages in a group",
-        operation_description="Returns all messages of a specific group ordered by creation date.",
+        operation_summary="Get messages in a group",
+        operation_description="Returns a cursor-paginated page of group messages ordered by creation date.",
+        manual_parameters=message_page_parameters,
         responses={
-            200: MessageSerializer(many=True),
+            200: CompactMessageSerializer(many=True),
             404: "Group not found"
         },
         tags=["Groups"]
@@ -154,9 +197,26 @@ class GroupViewSet(viewsets.ViewSet):
         if not group:
             return Response({'message': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        messages = MessageModel.objects.filter(group=group).select_related('sender').order_by('created_at')
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = MessageCursorPagination(request)
+        messages = paginator.paginate_queryset(message_page_queryset(group=group))
+        return Response(message_page_data(paginator, messages, request), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Mark group messages as read",
+        operation_description="Moves the current user's read cursor up to message_id (or the latest message).",
+        request_body=MarkReadSerializer,
+        responses={200: "Read cursor", 403: "Not a member", 404: "Group or message not found"},
+        tags=["Groups"]
+    )
+    def mark_read(self, request, pk=None):
+        group = GroupModel.objects.filter(id=pk).first()
+        if not group:
+            return Response({'message': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not group.members.filter(id=request.user.id).exists():
+            return Response({'error': 'Not a member of this group'}, status=status.HTTP_403_FORBIDDEN)
+
+        return mark_read_response(request, group=group, notify_group=f"group_{group.id}")
 
     @swagger_auto_schema(
         operation_summary="Send message to group",
@@ -213,17 +273,30 @@ class ChatViewSet(viewsets.ViewSet):
 
     @swagger_auto_schema(
         operation_summary="List user chats",
-        operation_description="Returns all chats where the current user participates.",
+        operation_description="Returns a cursor-paginated page of the current user's chats, most recently "
+                              "updated first.",
+        manual_parameters=[
+            openapi.Parameter("before", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Cursor from next_cursor of the previous page"),
+            openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Page size (max 100)"),
+        ],
         responses={200: ChatSerializer(many=True)},
         tags=["Chats"]
     )
     def list(self, request):
-        chats = ChatModel.objects.filter(
-            Q(user1=request.user) | Q(user2=request.user)
-        ).select_related("last_message").order_by("-updated_at")
+        # Fixed cost per page: one query for chats, users and last message, one for last message read_by
+        chats = with_unread_counts(
+            ChatModel.objects.filter(Q(user1=request.user) | Q(user2=request.user)),
+            request.user, "chat"
+        ).select_related("user1", "user2", "last_message").prefetch_related(
+            Prefetch("last_message__read_by", queryset=UserModel.objects.only("id"))
+        )
 
+        paginator = ChatCursorPagination(request)
+        chats = paginator.paginate_queryset(chats)
         serializer = ChatSerializer(chats, many=True, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="Create or get chat",
@@ -247,12 +320,7 @@ class ChatViewSet(viewsets.ViewSet):
         if not other_user:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        user1, user2 = sorted([request.user, other_user], key=lambda u: u.id)
-
-        chat, created = ChatModel.objects.get_or_create(
-            user1=user1,
-            user2=user2
-        )
+        chat, created = ChatModel.objects.get_or_create_between(request.user, other_user)
 
         serializer = ChatSerializer(chat, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
@@ -277,8 +345,9 @@ class ChatViewSet(viewsets.ViewSet):
 
     @swagger_auto_schema(
         operation_summary="Get chat messages",
-        operation_description="Returns all messages in a chat.",
-        responses={200: MessageSerializer(many=True)},
+        operation_description="Returns a cursor-paginated page of messages in a chat.",
+        manual_parameters=message_page_parameters,
+        responses={200: CompactMessageSerializer(many=True)},
         tags=["Chats"]
     )
     def messages(self, request, pk=None):
@@ -290,13 +359,28 @@ class ChatViewSet(viewsets.ViewSet):
         if not chat:
             return Response({"message": "Chat not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        messages = MessageModel.objects.filter(
-            receiver__in=[chat.user1, chat.user2],
-            sender__in=[chat.user1, chat.user2]
-        ).select_related('sender', 'receiver').order_by("created_at")
+        paginator = MessageCursorPagination(request)
+        messages = paginator.paginate_queryset(message_page_queryset(chat=chat))
+        return Response(message_page_data(paginator, messages, request), status=status.HTTP_200_OK)
 
-        serializer = MessageSerializer(messages, many=True, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    @swagger_auto_schema(
+        operation_summary="Mark chat messages as read",
+        operation_description="Moves the current user's read cursor up to message_id (or the latest message).",
+        request_body=MarkReadSerializer,
+        responses={200: "Read cursor", 404: "Chat or message not found"},
+        tags=["Chats"]
+    )
+    def mark_read(self, request, pk=None):
+        chat = ChatModel.objects.filter(
+            Q(id=pk),
+            Q(user1=request.user) | Q(user2=request.user)
+        ).first()
+
+        if not chat:
+            return Response({"message": "Chat not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        other_user_id = chat.user2_id if chat.user1_id == request.user.id else chat.user1_id
+        return mark_read_response(request, chat=chat, notify_group=f"user_{other_user_id}")
 
     @swagger_auto_schema(
         operation_summary="Send message",
@@ -338,14 +422,15 @@ class ChatViewSet(viewsets.ViewSet):
 
         # Faylni alohida saqlash
         file_obj = request.FILES.get('file')
-        message = serializer.save(
+        message = MessageModel.objects.create_in_chat(
+            chat,
             sender=request.user,
             receiver=receiver,
-            **({'file': file_obj} if file_obj else {})
+            **{**serializer.validated_data, **({'file': file_obj} if file_obj else {})}
         )
 
-        chat.last_message = message
-        chat.save(update_fields=["last_message", "updated_at"])
+        event = chat_updated_event(chat, CompactMessageSerializer(message, context={"request": request}).data)
+        send_on_commit([(f"user_{user_id}", event) for user_id in {chat.user1_id, chat.user2_id}])
 
         return Response(
             MessageSerializer(message, context={"request": request}).data,
@@ -422,3 +507,33 @@ class MessageViewSet(viewsets.ViewSet):
         
         message.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PresenceViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    max_users = 200
+
+    @swagger_auto_schema(
+        operation_summary="Bulk presence lookup",
+        operation_description="Returns online state and last_seen for up to 200 users.",
+        manual_parameters=[
+            openapi.Parameter('user_ids', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Comma-separated user ids", required=True)
+        ],
+        responses={200: "Presence map keyed by user id", 400: "user_ids required"},
+        tags=["Chats"]
+    )
+    def lookup(self, request):
+        user_ids = [u.strip() for u in request.query_params.get("user_ids", "").split(",") if u.strip()]
+        if not user_ids:
+            return Response({"error": "user_ids required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > self.max_users:
+            return Response({"error": f"At most {self.max_users} user_ids allowed"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user_ids = [str(uuid.UUID(u)) for u in user_ids]
+        except ValueError:
+            return Response({"error": "Invalid user id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_presence(user_ids), status=status.HTTP_200_OK)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CommentConfig(AppConfig):
     name = 'comment'
+
+    def ready(self):
+        from . import signals  # noqa: F401
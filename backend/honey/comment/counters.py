@@ -0,0 +1,53 @@
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from library.models import BookModel
+
+COUNTER_FIELDS = ("rating_count", "rating_sum", "avg_rating", "like_count", "review_count")
+
+# Every update below also moves the book's updated_at, which its ETag and
+# Last-Modified are derived from
+
+
+def touch_book(book_id):
+    """Mark a book as changed when only the text of a review did."""
+    BookModel.objects.filter(pk=book_id).update(updated_at=timezone.now())
+
+
+def update_book_rating(book_id, count_delta, sum_delta):
+    """Shift a book's rating totals and recompute avg_rating in the same UPDATE."""
+    count = F("rating_count") + count_delta
+    total = F("rating_sum") + sum_delta
+    BookModel.objects.filter(pk=book_id).update(
+        rating_count=count,
+        rating_sum=total,
+        avg_rating=Coalesce(
+            Cast(total, FloatField()) / NullIf(Cast(count, FloatField()), Value(0.0)),
+            Value(0.0),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def update_book_counter(book_id, field, delta):
+    BookModel.objects.filter(pk=book_id).update(**{field: F(field) + delta}, updated_at=timezone.now())
+
+
+def compute_book_counters(book_ids):
+    """Recount the counters of the given books from the rating, like and review tables."""
+    from comment.models import BookLikeModel, BookRatingModel, BookReviewModel
+
+    counters = {book_id: dict.fromkeys(COUNTER_FIELDS, 0) for book_id in book_ids}
+    ratings = (
+        BookRatingModel.objects.filter(book_id__in=book_ids)
+        .values("book_id").annotate(n=Count("id"), total=Sum("rating"))
+    )
+    for row in ratings:
+        counters[row["book_id"]].update(
+            rating_count=row["n"], rating_sum=row["total"] or 0, avg_rating=(row["total"] or 0) / row["n"],
+        )
+    for model, field in ((BookLikeModel, "like_count"), (BookReviewModel, "review_count")):
+        for row in model.objects.filter(book_id__in=book_ids).values("book_id").annotate(n=Count("id")):
+            counters[row["book_id"]][field] = row["n"]
+    return counters
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from comment.counters import COUNTER_FIELDS, compute_book_counters
+from library.models import BookModel
+from library.response_cache import invalidate
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating, like and review counters on books."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        books = BookModel.objects.order_by("id").only("id", *COUNTER_FIELDS)
+        checked = repaired = 0
+        last_id = None
+        while True:
+            batch = list((books.filter(id__gt=last_id) if last_id else books)[:options["batch_size"]])
+            if not batch:
+                break
+            counters = compute_book_counters([book.id for book in batch])
+            stale = []
+            for book in batch:
+                expected = counters[book.id]
+                if any(getattr(book, field) != value for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(book, field, value)
+                    stale.append(book)
+            BookModel.objects.bulk_update(stale, COUNTER_FIELDS)
+            checked += len(batch)
+            repaired += len(stale)
+            last_id = batch[-1].id
+        if repaired:
+            # bulk_update sends no signals
+            invalidate("book_list", "book_detail")
+        self.stdout.write(f"Checked {checked} books, repaired {repaired}")
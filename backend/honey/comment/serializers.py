@@ -40,7 +40,7 @@ class BookLikeSerializer(serializers.ModelSerializer):
 
 
 class ToggleBookLikeSerializer(serializers.Serializer):
-    book_id = serializers.IntegerField()
+    book_id = serializers.UUIDField()
 
 
 class ToggleBookLikeResponseSerializer(serializers.Serializer):
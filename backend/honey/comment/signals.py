@@ -0,0 +1,104 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from library.response_cache import invalidate
+
+from .counters import touch_book, update_book_counter, update_book_rating
+from .models import BookLikeModel, BookRatingModel, BookReviewModel
+
+# The book counters follow the rows from here, so admin deletes, cascades and
+# shell edits keep them in step as well as the views do. The deltas are
+# applied as F() updates once the transaction commits, which keeps the hot
+# book row unlocked for the length of the caller's transaction.
+
+COUNTED_FIELDS = {
+    BookRatingModel: ("book_id", "rating"),
+    BookReviewModel: ("book_id",),
+}
+
+
+def after_commit(func, *args):
+    transaction.on_commit(partial(func, *args))
+
+
+def changed_books(instance):
+    book_ids = {instance.book_id}
+    if getattr(instance, "_counted", None):
+        book_ids.add(instance._counted[0])
+    return book_ids
+
+
+@receiver(pre_save, sender=BookRatingModel)
+@receiver(pre_save, sender=BookReviewModel)
+def remember_counted_values(sender, instance, raw=False, **kwargs):
+    """Read the stored values an update is about to replace, locking the row inside a transaction."""
+    instance._counted = None
+    if raw or instance._state.adding:
+        return
+    rows = sender.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        rows = rows.select_for_update()
+    instance._counted = rows.values_list(*COUNTED_FIELDS[sender]).first()
+
+
+@receiver(post_save, sender=BookRatingModel)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._counted
+    if old is None:
+        after_commit(update_book_rating, instance.book_id, 1, instance.rating)
+    elif old[0] == instance.book_id:
+        if old[1] != instance.rating:
+            after_commit(update_book_rating, instance.book_id, 0, instance.rating - old[1])
+    else:
+        after_commit(update_book_rating, old[0], -1, -old[1])
+        after_commit(update_book_rating, instance.book_id, 1, instance.rating)
+
+
+@receiver(post_save, sender=BookReviewModel)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._counted
+    if old is None:
+        after_commit(update_book_counter, instance.book_id, "review_count", 1)
+    elif old[0] == instance.book_id:
+        # Only the text changed; the book's ETag still has to move
+        after_commit(touch_book, instance.book_id)
+    else:
+        after_commit(update_book_counter, old[0], "review_count", -1)
+        after_commit(update_book_counter, instance.book_id, "review_count", 1)
+
+
+@receiver(post_save, sender=BookLikeModel)
+def like_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        after_commit(update_book_counter, instance.book_id, "like_count", 1)
+
+
+@receiver(post_delete, sender=BookRatingModel)
+def rating_deleted(sender, instance, **kwargs):
+    after_commit(update_book_rating, instance.book_id, -1, -instance.rating)
+
+
+@receiver(post_delete, sender=BookReviewModel)
+def review_deleted(sender, instance, **kwargs):
+    after_commit(update_book_counter, instance.book_id, "review_count", -1)
+
+
+@receiver(post_delete, sender=BookLikeModel)
+def like_deleted(sender, instance, **kwargs):
+    after_commit(update_book_counter, instance.book_id, "like_count", -1)
+
+
+# Connected after the counter receivers so the cache is dropped only once the
+# counters have moved; otherwise a request in between could cache old counts
+@receiver([post_save, post_delete], sender=BookRatingModel)
+@receiver([post_save, post_delete], sender=BookReviewModel)
+@receiver([post_save, post_delete], sender=BookLikeModel)
+def book_activity_changed(sender, instance, **kwargs):
+    invalidate("book_list", *(f"book:{book_id}" for book_id in changed_books(instance)))
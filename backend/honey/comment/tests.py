@@ -1,3 +1,119 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from authentication.models import UserModel
+from library.models import BookModel, CategoryModel, GenreModel
+from .models import BookLikeModel, BookRatingModel, BookReviewModel
+
+
+class BookCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user("reader", "reader@example.com", "pass", phone="+998900000001")
+        cls.other = UserModel.objects.create_user("other", "other@example.com", "pass", phone="+998900000002")
+        genre = GenreModel.objects.create(name="Fantasy")
+        category = CategoryModel.objects.create(name="Fiction")
+        cls.book, cls.second_book = (
+            BookModel.objects.create(
+                title=title, author="Anon", description="", image="book/image/cover.jpg",
+                genre=genre, category=category, year=2000, pages=100,
+            )
+            for title in ("Dragon Tales", "Griffin Tales")
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counters(self, book=None):
+        return BookModel.objects.values(
+            "rating_count", "rating_sum", "avg_rating", "like_count", "review_count",
+        ).get(pk=(book or self.book).pk)
+
+    def assertCounters(self, book=None, **expected):
+        counters = self.counters(book)
+        self.assertEqual({field: counters[field] for field in expected}, expected)
+
+    def rate(self, user, rating):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BookRatingModel.objects.create(user=user, book=self.book, rating=rating)
+
+    def test_rating_through_the_api(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/v1/comment/books/rate/", {"book": self.book.pk, "rating": 4})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertCounters(rating_count=1, rating_sum=4, avg_rating=4.0)
+
+    def test_re_rating_moves_the_sum_only(self):
+        self.rate(self.other, 2)
+        rating = self.rate(self.user, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.rating = 5
+            rating.save()
+
+        self.assertCounters(rating_count=2, rating_sum=7, avg_rating=3.5)
+
+    def test_moving_a_rating_to_another_book(self):
+        rating = self.rate(self.user, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.book = self.second_book
+            rating.save()
+
+        self.assertCounters(rating_count=0, rating_sum=0, avg_rating=0.0)
+        self.assertCounters(self.second_book, rating_count=1, rating_sum=4, avg_rating=4.0)
+
+    def test_unrating(self):
+        self.rate(self.other, 2)
+        rating = self.rate(self.user, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.delete()
+
+        self.assertCounters(rating_count=1, rating_sum=2, avg_rating=2.0)
+
+    def test_cascading_deletes_keep_the_counters(self):
+        self.rate(self.user, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            BookLikeModel.objects.create(user=self.user, book=self.book)
+            BookReviewModel.objects.create(user=self.user, book=self.book, comment="Great")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertCounters(rating_count=0, rating_sum=0, like_count=0, review_count=0)
+
+    def test_like_toggle(self):
+        for liked, count in ((True, 1), (False, 0), (True, 1)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/v1/comment/books/like/", {"book_id": self.book.pk})
+            self.assertEqual(response.json()["liked"], liked)
+            self.assertCounters(like_count=count)
+
+    def test_review_create_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/v1/comment/books/review/", {"book": self.book.pk, "comment": "Great"})
+        self.assertEqual(response.status_code, 201)
+        self.assertCounters(review_count=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookReviewModel.objects.get(pk=response.json()["id"]).delete()
+        self.assertCounters(review_count=0)
+
+    def test_editing_a_review_touches_the_book(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            review = BookReviewModel.objects.create(user=self.user, book=self.book, comment="Great")
+        updated_at = BookModel.objects.get(pk=self.book.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            review.comment = "Still great"
+            review.save()
+
+        self.assertCounters(review_count=1)
+        self.assertGreater(BookModel.objects.get(pk=self.book.pk).updated_at, updated_at)
+
+    def test_counters_move_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            BookLikeModel.objects.create(user=self.user, book=self.book)
+            self.assertCounters(like_count=0)
+        for callback in callbacks:
+            callback()
+
+        self.assertCounters(like_count=1)
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -74,7 +75,9 @@ class BookRatingViewSet(viewsets.ViewSet):
 
         serializer = CreateBookRatingSerializer(rating, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # The counter signals lock the row while they read the old rating
+        with transaction.atomic():
+            serializer.save()
 
         out_serializer = BookRatingSerializer(rating, context={"request": request})
         return Response(out_serializer.data, status=status.HTTP_200_OK)
@@ -92,7 +95,11 @@ class BookRatingViewSet(viewsets.ViewSet):
         if rating.user != request.user and not request.user.is_staff:
             return Response({"detail": "You do not have permission to delete this rating"}, status=status.HTTP_403_FORBIDDEN)
 
-        rating.delete()
+        with transaction.atomic():
+            # Locked so a concurrent delete can't take the rating off the book twice
+            rating = BookRatingModel.objects.select_for_update().filter(pk=rating.pk).first()
+            if rating:
+                rating.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -149,7 +156,8 @@ class BookCommentViewSet(viewsets.ViewSet):
 
         serializer = CreateBookReviewSerializer(review, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
 
         out_serializer = BookReviewSerializer(review, context={"request": request})
         return Response(out_serializer.data, status=status.HTTP_200_OK)
@@ -167,7 +175,10 @@ class BookCommentViewSet(viewsets.ViewSet):
         if review.user != request.user and not request.user.is_staff:
             return Response({"detail": "You do not have permission to delete this review"}, status=status.HTTP_403_FORBIDDEN)
 
-        review.delete()
+        with transaction.atomic():
+            review = BookReviewModel.objects.select_for_update().filter(pk=review.pk).first()
+            if review:
+                review.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -185,15 +196,16 @@ class BookLikeViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         book_id = serializer.validated_data["book_id"]
         user = request.user
-        like = BookLikeModel.objects.filter(user=user, book_id=book_id)
-        if like.exists():
-            like.delete()
-            return Response(
-                {"liked": False, "message": "Book unliked"},
-                status=status.HTTP_200_OK
-            )
-
-        BookLikeModel.objects.create(user=user, book_id=book_id)
+        with transaction.atomic():
+            like = BookLikeModel.objects.select_for_update().filter(user=user, book_id=book_id).first()
+            if like:
+                like.delete()
+                return Response(
+                    {"liked": False, "message": "Book unliked"},
+                    status=status.HTTP_200_OK
+                )
+
+            BookLikeModel.objects.create(user=user, book_id=book_id)
 
         return Response(
             {"liked": True, "message": "Book liked"},
@@ -46,7 +46,9 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Custom apps
+    'core',
     'authentication',
     'library',
     'comment',
@@ -171,6 +173,12 @@ STATICFILES_DIRS = [
 ] if os.path.exists(os.path.join(BASE_DIR, 'static')) else []
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# nginx'dagi "internal" location (masalan /protected-media/), MEDIA_ROOT'ga qaraydi.
+# Berilsa, fayllarni Django emas, nginx yuboradi (X-Accel-Redirect)
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+# Videolarni HLS'ga o'girish uchun (transcode_videos buyrug'i)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -226,7 +234,44 @@ else:
             'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
     }
+
+# WebSocket presence: Redis bo'lsa o'sha Redis'da, aks holda process xotirasida
+PRESENCE = {
+    'BACKEND': 'chat.presence.RedisPresenceBackend' if _REDIS_URL else 'chat.presence.InMemoryPresenceBackend',
+    # Xotirada bo'lsa last_seen shu process ichida har N soniyada yoziladi
+    'OPTIONS': {'url': _REDIS_URL} if _REDIS_URL else {
+        'flush_interval': int(os.getenv("PRESENCE_FLUSH_INTERVAL", "30")),
+    },
+    'TIMEOUT': int(os.getenv("PRESENCE_TIMEOUT", "90")),
+}
 WEBSOCKET_URL = os.getenv("WEBSOCKET_URL")
+# Barcha worker'lar bitta keshni ko'rishi uchun Redis (bo'lmasa — jarayon xotirasi)
+if _REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _REDIS_URL,
+            'KEY_PREFIX': 'honey',
+        },
+        'video_views': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _REDIS_URL,
+            'KEY_PREFIX': 'honey:views',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        # Video ko'rishlarini takrorlamaslik kalitlari alohida: ular ko'p bo'ladi va
+        # default keshdagi limiter bloklari, tasdiqlash kodlarini siqib chiqarmasin
+        'video_views': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'video-views',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        },
+    }
 # ── Email ─────────────────────────────────────────────────────────────────────
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
@@ -236,6 +281,11 @@ EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", "False").lower() == "true"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@honey.local")
+# send_queued_emails worker ishlayotgan bo'lsa True; aks holda xatlarni web process o'zi yuboradi
+EMAIL_OUTBOX_WORKER = os.getenv("EMAIL_OUTBOX_WORKER", "False").lower() == "true"
+# transcode_videos worker media papkasini web bilan bo'lishib ishlayotgan bo'lsa True;
+# aks holda yuklangan videolar navbatga qo'yilmaydi va asl fayl ko'rsatiladi
+VIDEO_TRANSCODE_WORKER = os.getenv("VIDEO_TRANSCODE_WORKER", "False").lower() == "true"
 
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
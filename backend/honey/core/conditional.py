@@ -0,0 +1,70 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def queryset_state(queryset, related=()):
+    """
+    Newest updated_at (of the rows and their `related` foreign keys) and the
+    row count, in one aggregate query. The count catches deletions, which
+    leave no newer updated_at behind.
+    """
+    fields = ["updated_at", *(f"{name}__updated_at" for name in related)]
+    state = queryset.order_by().aggregate(
+        rows=Count("pk"), **{f"modified_{index}": Max(field) for index, field in enumerate(fields)}
+    )
+    rows = state.pop("rows")
+    return max(filter(None, state.values()), default=None), rows
+
+
+def conditional_response(get_queryset, related=(), per_user=False):
+    """
+    ETag / Last-Modified support for a read-only viewset method.
+
+    get_queryset(request, **kwargs) returns the rows the response is built
+    from, or None when the request is invalid. A client whose validators
+    still match gets a 304 before the view runs; otherwise the view's 200
+    response is stamped with fresh validators. Use per_user for responses
+    that depend on who is asking.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            queryset = get_queryset(request, **kwargs)
+            if queryset is None:
+                return view(self, request, *args, **kwargs)
+            last_modified, rows = queryset_state(queryset, related)
+            if last_modified is None:
+                # Nothing to validate against (empty list, missing object)
+                return view(self, request, *args, **kwargs)
+
+            # The body also varies by language, host (absolute file URLs) and query string
+            variant = [
+                view.__qualname__, request.get_host(), request.GET.urlencode(),
+                request.headers.get("Accept-Language", ""), last_modified.isoformat(), str(rows),
+            ]
+            if per_user:
+                variant.append(str(request.user.pk) if request.user.is_authenticated else "")
+            etag = "W/" + quote_etag(hashlib.sha256("|".join(variant).encode()).hexdigest()[:32])
+            timestamp = int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers["ETag"] = etag
+            response.headers["Last-Modified"] = http_date(timestamp)
+            # Clients keep their copy but revalidate it on every request
+            if per_user:
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ["Accept-Language", "Authorization"])
+            else:
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ["Accept-Language"])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,152 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+# Bigger than FileResponse's 4 KiB: every chunk is a separate ASGI message
+STREAM_BLOCK_SIZE = 256 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """Read-only view of `length` bytes of an open file, starting at `start`."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_validators(field_file):
+    """(size, strong ETag, modification timestamp) of a stored file."""
+    storage, name = field_file.storage, field_file.name
+    size = storage.size(name)
+    try:
+        modified = int(storage.get_modified_time(name).timestamp())
+    except NotImplementedError:
+        modified = None
+    # Same shape as nginx's ETag, so both delivery modes agree
+    etag = f'"{modified or 0:x}-{size:x}"'
+    return size, etag, modified
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, None to ignore the header, or
+    False when it can't be satisfied. Multiple ranges are answered with the
+    whole file, which the spec allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = min(int(last), size)
+        if not length:
+            return False
+        return size - length, size - 1
+    start = int(first)
+    if last and int(last) < start:
+        # Not a valid range at all; RFC 9110 says to ignore the header
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def if_range_matches(request, etag, modified):
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return modified is not None and parse_http_date_safe(value) == modified
+
+
+def accel_path(field_file):
+    """nginx internal location of a local media file, if X-Accel-Redirect is on."""
+    prefix = settings.MEDIA_ACCEL_REDIRECT
+    if not prefix:
+        return None
+    try:
+        field_file.path
+    except NotImplementedError:
+        # Not on the local disk nginx serves from
+        return None
+    return prefix.rstrip("/") + "/" + quote(field_file.name)
+
+
+def serve_file(request, field_file, as_attachment=False):
+    """
+    Deliver a stored file with conditional GET and single byte range support.
+
+    With MEDIA_ACCEL_REDIRECT set, nginx is told where the file is and sends
+    the bytes (ranges included) itself; otherwise the file is streamed from
+    storage. Whole-file responses stay plain FileResponses, which WSGI
+    servers hand to sendfile.
+    """
+    if not field_file:
+        raise Http404("No file")
+    try:
+        size, etag, modified = file_validators(field_file)
+    except FileNotFoundError:
+        raise Http404("File is missing from storage")
+
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        filename = os.path.basename(field_file.name)
+        internal = accel_path(field_file)
+        if internal:
+            response = HttpResponse()
+            # Let nginx set the type from the file name
+            del response.headers["Content-Type"]
+            response.headers["X-Accel-Redirect"] = internal
+        else:
+            response = stream_file(request, field_file, size, etag, modified, filename, as_attachment)
+        response.headers["Accept-Ranges"] = "bytes"
+
+    response.headers["ETag"] = etag
+    if modified is not None:
+        response.headers["Last-Modified"] = http_date(modified)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def stream_file(request, field_file, size, etag, modified, filename, as_attachment):
+    byte_range = None
+    if "Range" in request.headers and if_range_matches(request, etag, modified):
+        byte_range = parse_range(request.headers["Range"], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = field_file.storage.open(field_file.name, "rb")
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1), as_attachment=as_attachment, filename=filename, status=206,
+        )
+        response.headers["Content-Length"] = end - start + 1
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.block_size = STREAM_BLOCK_SIZE
+    return response
@@ -0,0 +1,210 @@
+import hashlib
+import io
+import logging
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_save
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+AVATAR_WIDTHS = (64, 128, 256)
+COVER_WIDTHS = (160, 320, 640, 1280)
+# Pillow format and save options per rendition extension
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+RENDITIONS_DIR = "renditions"
+# Stored instead of a hash when an image can't be rendered, so it isn't
+# retried on every save; generate_renditions --all tries again
+UNREADABLE = "unreadable"
+
+# Image fields that get renditions. Each model also has a "<field>_hash"
+# column: the content hash of the current image, set once its renditions exist
+IMAGE_FIELDS = {
+    ("library.BookModel", "image"): COVER_WIDTHS,
+    ("video.VideoModel", "cover"): COVER_WIDTHS,
+    ("live.LiveSessionModel", "cover"): COVER_WIDTHS,
+    ("chat.GroupModel", "avatar"): AVATAR_WIDTHS,
+    ("authentication.UserModel", "avatar"): AVATAR_WIDTHS,
+}
+
+# Sent with the model as sender once rendition hashes are written, which
+# sends no post_save; instance is None after a backfill of the whole table
+renditions_updated = Signal()
+
+
+def rendition_name(digest, width, extension):
+    return f"{RENDITIONS_DIR}/{digest[:2]}/{digest}/{width}.{extension}"
+
+
+def image_fields():
+    """(model class, field name, widths) of every registered image field."""
+    return [(apps.get_model(label), field, widths) for (label, field), widths in IMAGE_FIELDS.items()]
+
+
+def _resize(image, width):
+    if image.width <= width:
+        # Never upscaled; the rendition keeps its nominal width in the name
+        return image
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+
+
+def _encode(image, extension):
+    pillow_format, options = FORMATS[extension]
+    if pillow_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha: flatten onto white
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_renditions(file, widths):
+    """
+    Write the missing renditions of an image and return its content hash.
+    Renditions are keyed by that hash, so identical uploads share them.
+    Returns None for missing files and files Pillow can't read.
+    """
+    try:
+        file.open("rb")
+        try:
+            data = file.read()
+        finally:
+            file.close()
+    except OSError:
+        logger.warning("Could not read %s", file.name, exc_info=True)
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    missing = [
+        (width, extension) for width in widths for extension in FORMATS
+        if not default_storage.exists(rendition_name(digest, width, extension))
+    ]
+    if not missing:
+        return digest
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEGs decode straight to a smaller scale when the largest rendition allows it
+        largest = max(widths)
+        image.draft("RGB", (largest, largest * image.height // image.width))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+        for width, extension in missing:
+            content = _encode(_resize(image, width), extension)
+            default_storage.save(rendition_name(digest, width, extension), ContentFile(content))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Could not render %s", file.name, exc_info=True)
+        return None
+    return digest
+
+
+def update_renditions(instance, field, notify=True):
+    """
+    Render the instance's current image and record its hash. The row is
+    written with an UPDATE, so none of the model's save receivers run;
+    renditions_updated is sent instead unless notify is off, for callers
+    that send it once for a whole batch.
+    """
+    file = getattr(instance, field)
+    if not file:
+        return
+    model = type(instance)
+    digest = generate_renditions(file, IMAGE_FIELDS[(model._meta.label, field)])
+    values = {f"{field}_hash": digest or UNREADABLE}
+    if any(f.name == "updated_at" for f in model._meta.concrete_fields):
+        # Moves the row's ETag, so clients fetch the rendition URLs
+        values["updated_at"] = timezone.now()
+    for name, value in values.items():
+        setattr(instance, name, value)
+    # A newer image saved meanwhile records its own hash
+    updated = model.objects.filter(pk=instance.pk, **{field: file.name}).update(**values)
+    if updated and notify:
+        renditions_updated.send(sender=model, instance=instance)
+
+
+def rendition_urls(instance, field, request=None):
+    """{"webp": {"64": url, ...}, "jpg": {...}}, or None until the renditions exist."""
+    digest = getattr(instance, f"{field}_hash", "")
+    if not digest or digest == UNREADABLE or not getattr(instance, field):
+        return None
+    widths = IMAGE_FIELDS[(type(instance)._meta.label, field)]
+    urls = {}
+    for extension in FORMATS:
+        urls[extension] = {}
+        for width in widths:
+            url = default_storage.url(rendition_name(digest, width, extension))
+            urls[extension][str(width)] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class RenditionsField(serializers.Field):
+    """Read-only rendition URLs of one of the model's image fields."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.update(source="*", read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return rendition_urls(instance, self.image_field, self.context.get("request"))
+
+
+def _loaded_name(instance, field):
+    # Read without the descriptor so deferred fields aren't fetched
+    value = instance.__dict__.get(field)
+    return getattr(value, "name", value) or ""
+
+
+def _fields_of(model):
+    return [field for (label, field) in IMAGE_FIELDS if label == model._meta.label]
+
+
+def _remember_sources(sender, instance, **kwargs):
+    instance._rendition_sources = {
+        field: _loaded_name(instance, field) for field in _fields_of(sender) if field in instance.__dict__
+    }
+
+
+def _reset_changed_hashes(sender, instance, update_fields=None, **kwargs):
+    sources = getattr(instance, "_rendition_sources", {})
+    instance._renditions_due = []
+    for field in _fields_of(sender):
+        if field not in instance.__dict__ or (update_fields is not None and field not in update_fields):
+            continue
+        value = instance.__dict__[field]
+        changed = _loaded_name(instance, field) != sources.get(field) or not getattr(value, "_committed", True)
+        if changed or (instance._state.adding and _loaded_name(instance, field)):
+            # Stale until the new image is rendered
+            setattr(instance, f"{field}_hash", "")
+            instance._renditions_due.append(field)
+
+
+def _render_new_images(sender, instance, **kwargs):
+    # Only images set by this save; existing ones are backfilled by generate_renditions
+    due, instance._renditions_due = getattr(instance, "_renditions_due", []), []
+    sources = getattr(instance, "_rendition_sources", {})
+    for field in _fields_of(sender):
+        if field in instance.__dict__:
+            sources[field] = _loaded_name(instance, field)
+    for field in due:
+        if sources.get(field):
+            transaction.on_commit(lambda field=field: update_renditions(instance, field))
+
+
+def connect_signals():
+    for model, _, _ in image_fields():
+        uid = f"renditions:{model._meta.label}"
+        post_init.connect(_remember_sources, sender=model, dispatch_uid=uid)
+        pre_save.connect(_reset_changed_hashes, sender=model, dispatch_uid=uid)
+        post_save.connect(_render_new_images, sender=model, dispatch_uid=uid)
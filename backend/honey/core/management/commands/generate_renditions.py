@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.images import UNREADABLE, generate_renditions, image_fields, renditions_updated, update_renditions
+
+
+class Command(BaseCommand):
+    help = "Render the missing image renditions of existing covers and avatars."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Also check images that already have a hash, e.g. after the widths changed, "
+                 "and retry the ones marked unreadable",
+        )
+
+    def handle(self, *args, **options):
+        for model, field, widths in image_fields():
+            rows = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            if not options["all"]:
+                rows = rows.filter(**{f"{field}_hash": ""})
+            rendered = failed = 0
+            for instance in rows.order_by("pk").iterator(chunk_size=options["batch_size"]):
+                if getattr(instance, f"{field}_hash") not in ("", UNREADABLE):
+                    generate_renditions(getattr(instance, field), widths)
+                else:
+                    update_renditions(instance, field, notify=False)
+                if getattr(instance, f"{field}_hash") != UNREADABLE:
+                    rendered += 1
+                else:
+                    failed += 1
+            if rendered or failed:
+                # One invalidation for the table rather than one per row
+                renditions_updated.send(sender=model, instance=None)
+            self.stdout.write(f"{model._meta.label}.{field}: {rendered} rendered, {failed} unreadable")
@@ -0,0 +1,254 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import FileField
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_save
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework import serializers
+
+from authentication.models import UserModel
+from .delivery import file_validators, if_range_matches, parse_range, serve_file
+from .images import AVATAR_WIDTHS, FORMATS, UNREADABLE, RenditionsField, rendition_name, renditions_updated
+
+CONTENT = b"0123456789"
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        for header, expected in [
+            ("bytes=2-5", (2, 5)),
+            ("bytes=2-", (2, 9)),
+            ("bytes=2-50", (2, 9)),
+            ("bytes=9-9", (9, 9)),
+            # Suffix ranges: the last N bytes, or all of a shorter file
+            ("bytes=-3", (7, 9)),
+            ("bytes=-50", (0, 9)),
+        ]:
+            with self.subTest(header):
+                self.assertEqual(parse_range(header, len(CONTENT)), expected)
+
+    def test_unsatisfiable_ranges(self):
+        for header in ["bytes=10-", "bytes=10-20", "bytes=-0"]:
+            with self.subTest(header):
+                self.assertIs(parse_range(header, len(CONTENT)), False)
+
+    def test_ignored_headers(self):
+        # Inverted and malformed ranges are ignored; multiple ranges get the whole file
+        for header in ["bytes=5-2", "bytes=-", "bytes=0-1,4-5", "items=0-1", "bytes=a-b"]:
+            with self.subTest(header):
+                self.assertIsNone(parse_range(header, len(CONTENT)))
+
+
+class DeliveryTestCase(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        storage = FileSystemStorage(location=media_root)
+        name = storage.save("books/my book.pdf", ContentFile(CONTENT))
+        self.file = FieldFile(None, FileField(storage=storage), name)
+        self.size, self.etag, self.modified = file_validators(self.file)
+        self.factory = RequestFactory()
+
+    def serve(self, method="get", **headers):
+        response = serve_file(getattr(self.factory, method)("/", headers=headers), self.file)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+
+class IfRangeTests(DeliveryTestCase):
+    def matches(self, value):
+        request = self.factory.get("/", headers={"If-Range": value} if value else {})
+        return if_range_matches(request, self.etag, self.modified)
+
+    def test_if_range(self):
+        self.assertTrue(self.matches(None))
+        self.assertTrue(self.matches(self.etag))
+        self.assertTrue(self.matches(http_date(self.modified)))
+        self.assertFalse(self.matches('"0-0"'))
+        self.assertFalse(self.matches(http_date(self.modified - 60)))
+        self.assertFalse(self.matches("not a date"))
+
+
+class StreamFileTests(DeliveryTestCase):
+    def test_whole_file(self):
+        response = self.serve()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertEqual(response.headers["ETag"], self.etag)
+
+    def test_range(self):
+        response = self.serve(Range="bytes=2-5")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"2345")
+        self.assertEqual(response.headers["Content-Length"], "4")
+        self.assertEqual(response.headers["Content-Range"], "bytes 2-5/10")
+
+    def test_suffix_range(self):
+        response = self.serve(Range="bytes=-3")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"789")
+        self.assertEqual(response.headers["Content-Range"], "bytes 7-9/10")
+
+    def test_inverted_range_gets_the_whole_file(self):
+        response = self.serve(Range="bytes=5-2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_range_past_the_end(self):
+        response = self.serve(Range="bytes=10-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["Content-Range"], "bytes */10")
+
+    def test_if_range_mismatch_gets_the_whole_file(self):
+        response = self.serve(Range="bytes=2-5", If_Range='"0-0"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_if_range_match_gets_the_range(self):
+        response = self.serve(Range="bytes=2-5", If_Range=self.etag)
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"2345")
+
+    def test_head_sends_the_get_headers(self):
+        for headers, status, length in [({}, 200, "10"), ({"Range": "bytes=2-5"}, 206, "4")]:
+            with self.subTest(headers=headers):
+                response = self.serve("head", **headers)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.headers["Content-Length"], length)
+                self.assertEqual(response.headers["ETag"], self.etag)
+
+    def test_unchanged_file(self):
+        response = self.serve(If_None_Match=self.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], self.etag)
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+class AccelRedirectTests(DeliveryTestCase):
+    def test_nginx_is_sent_the_file_location(self):
+        response = self.serve(Range="bytes=2-5")
+
+        # nginx answers the range itself
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Accel-Redirect"], "/protected-media/books/my%20book.pdf")
+        self.assertNotIn("Content-Type", response.headers)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertEqual(response.headers["ETag"], self.etag)
+
+    def test_files_off_the_local_disk_are_streamed(self):
+        # As for remote storage, which has no local path
+        with mock.patch.object(FieldFile, "path", new_callable=mock.PropertyMock, side_effect=NotImplementedError):
+            response = self.serve(Range="bytes=2-5")
+
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"2345")
+
+    def test_conditional_requests_are_answered_before_redirecting(self):
+        response = self.serve(If_None_Match=self.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+
+
+def png(width=300, height=150):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), (255, 0, 0, 128)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class AvatarSerializer(serializers.ModelSerializer):
+    avatar_renditions = RenditionsField("avatar")
+
+    class Meta:
+        model = UserModel
+        fields = ["avatar_renditions"]
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_URL="/media/")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = UserModel.objects.create_user("reader", "reader@example.com", "pass", phone="+998900000001")
+
+    def upload(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar.save("avatar.png", ContentFile(content))
+        self.user.refresh_from_db()
+
+    def test_uploads_are_rendered_at_every_width_and_format(self):
+        self.upload(png())
+
+        digest = self.user.avatar_hash
+        self.assertEqual(len(digest), 64)
+        for width in AVATAR_WIDTHS:
+            for extension in FORMATS:
+                with default_storage.open(rendition_name(digest, width, extension)) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.size, (width, width // 2))
+                    self.assertEqual(image.format, FORMATS[extension][0])
+
+    def test_the_hash_is_written_without_save_receivers(self):
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=UserModel)
+        self.addCleanup(post_save.disconnect, receiver, sender=UserModel)
+        updated = mock.Mock()
+        renditions_updated.connect(updated, sender=UserModel)
+        self.addCleanup(renditions_updated.disconnect, updated, sender=UserModel)
+
+        self.upload(png())
+
+        # The avatar save only; the hash went in with an UPDATE
+        self.assertEqual(receiver.call_count, 1)
+        updated.assert_called_once()
+        self.assertEqual(updated.call_args.kwargs["instance"].pk, self.user.pk)
+
+    def test_unreadable_images_are_marked_and_have_no_renditions(self):
+        with self.assertLogs("core.images", "WARNING"):
+            self.upload(b"not an image")
+
+        self.assertEqual(self.user.avatar_hash, UNREADABLE)
+        self.assertIsNone(AvatarSerializer(self.user).data["avatar_renditions"])
+
+    def test_a_new_upload_resets_the_hash(self):
+        self.upload(png())
+        first = self.user.avatar_hash
+        self.upload(png(400, 400))
+
+        self.assertNotEqual(self.user.avatar_hash, first)
+        self.assertEqual(len(self.user.avatar_hash), 64)
+
+    def test_renditions_field(self):
+        self.assertIsNone(AvatarSerializer(self.user).data["avatar_renditions"])
+        self.upload(png())
+
+        request = RequestFactory().get("/")
+        urls = AvatarSerializer(self.user, context={"request": request}).data["avatar_renditions"]
+        self.assertEqual(set(urls), set(FORMATS))
+        self.assertEqual(set(urls["webp"]), {str(width) for width in AVATAR_WIDTHS})
+        self.assertEqual(
+            urls["jpg"]["64"], f"http://testserver/media/{rendition_name(self.user.avatar_hash, 64, 'jpg')}",
+        )
@@ -0,0 +1,53 @@
+from django.db.models import Count
+
+from .models import BookLanguageChoices
+
+# ?sort= value -> ordering; every one of them is backed by a (field, id) index
+BOOK_SORTS = {
+    "newest": "-created_at",
+    "oldest": "created_at",
+    "year": "-year",
+    "year_asc": "year",
+    "rating": "-avg_rating",
+    "popular": "-like_count",
+}
+
+
+def filter_books(queryset, params):
+    """Apply the validated catalog filters (see BookListQuerySerializer)."""
+    if params.get("category"):
+        queryset = queryset.filter(category_id=params["category"])
+    if params.get("genre"):
+        queryset = queryset.filter(genre_id=params["genre"])
+    if params.get("language"):
+        queryset = queryset.filter(language=params["language"])
+    if params.get("year_min") is not None:
+        queryset = queryset.filter(year__gte=params["year_min"])
+    if params.get("year_max") is not None:
+        queryset = queryset.filter(year__lte=params["year_max"])
+    if params.get("is_premium") is not None:
+        queryset = queryset.filter(is_premium=params["is_premium"])
+    return queryset
+
+
+def book_facets(queryset):
+    """
+    Genre, language and premium counts of the filtered catalog, taken from
+    a single GROUP BY over the three columns.
+    """
+    rows = (
+        queryset.order_by()
+        .values("genre_id", "genre__name", "language", "is_premium")
+        .annotate(count=Count("id"))
+    )
+    genres, languages, premium = {}, dict.fromkeys(BookLanguageChoices.values, 0), {"true": 0, "false": 0}
+    for row in rows:
+        genre = genres.setdefault(row["genre_id"], {"id": row["genre_id"], "name": row["genre__name"], "count": 0})
+        genre["count"] += row["count"]
+        languages[row["language"]] = languages.get(row["language"], 0) + row["count"]
+        premium["true" if row["is_premium"] else "false"] += row["count"]
+    return {
+        "genre": sorted(genres.values(), key=lambda genre: -genre["count"]),
+        "language": [{"value": language, "count": count} for language, count in languages.items()],
+        "is_premium": premium,
+    }
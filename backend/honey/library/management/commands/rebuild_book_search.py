@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from library.models import BookModel
+from library.response_cache import invalidate
+from library.search import index_books
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of every book."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        books = BookModel.objects.select_related("genre", "category").order_by("id")
+        indexed = 0
+        for book in books.iterator(chunk_size=options["batch_size"]):
+            index_books([book])
+            indexed += 1
+        invalidate("book_list", "book_detail")
+        self.stdout.write(f"Indexed {indexed} books")
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    BookModel = apps.get_model('library', 'BookModel')
+    counters = {}
+    ratings = apps.get_model('comment', 'BookRatingModel').objects.values('book_id').annotate(n=Count('id'), total=Sum('rating'))
+    for row in ratings:
+        counters.setdefault(row['book_id'], {}).update(
+            rating_count=row['n'], rating_sum=row['total'] or 0, avg_rating=(row['total'] or 0) / row['n'],
+        )
+    for model, field in (('BookLikeModel', 'like_count'), ('BookReviewModel', 'review_count')):
+        for row in apps.get_model('comment', model).objects.values('book_id').annotate(n=Count('id')):
+            counters.setdefault(row['book_id'], {})[field] = row['n']
+    for book_id, fields in counters.items():
+        BookModel.objects.filter(pk=book_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0001_initial'),
+        ('library', '0003_alter_bookmodel_is_premium_alter_bookmodel_language_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmodel',
+            name='avg_rating',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='bookmodel',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookmodel',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookmodel',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookmodel',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
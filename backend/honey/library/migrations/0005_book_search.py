@@ -0,0 +1,88 @@
+# Generated by Django 6.0 on 2026-10-18 20:30
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # Here rather than TrigramExtension(), whose reverse queries pg_extension on any database
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('CREATE INDEX book_search_vector_idx ON book USING gin (search_vector)')
+        schema_editor.execute(
+            'CREATE INDEX book_search_document_trgm_idx ON book USING gin (search_document gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE book_search USING fts5('
+            'book_id UNINDEXED, title, author, taxonomy, tokenize="unicode61 remove_diacritics 2")'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS book_search_vector_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS book_search_document_trgm_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS book_search')
+
+
+def _texts(obj, field):
+    # The field and its modeltranslation variants, as the model had them at this point
+    values = []
+    for name in [field, *(f"{field}_{lang}" for lang in ('uz', 'ru', 'en'))]:
+        value = getattr(obj, name, None)
+        if value and value not in values:
+            values.append(value)
+    return " ".join(values)
+
+
+def index_existing_books(apps, schema_editor):
+    # Self-contained on purpose: library.search follows the current model, not this migration's
+    BookModel = apps.get_model('library', 'BookModel')
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        for book in BookModel.objects.select_related('genre', 'category'):
+            title, author = _texts(book, 'title'), _texts(book, 'author')
+            taxonomy = " ".join(filter(None, [
+                _texts(book.genre, 'name'), _texts(book.category, 'name'), str(book.year or ''),
+            ]))
+            document = " ".join([title, author, taxonomy])
+            if vendor == 'postgresql':
+                cursor.execute(
+                    "UPDATE book SET search_document = %s, search_vector = "
+                    "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+                    "|| setweight(to_tsvector('simple', %s), 'C') WHERE id = %s",
+                    [document, title, author, taxonomy, book.pk],
+                )
+                continue
+            BookModel.objects.filter(pk=book.pk).update(search_document=document)
+            if vendor == 'sqlite':
+                cursor.execute(
+                    "INSERT INTO book_search (book_id, title, author, taxonomy) VALUES (%s, %s, %s, %s)",
+                    [book.pk.hex, title, author, taxonomy],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_book_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmodel',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookmodel',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(index_existing_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_book_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookmodel',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='bookmodel',
+            index=models.Index(fields=['created_at', 'id'], name='book_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmodel',
+            index=models.Index(fields=['year', 'id'], name='book_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmodel',
+            index=models.Index(fields=['avg_rating', 'id'], name='book_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmodel',
+            index=models.Index(fields=['like_count', 'id'], name='book_popular_idx'),
+        ),
+    ]
@@ -1,5 +1,5 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models import Avg
 
 from authentication.models import UserModel
 from core.base import BaseModel
@@ -43,24 +43,43 @@ class BookModel(BaseModel):
     language = models.CharField(max_length=20, choices=BookLanguageChoices.choices, default=BookLanguageChoices.EN, db_index=True)
     pages = models.PositiveIntegerField()
     image = models.ImageField(upload_to="book/image")
+    # Content hash of the image; set once core.images has rendered it
+    image_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     file = models.FileField(upload_to="book/files/", blank=True, null=True) # Mana bu PDF uchun
     youtube_url = models.URLField(blank=True, null=True)
     library_url = models.URLField(blank=True, null=True)
     store_url = models.URLField(blank=True, null=True)
     is_premium = models.BooleanField(default=False, db_index=True)
 
+    # Kept in step by the rating/review/like views; repair_book_counters fixes drift
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+
+    # Maintained by library.search; search_vector is only filled on PostgreSQL
+    search_document = models.TextField(blank=True, default="", editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def __str__(self):
         return f"{self.title} ({self.author})"
 
     @property
     def average_rating(self):
-        agg = self.rating_book.aggregate(avg=Avg('rating'))
-        return agg['avg'] or 0.0
+        return self.avg_rating
 
     class Meta:
         db_table = "book"
         verbose_name_plural = "Books"
         verbose_name = "Book"
+        # One per catalog sort, for keyset pagination
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="book_created_idx"),
+            models.Index(fields=["year", "id"], name="book_year_idx"),
+            models.Index(fields=["avg_rating", "id"], name="book_rating_idx"),
+            models.Index(fields=["like_count", "id"], name="book_popular_idx"),
+        ]
 
 
 class UserBookModel(BaseModel):
@@ -0,0 +1,74 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value, size):
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor"})
+    if not isinstance(values, list) or len(values) != size:
+        raise ValidationError({"cursor": "Invalid cursor"})
+    return values
+
+
+class BookCursorPagination:
+    """
+    Keyset pagination over (<sort field>, id) for the book catalog.
+
+    ?cursor=<cursor>  the page after this cursor
+    ?limit=<n>        page size, capped at MAX_PAGE_SIZE
+
+    The cursor carries the sort value, so it is only valid for the sort it
+    was issued with.
+    """
+
+    def __init__(self, request, ordering):
+        self.cursor = request.query_params.get("cursor")
+        self.limit = self.get_limit(request.query_params.get("limit"))
+        self.descending = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+
+    @staticmethod
+    def get_limit(value):
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset):
+        after = "lt" if self.descending else "gt"
+        if self.cursor:
+            value, pk = decode_cursor(self.cursor, 2)
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{after}": value}) | Q(**{self.field: value, f"id__{after}": pk})
+            )
+        prefix = "-" if self.descending else ""
+        page = list(queryset.order_by(f"{prefix}{self.field}", f"{prefix}id")[:self.limit + 1])
+        self.has_more = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_paginated_data(self, data):
+        next_cursor = None
+        if self.has_more:
+            last = self.page[-1]
+            next_cursor = encode_cursor([getattr(last, self.field), last.id])
+        return {
+            "results": data,
+            "next_cursor": next_cursor,
+            "has_more": self.has_more,
+        }
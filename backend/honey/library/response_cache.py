@@ -0,0 +1,81 @@
+import functools
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import cache_is_shared
+from .serializers import get_lang_from_request
+
+# Entries are dropped by invalidate(); the timeout only bounds memory use
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+# A per-process cache never sees invalidations made by other processes
+# (commands, shells, other workers), so its entries must expire on their own
+LOCAL_CACHE_TIMEOUT = 60
+
+
+def cache_timeout():
+    return CATALOG_CACHE_TIMEOUT if cache_is_shared() else LOCAL_CACHE_TIMEOUT
+
+
+def _generation_key(scope):
+    return f"catalog:gen:{scope}"
+
+
+def _new_generation():
+    # Not a small counter: a re-created key must never match an old generation
+    return time.time_ns()
+
+
+def generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """Orphan every cached response of the given scopes once the transaction commits."""
+    def bump():
+        for scope in scopes:
+            try:
+                cache.incr(_generation_key(scope))
+            except ValueError:
+                cache.set(_generation_key(scope), _new_generation(), None)
+
+    transaction.on_commit(bump)
+
+
+def cached_response(*scopes):
+    """
+    Cache the serialized data of a successful GET per language, host (file
+    URLs are absolute) and query string. Scopes may use the view's URL kwargs, e.g. "book:{pk}"; the
+    entry is stale as soon as any of its scopes is invalidated.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            lang, _ = get_lang_from_request(request)
+            resolved = [scope.format(**kwargs) for scope in scopes]
+            query = hashlib.sha256(f"{request.get_host()}?{request.GET.urlencode()}".encode()).hexdigest()[:32]
+            versions = ".".join(str(version) for version in generations(resolved))
+            key = f"catalog:{view.__qualname__}:{':'.join(resolved)}:{versions}:{lang}:{query}"
+
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data, status=status.HTTP_200_OK)
+            else:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, response.data, cache_timeout())
+            patch_vary_headers(response, ["Accept-Language"])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,139 @@
+import re
+
+from django.conf import settings
+from django.utils.html import escape
+from django.db import connection
+from django.db.models import F, FloatField, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+# The database marks matches with private-use characters; render_snippet()
+# turns them into <mark> tags once the stored text around them is escaped
+SNIPPET_START = "\ue000"
+SNIPPET_END = "\ue001"
+FTS_TABLE = "book_search"
+
+
+def _translations(obj, field):
+    # The base field plus any modeltranslation variants (title_uz, title_ru, ...)
+    values = []
+    for name in [field, *(f"{field}_{lang}" for lang in settings.MODELTRANSLATION_LANGUAGES)]:
+        value = getattr(obj, name, None)
+        if value and value not in values:
+            values.append(value)
+    return " ".join(values)
+
+
+def book_document(book):
+    """(title, author, taxonomy) texts of a book across all translations."""
+    taxonomy = " ".join(filter(None, [
+        _translations(book.genre, "name"),
+        _translations(book.category, "name"),
+        str(book.year or ""),
+    ]))
+    return _translations(book, "title"), _translations(book, "author"), taxonomy
+
+
+def search_terms(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def index_books(books):
+    """Refresh the search document (and the vendor's full-text index) of the given books."""
+    for book in books:
+        title, author, taxonomy = book_document(book)
+        manager = type(book)._default_manager
+        if connection.vendor == "postgresql":
+            from django.contrib.postgres.search import SearchVector
+
+            manager.filter(pk=book.pk).update(
+                search_document=" ".join([title, author, taxonomy]),
+                search_vector=(
+                    SearchVector(Value(title), config="simple", weight="A")
+                    + SearchVector(Value(author), config="simple", weight="B")
+                    + SearchVector(Value(taxonomy), config="simple", weight="C")
+                ),
+            )
+        else:
+            manager.filter(pk=book.pk).update(search_document=" ".join([title, author, taxonomy]))
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE book_id = %s", [book.pk.hex])
+                    cursor.execute(
+                        f"INSERT INTO {FTS_TABLE} (book_id, title, author, taxonomy) VALUES (%s, %s, %s, %s)",
+                        [book.pk.hex, title, author, taxonomy],
+                    )
+
+
+def unindex_book(book_id):
+    # Postgres keeps the vector on the book row itself
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE book_id = %s", [book_id.hex])
+
+
+def render_snippet(snippet):
+    """A search_snippet as HTML: the book's text escaped, matched words in <mark>."""
+    if snippet is None:
+        return None
+    return escape(snippet).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+
+def search_books(queryset, text):
+    """
+    Filter books by a search text, best matches first. Each book gets
+    search_rank and search_snippet (see render_snippet).
+    Every word must match; the last letters of a word may be missing.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    if connection.vendor == "postgresql":
+        return _search_postgres(queryset, text, terms)
+    return _search_sqlite(queryset, terms)
+
+
+def _search_postgres(queryset, text, terms):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+
+    query = SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config="simple")
+    # Both conditions are served by GIN indexes; the trigram one catches typos
+    return (
+        queryset
+        .filter(Q(search_vector=query) | Q(search_document__trigram_word_similar=text))
+        .annotate(
+            # ts_rank is a float4; as float8 the value survives a round trip through a page cursor.
+            # F(): given a bare name, SearchRank rebuilds the vector from text and loses the weights
+            search_rank=Cast(
+                SearchRank(F("search_vector"), query) + TrigramWordSimilarity(text, "search_document"),
+                FloatField(),
+            ),
+            search_snippet=SearchHeadline(
+                "search_document", query, config="simple",
+                start_sel=SNIPPET_START, stop_sel=SNIPPET_END, max_words=20, min_words=5,
+            ),
+        )
+        .order_by("-search_rank", "id")
+    )
+
+
+def _search_sqlite(queryset, terms):
+    match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    book_id = f'"{queryset.model._meta.db_table}"."id"'
+    # Correlated on the book row, so the caller's filters and the page limit
+    # apply before any ranking; snippets are only built for returned rows
+    fts_row = f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND book_id = {book_id}"
+    return (
+        queryset
+        .filter(pk__in=RawSQL(f"SELECT book_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+        .annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, 0, 10.0, 5.0, 1.0) {fts_row}", [match], output_field=FloatField(),
+            ),
+            search_snippet=RawSQL(
+                f"SELECT snippet({FTS_TABLE}, -1, %s, %s, '…', 16) {fts_row}",
+                [SNIPPET_START, SNIPPET_END, match], output_field=TextField(),
+            ),
+        )
+        .order_by("-search_rank", "id")
+    )
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.conf import settings
+from django.urls import reverse
 from comment.serializers import BookRatingSerializer, BookReviewSerializer
-from .models import GenreModel, BookModel, UserBookModel, CategoryModel
+from core.images import RenditionsField
+from .filters import BOOK_SORTS
+from .models import GenreModel, BookModel, UserBookModel, CategoryModel, BookLanguageChoices
+from .search import render_snippet
 
 
 def get_lang_from_request(request):
@@ -50,15 +54,34 @@ class CategorySerializer(serializers.ModelSerializer):
         return data
 
 
+class SnippetField(serializers.CharField):
+    def to_representation(self, value):
+        return render_snippet(value)
+
+
 class BookSerializer(serializers.ModelSerializer):
     genre = GenreSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     avg_rating = serializers.FloatField(read_only=True)
+    # Only present on search results
+    snippet = SnippetField(source="search_snippet", read_only=True)
+    # The file through the range-capable delivery endpoint
+    stream_url = serializers.SerializerMethodField()
+    image_renditions = RenditionsField("image")
 
     class Meta:
         model = BookModel
         fields = ["id", "author", "title", "description", "genre", "category", "year", "language", "pages", "image",
-                  "file", "youtube_url", "library_url", "store_url", "is_premium", "avg_rating"]
+                  "image_renditions", "file", "youtube_url", "library_url", "store_url", "is_premium", "avg_rating",
+                  "rating_count", "like_count", "review_count", "snippet", "stream_url"]
+        read_only_fields = ["rating_count", "like_count", "review_count"]
+
+    def get_stream_url(self, obj):
+        if not obj.file:
+            return None
+        url = reverse("library:book-file", kwargs={"pk": obj.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -66,16 +89,39 @@ class BookSerializer(serializers.ModelSerializer):
         lang, _ = get_lang_from_request(request)
         title_translated = getattr(instance, f"title_{lang}", None)
         author_translated = getattr(instance, f"author_{lang}", None)
-        description_translated = getattr(instance, f"description_{lang}", None)
         if title_translated:
             data["title"] = title_translated
         if author_translated:
             data["author"] = author_translated
-        if description_translated:
-            data["description"] = description_translated
+        if "description" in data:
+            description_translated = getattr(instance, f"description_{lang}", None)
+            if description_translated:
+                data["description"] = description_translated
         return data
 
 
+class BookListSerializer(BookSerializer):
+    # Catalog rows skip the description; the detail endpoint has it
+    class Meta(BookSerializer.Meta):
+        fields = [field for field in BookSerializer.Meta.fields if field != "description"]
+
+
+class BookListQuerySerializer(serializers.Serializer):
+    search = serializers.CharField(required=False, allow_blank=True)
+    category = serializers.UUIDField(required=False)
+    genre = serializers.UUIDField(required=False)
+    language = serializers.ChoiceField(choices=BookLanguageChoices.choices, required=False)
+    year_min = serializers.IntegerField(required=False)
+    year_max = serializers.IntegerField(required=False)
+    is_premium = serializers.BooleanField(required=False, allow_null=True)
+    sort = serializers.ChoiceField(
+        choices=[*BOOK_SORTS, "relevance"], required=False,
+        help_text="Defaults to relevance when searching, newest otherwise",
+    )
+    cursor = serializers.CharField(required=False, help_text="next_cursor of the previous page")
+    limit = serializers.IntegerField(required=False, help_text="Page size, at most 100")
+
+
 class BookDetailSerializer(BookSerializer):
     ratings = BookRatingSerializer(source="rating_book", many=True, read_only=True)
     reviews = BookReviewSerializer(source="review_book", many=True, read_only=True)
@@ -0,0 +1,83 @@
+import logging
+import threading
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.images import renditions_updated
+
+from .models import BookModel, CategoryModel, GenreModel
+from .response_cache import invalidate
+from .search import index_books, unindex_book
+
+logger = logging.getLogger(__name__)
+
+
+def _reindex_in_background(filters):
+    try:
+        books = BookModel.objects.select_related("genre", "category").filter(**filters).order_by("id")
+        index_books(books.iterator(chunk_size=500))
+        # Search results cached meanwhile were built from the old documents
+        invalidate("book_list")
+    except Exception:
+        logger.exception(f"Could not reindex books matching {filters}")
+    finally:
+        # The thread's own database connection
+        connection.close()
+
+
+def reindex_soon(**filters):
+    """
+    Reindex the matching books once the transaction commits, off the request
+    thread: a genre can have thousands. If the process dies first,
+    rebuild_book_search catches up.
+    """
+    transaction.on_commit(
+        lambda: threading.Thread(target=_reindex_in_background, args=(filters,), daemon=True).start()
+    )
+
+
+@receiver(post_save, sender=BookModel)
+def book_saved(sender, instance, **kwargs):
+    index_books([instance])
+
+
+@receiver(post_delete, sender=BookModel)
+def book_deleted(sender, instance, **kwargs):
+    unindex_book(instance.pk)
+
+
+@receiver(post_save, sender=GenreModel)
+def genre_saved(sender, instance, created, **kwargs):
+    if not created:
+        reindex_soon(genre=instance.pk)
+
+
+@receiver(post_save, sender=CategoryModel)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        reindex_soon(category=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=BookModel)
+def book_changed(sender, instance, **kwargs):
+    invalidate("book_list", f"book:{instance.pk}")
+
+
+@receiver([post_save, post_delete], sender=GenreModel)
+def genre_changed(sender, instance, **kwargs):
+    invalidate("genre", "book_list", "book_detail")
+
+
+@receiver([post_save, post_delete], sender=CategoryModel)
+def category_changed(sender, instance, **kwargs):
+    invalidate("category", "book_list", "book_detail")
+
+
+@receiver(renditions_updated, sender=BookModel)
+def book_renditions_updated(sender, instance, **kwargs):
+    if instance is None:
+        invalidate("book_list", "book_detail")
+    else:
+        invalidate("book_list", f"book:{instance.pk}")
@@ -1,3 +1,258 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from . import response_cache
+from .models import BookModel, CategoryModel, GenreModel
+from .pagination import MAX_PAGE_SIZE, encode_cursor
+from .response_cache import LOCAL_CACHE_TIMEOUT, invalidate
+from .signals import _reindex_in_background
+
+
+class BookTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = GenreModel.objects.create(name="Fantasy")
+        cls.category = CategoryModel.objects.create(name="Fiction")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def book(self, title, author="Anon", **fields):
+        fields = {"genre": self.genre, "category": self.category, "year": 2000, "pages": 100, **fields}
+        return BookModel.objects.create(
+            title=title, author=author, description="", image="book/image/cover.jpg", **fields,
+        )
+
+    def books(self, **params):
+        response = self.client.get("/api/v1/library/books/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+
+class BookSearchTests(BookTestCase):
+    def search(self, text):
+        return self.books(search=text)["results"]
+
+    def test_title_matches_rank_above_author_matches(self):
+        self.book("Notes", author="Dragon Smith")
+        self.book("Dragon Tales")
+
+        self.assertEqual([book["title"] for book in self.search("dragon")], ["Dragon Tales", "Notes"])
+
+    def test_the_last_word_may_be_a_prefix(self):
+        self.book("Dragon Tales")
+        self.book("Drama School")
+
+        self.assertEqual([book["title"] for book in self.search("drag")], ["Dragon Tales"])
+        self.assertEqual([book["title"] for book in self.search("tales drag")], ["Dragon Tales"])
+
+    def test_saving_a_book_reindexes_it(self):
+        book = self.book("Dragon Tales")
+        book.title = "Griffin Tales"
+        book.save()
+
+        self.assertEqual(self.search("dragon"), [])
+        self.assertEqual([result["id"] for result in self.search("griffin")], [str(book.pk)])
+
+    def test_renaming_a_genre_reindexes_its_books_after_commit(self):
+        book = self.book("Tales")
+        with mock.patch("library.signals.threading.Thread") as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.genre.name = "Mythology"
+                self.genre.save()
+        # Run what the thread would have, minus closing the test's connection
+        filters = thread.call_args.kwargs["args"][0]
+        with mock.patch("library.signals.connection"):
+            _reindex_in_background(filters)
+
+        self.assertEqual([result["id"] for result in self.search("mythology")], [str(book.pk)])
+
+    def test_snippet_escapes_the_book_text(self):
+        self.book("Tom & Jerry <img src=x onerror=alert(1)> Dragon")
+
+        [result] = self.search("tom")
+        self.assertNotIn("<img", result["snippet"])
+        self.assertIn("<mark>Tom</mark> &amp; Jerry", result["snippet"])
+
+
+class ResponseCacheTests(BookTestCase):
+    def titles(self):
+        return [book["title"] for book in self.books()["results"]]
+
+    def rename_quietly(self, book, title):
+        # No signals, as from a bulk update or another process
+        BookModel.objects.filter(pk=book.pk).update(title=title)
+
+    def test_a_repeat_request_is_served_from_the_cache(self):
+        book = self.book("Dragon Tales")
+        self.assertEqual(self.titles(), ["Dragon Tales"])
+
+        self.rename_quietly(book, "Griffin Tales")
+        self.assertEqual(self.titles(), ["Dragon Tales"])
+
+    def test_another_query_string_misses(self):
+        book = self.book("Dragon Tales")
+        self.titles()
+        self.rename_quietly(book, "Griffin Tales")
+
+        self.assertEqual([result["title"] for result in self.books(limit=5)["results"]], ["Griffin Tales"])
+
+    def test_saving_a_book_invalidates_the_list(self):
+        book = self.book("Dragon Tales")
+        self.titles()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = "Griffin Tales"
+            book.save()
+
+        self.assertEqual(self.titles(), ["Griffin Tales"])
+
+    def test_commands_that_write_without_signals_invalidate(self):
+        book = self.book("Dragon Tales")
+        self.titles()
+        self.rename_quietly(book, "Griffin Tales")
+        BookModel.objects.filter(pk=book.pk).update(like_count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("repair_book_counters", stdout=mock.Mock())
+
+        self.assertEqual(self.titles(), ["Griffin Tales"])
+
+    def test_rendition_backfill_invalidates_once(self):
+        book = self.book("Dragon Tales")
+        self.titles()
+        self.rename_quietly(book, "Griffin Tales")
+        with mock.patch("core.management.commands.generate_renditions.update_renditions") as update, \
+                mock.patch("library.signals.invalidate", wraps=invalidate) as invalidated, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command("generate_renditions", stdout=mock.Mock())
+
+        update.assert_any_call(book, "image", notify=False)
+        invalidated.assert_called_once_with("book_list", "book_detail")
+        self.assertEqual(self.titles(), ["Griffin Tales"])
+
+    def test_invalidation_reaches_only_its_scopes(self):
+        book = self.book("Dragon Tales")
+        self.titles()
+        self.rename_quietly(book, "Griffin Tales")
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate("genre")
+        self.assertEqual(self.titles(), ["Dragon Tales"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate("book_list")
+        self.assertEqual(self.titles(), ["Griffin Tales"])
+
+    def test_entries_expire_soon_without_a_shared_cache(self):
+        self.book("Dragon Tales")
+        with mock.patch.object(response_cache.cache, "set", wraps=cache.set) as cache_set:
+            self.titles()
+        self.assertEqual(cache_set.call_args.args[2], LOCAL_CACHE_TIMEOUT)
+
+        cache.clear()
+        with mock.patch.object(response_cache, "cache_is_shared", return_value=True), \
+                mock.patch.object(response_cache.cache, "set", wraps=cache.set) as cache_set:
+            self.titles()
+        self.assertEqual(cache_set.call_args.args[2], response_cache.CATALOG_CACHE_TIMEOUT)
+
+
+class BookPaginationTests(BookTestCase):
+    def walk(self, **params):
+        pages, cursor = [], None
+        while True:
+            page = self.books(**params, **({"cursor": cursor} if cursor else {}))
+            pages.append([book["title"] for book in page["results"]])
+            cursor = page["next_cursor"]
+            self.assertEqual(page["has_more"], cursor is not None)
+            if not cursor:
+                return pages
+
+    def test_pages_cross_equal_sort_keys_without_gaps_or_repeats(self):
+        books = [self.book(f"Book {i}", year=2000 + i % 2) for i in range(7)]
+        expected = [
+            book.title for book in sorted(books, key=lambda book: (book.year, book.id), reverse=True)
+        ]
+
+        pages = self.walk(sort="year", limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_ascending_sort(self):
+        books = [self.book(f"Book {i}", year=2000) for i in range(5)]
+        expected = [book.title for book in sorted(books, key=lambda book: book.id)]
+
+        self.assertEqual(sum(self.walk(sort="year_asc", limit=3), []), expected)
+
+    def test_created_at_ties(self):
+        books = [self.book(f"Book {i}") for i in range(5)]
+        BookModel.objects.update(created_at=books[0].created_at)
+        expected = [book.title for book in sorted(books, key=lambda book: book.id, reverse=True)]
+
+        self.assertEqual(sum(self.walk(limit=2), []), expected)
+
+    def test_limit_is_clamped(self):
+        for i in range(3):
+            self.book(f"Book {i}")
+
+        self.assertEqual(len(self.books(limit=0)["results"]), 1)
+        with mock.patch("library.pagination.MAX_PAGE_SIZE", 2):
+            self.assertEqual(len(self.books(limit=MAX_PAGE_SIZE)["results"]), 2)
+
+    def test_invalid_cursors(self):
+        for cursor in ["not-base64!", encode_cursor(["only one value"]), encode_cursor({"a": 1})]:
+            with self.subTest(cursor):
+                response = self.client.get("/api/v1/library/books/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class BookFacetTests(BookTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_genre = GenreModel.objects.create(name="Horror")
+
+    def setUp(self):
+        super().setUp()
+        self.book("A", language="en", year=1990)
+        self.book("B", language="en", year=2010, is_premium=True)
+        self.book("C", language="uz", year=2010, genre=self.other_genre)
+        self.book("D", language="ru", year=2020, genre=self.other_genre, is_premium=True)
+
+    def test_facets_of_the_whole_catalog(self):
+        facets = self.books()["facets"]
+
+        self.assertEqual({genre["name"]: genre["count"] for genre in facets["genre"]}, {"Fantasy": 2, "Horror": 2})
+        self.assertEqual(
+            {row["value"]: row["count"] for row in facets["language"]}, {"en": 2, "ru": 1, "uz": 1},
+        )
+        self.assertEqual(facets["is_premium"], {"true": 2, "false": 2})
+
+    def test_facets_follow_the_filters(self):
+        facets = self.books(year_min=2000, is_premium="false")["facets"]
+
+        self.assertEqual([(genre["name"], genre["count"]) for genre in facets["genre"]], [("Horror", 1)])
+        # Every language is listed, even those the filters leave empty
+        self.assertEqual(
+            {row["value"]: row["count"] for row in facets["language"]}, {"en": 0, "ru": 0, "uz": 1},
+        )
+        self.assertEqual(facets["is_premium"], {"true": 0, "false": 1})
+
+    def test_filters(self):
+        for params, titles in [
+            ({"genre": self.other_genre.pk}, {"C", "D"}),
+            ({"language": "en"}, {"A", "B"}),
+            ({"year_min": 2000, "year_max": 2010}, {"B", "C"}),
+            ({"is_premium": "true"}, {"B", "D"}),
+            ({"is_premium": "false", "category": self.category.pk}, {"A", "C"}),
+        ]:
+            with self.subTest(params):
+                self.assertEqual({book["title"] for book in self.books(**params)["results"]}, titles)
+
+    def test_only_the_first_page_has_facets(self):
+        first = self.books(limit=2)
+        self.assertIn("facets", first)
 
-# Create your tests here.
+        self.assertNotIn("facets", self.books(limit=2, cursor=first["next_cursor"]))
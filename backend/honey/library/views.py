@@ -1,15 +1,33 @@
-from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
 from rest_framework import status, viewsets
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from core.conditional import conditional_response
+from core.delivery import serve_file
 from .models import BookModel, UserBookModel, CategoryModel, GenreModel
+from .filters import BOOK_SORTS, book_facets, filter_books
+from .pagination import BookCursorPagination
+from .response_cache import cached_response
+from .search import search_books
 from .serializers import BookSerializer, UserBookSerializer, DownloadBookSerializer, BookDetailSerializer, \
-    CategorySerializer, GenreSerializer
+    CategorySerializer, GenreSerializer, BookListSerializer, BookListQuerySerializer
+
+
+def book_list_rows(request, **kwargs):
+    # The filtered catalog; a search only narrows it, so it needn't run here
+    params = BookListQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return None
+    return filter_books(BookModel.objects.all(), params.validated_data)
+
+
+def book_rows(request, pk=None, **kwargs):
+    # Ratings, reviews and likes touch the book's updated_at
+    return BookModel.objects.filter(pk=pk)
 
 
 class BookViewSet(viewsets.ViewSet):
@@ -38,68 +56,37 @@ class BookViewSet(viewsets.ViewSet):
 
     @swagger_auto_schema(
         operation_summary="List of books",
-        operation_description="Returns a list of books matching the search query by title, author, genre, and year. Sorted by created_at if no search is provided.",
-        manual_parameters=[
-            openapi.Parameter(
-                name="search",
-                in_=openapi.IN_QUERY,
-                type=openapi.TYPE_STRING,
-                description="Full-text search across title_* and author_* fields.",
-                required=False,
-            )
-        ],
-        responses={200: BookSerializer(many=True)},
+        operation_description="Paginated, filterable book catalog. search runs a full-text search across "
+                              "titles, authors, genres, categories and year; results carry a highlighted "
+                              "snippet. The first page also returns facet counts for the filtered catalog.",
+        query_serializer=BookListQuerySerializer,
+        responses={200: BookListSerializer(many=True)},
         tags=["Books"],
     )
+    @conditional_response(book_list_rows, related=("genre", "category"))
+    @cached_response("book_list")
     def list(self, request):
-        queryset = BookModel.objects.select_related("genre", "category").all()
-        search = request.query_params.get("search")
-        category_id = request.query_params.get("category")
-
-        # Category filter
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
+        params = BookListQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
 
-        # Full-text search
+        queryset = filter_books(BookModel.objects.select_related("genre", "category"), params)
+        search = params.get("search")
         if search:
-            tokens = [t.strip() for t in search.split() if t.strip()]
-            token_q = None
-            for token in tokens:
-                q_per_token = (
-                        Q(title_uz__icontains=token)
-                        | Q(title_ru__icontains=token)
-                        | Q(title_en__icontains=token)
-                        | Q(author_uz__icontains=token)
-                        | Q(author_ru__icontains=token)
-                        | Q(author_en__icontains=token)
-                        | Q(genre__name_uz__icontains=token)
-                        | Q(genre__name_ru__icontains=token)
-                        | Q(genre__name_en__icontains=token)
-                        | Q(category__name_uz__icontains=token)
-                        | Q(category__name_ru__icontains=token)
-                        | Q(category__name_en__icontains=token)
-                )
-                if token.isdigit():
-                    try:
-                        q_per_token |= Q(year=int(token))
-                    except ValueError:
-                        pass
-
-                if token_q is None:
-                    token_q = q_per_token
-                else:
-                    token_q &= q_per_token
-
-            if token_q is not None:
-                queryset = queryset.filter(token_q)
-
-        queryset = queryset.distinct()
-
-        if not search:
-            queryset = queryset.order_by("-created_at")
-
-        serializer = BookSerializer(queryset, many=True, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            queryset = search_books(queryset, search)
+
+        sort = params.get("sort") or ("relevance" if search else "newest")
+        if sort == "relevance" and not search:
+            return Response({"sort": "relevance requires search"}, status=status.HTTP_400_BAD_REQUEST)
+        ordering = "-search_rank" if sort == "relevance" else BOOK_SORTS[sort]
+
+        paginator = BookCursorPagination(request, ordering)
+        books = paginator.paginate_queryset(queryset.defer("description", "search_document", "search_vector"))
+        serializer = BookListSerializer(books, many=True, context={"request": request})
+        data = paginator.get_paginated_data(serializer.data)
+        if not paginator.cursor:
+            data["facets"] = book_facets(queryset)
+        return Response(data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="Retrieve a book",
@@ -110,6 +97,8 @@ class BookViewSet(viewsets.ViewSet):
         },
         tags=["Books"],
     )
+    @conditional_response(book_rows, related=("genre", "category"))
+    @cached_response("book_detail", "book:{pk}")
     def retrieve(self, request, pk=None):
         book = BookModel.objects.filter(id=pk).first()
         if not book:
@@ -122,6 +111,13 @@ class BookViewSet(viewsets.ViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@require_safe
+def book_file(request, pk):
+    """The book's PDF with Range support; a plain Django view so any Accept header is fine."""
+    book = get_object_or_404(BookModel.objects.only("file"), pk=pk)
+    return serve_file(request, book.file)
+
+
 class UserBookViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
@@ -189,7 +185,8 @@ class CategoryViewSet(viewsets.ViewSet):
         responses={200: CategorySerializer(many=True)},
         tags=["Categories"],
     )
-    @method_decorator(cache_page(60 * 15)) # Cache for 15 minutes
+    @conditional_response(lambda request: CategoryModel.objects.all())
+    @cached_response("category")
     def list(self, request):
         queryset = CategoryModel.objects.all()
         serializer = CategorySerializer(queryset, many=True, context={"request": request})
@@ -202,7 +199,8 @@ class GenreViewSet(viewsets.ViewSet):
         responses={200: GenreSerializer(many=True)},
         tags=["Genres"],
     )
-    @method_decorator(cache_page(60 * 15)) # Cache for 15 minutes
+    @conditional_response(lambda request: GenreModel.objects.all())
+    @cached_response("genre")
     def list(self, request):
         queryset = GenreModel.objects.all()
         serializer = GenreSerializer(queryset, many=True, context={"request": request})
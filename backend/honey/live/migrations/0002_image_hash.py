@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('live', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livesessionmodel',
+            name='cover_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
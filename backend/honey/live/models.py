@@ -13,6 +13,7 @@ class LiveSessionModel(BaseModel):
     streamer = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="streamed_sessions")
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.SCHEDULED)
     cover = models.ImageField(upload_to="live/covers/", null=True, blank=True)
+    cover_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     started_at = models.DateTimeField(null=True, blank=True)
     ended_at = models.DateTimeField(null=True, blank=True)
 
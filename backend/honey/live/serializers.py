@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from authentication.serializers import UserSerializer
+from core.images import RenditionsField
 from .models import LiveSessionModel, LiveParticipantModel, LiveChatMessageModel
 
 class LiveParticipantSerializer(serializers.ModelSerializer):
@@ -17,10 +18,11 @@ class LiveChatMessageSerializer(serializers.ModelSerializer):
 class LiveSessionSerializer(serializers.ModelSerializer):
     streamer = UserSerializer(read_only=True)
     participants_count = serializers.IntegerField(source="participants.count", read_only=True)
+    cover_renditions = RenditionsField("cover")
     
     class Meta:
         model = LiveSessionModel
         fields = [
             "id", "title", "description", "streamer", "status", 
-            "cover", "started_at", "ended_at", "participants_count", "created_at"
+            "cover", "cover_renditions", "started_at", "ended_at", "participants_count", "created_at"
         ]
@@ -1,7 +1,15 @@
 from django.contrib import admin
-from .models import VideoModel
+from .models import VideoModel, VideoTranscodeJobModel
 
 
 @admin.register(VideoModel)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('title', 'video')
+    list_display = ('title', 'video', 'processing_status')
+    list_filter = ('processing_status',)
+
+
+@admin.register(VideoTranscodeJobModel)
+class VideoTranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ('video', 'status', 'attempts', 'next_attempt_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('source', 'last_error')
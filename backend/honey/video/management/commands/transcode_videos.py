@@ -0,0 +1,138 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from video.models import VideoModel, VideoTranscodeJobModel
+from video.transcode import JobCancelled, TranscodeError, queue_untranscoded, transcode
+
+Status = VideoTranscodeJobModel.Status
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 60 * 60
+# A job's lease runs this long past one ffmpeg timeout, and is renewed at most
+# every RENEW_EVERY seconds between steps, so a live worker never loses it
+LEASE_MARGIN = 10 * 60
+RENEW_EVERY = 60
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class Command(BaseCommand):
+    help = "Transcode queued video uploads into HLS renditions with ffmpeg, one job at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-attempts", type=int, default=3)
+        parser.add_argument("--timeout", type=int, default=2 * 60 * 60,
+                            help="Seconds an ffmpeg run may take before it is killed.")
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Poll the queue every N seconds. 0 drains it once and exits.")
+        parser.add_argument("--queue-missing", action="store_true",
+                            help="First queue every upload that was never transcoded, e.g. from before the worker ran.")
+        parser.add_argument("--keep-days", type=int, default=7,
+                            help="Delete done and cancelled jobs finished more than N days ago.")
+
+    def handle(self, *args, **options):
+        self.max_attempts = options["max_attempts"]
+        self.timeout = options["timeout"]
+        if options["queue_missing"]:
+            self.stdout.write(f"Queued {queue_untranscoded()} videos")
+        while True:
+            self.purge(timedelta(days=options["keep_days"]))
+            done = failed = 0
+            while True:
+                job = self.claim()
+                if not job:
+                    break
+                if self.process(job):
+                    done += 1
+                elif job.status == Status.FAILED:
+                    failed += 1
+            if done or failed or not options["interval"]:
+                self.stdout.write(f"Transcoded {done} videos, {failed} failed")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def purge(self, keep):
+        # Failed jobs stay: their last_error is the only record of what went wrong
+        VideoTranscodeJobModel.objects.filter(
+            status__in=[Status.DONE, Status.CANCELLED], finished_at__lt=timezone.now() - keep,
+        ).delete()
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            job = (
+                VideoTranscodeJobModel.objects
+                .select_for_update(skip_locked=True)
+                .select_related("video")
+                # A running job past its lease belongs to a worker that died
+                .filter(status__in=[Status.PENDING, Status.RUNNING], next_attempt_at__lte=now)
+                .order_by("next_attempt_at")
+                .first()
+            )
+            if not job:
+                return None
+            # Due again if this worker dies; renew() keeps it while it lives
+            job.status = Status.RUNNING
+            job.next_attempt_at = now + self.lease()
+            job.attempts += 1
+            job.save(update_fields=["status", "next_attempt_at", "attempts", "updated_at"])
+        self.renewed_at = time.monotonic()
+        self.set_processing(job, VideoModel.Processing.PROCESSING)
+        return job
+
+    def lease(self):
+        return timedelta(seconds=self.timeout + LEASE_MARGIN)
+
+    def renew(self, job):
+        if time.monotonic() - self.renewed_at < RENEW_EVERY:
+            return
+        renewed = VideoTranscodeJobModel.objects.filter(
+            pk=job.pk, status=Status.RUNNING, attempts=job.attempts,
+        ).update(next_attempt_at=timezone.now() + self.lease(), updated_at=timezone.now())
+        if not renewed:
+            raise JobCancelled(job.source)
+        self.renewed_at = time.monotonic()
+
+    def set_processing(self, job, status):
+        # Leaves the video alone once a newer upload has replaced this job's;
+        # updated_at moves so the video list's ETag does too
+        VideoModel.objects.filter(pk=job.video_id, file=job.source).update(
+            processing_status=status, updated_at=timezone.now(),
+        )
+
+    def process(self, job):
+        try:
+            transcode(job, self.timeout, renew=lambda: self.renew(job))
+        except JobCancelled:
+            job.status = Status.CANCELLED
+        except (TranscodeError, OSError, ValueError) as e:
+            job.last_error = str(e)
+            self.stderr.write(f"Video {job.video_id} failed (attempt {job.attempts}): {e}")
+            if job.attempts >= self.max_attempts:
+                job.status = Status.FAILED
+                self.set_processing(job, VideoModel.Processing.FAILED)
+            else:
+                job.status = Status.PENDING
+                job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+                self.set_processing(job, VideoModel.Processing.PENDING)
+        else:
+            job.status = Status.DONE
+        if job.status != Status.PENDING:
+            job.finished_at = timezone.now()
+        # A newer upload may have cancelled the job meanwhile, or another worker
+        # taken it over; either way the outcome is no longer this worker's to write
+        saved = VideoTranscodeJobModel.objects.filter(
+            pk=job.pk, status=Status.RUNNING, attempts=job.attempts,
+        ).update(
+            status=job.status, next_attempt_at=job.next_attempt_at, last_error=job.last_error,
+            finished_at=job.finished_at, updated_at=timezone.now(),
+        )
+        return bool(saved) and job.status == Status.DONE
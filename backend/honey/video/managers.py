@@ -0,0 +1,28 @@
+from django.db import models
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def related_count(model):
+    # A correlated COUNT per row; joining likes and comments together would multiply them
+    rows = model.objects.filter(video=OuterRef("pk")).order_by().values("video").annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+class VideoQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        """Annotate likes_count, comments_count and the viewer's is_liked in the same query."""
+        from .models import VideoCommentModel, VideoLikeModel
+
+        if user is not None and user.is_authenticated:
+            is_liked = Exists(VideoLikeModel.objects.filter(video=OuterRef("pk"), user=user))
+        else:
+            is_liked = Value(False)
+        return self.annotate(
+            likes_count=related_count(VideoLikeModel),
+            comments_count=related_count(VideoCommentModel),
+            is_liked=is_liked,
+        )
+
+
+VideoManager = models.Manager.from_queryset(VideoQuerySet)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 00:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0007_video_transcoding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='videocommentmodel',
+            index=models.Index(fields=['video', 'created_at', 'id'], name='video_comment_created_idx'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from core.base import BaseModel
 from embed_video.fields import EmbedVideoField
 from authentication.models import UserModel
+from .managers import VideoManager
 
 
 class VideoCategoryModel(BaseModel):
@@ -17,14 +19,28 @@ class VideoCategoryModel(BaseModel):
 
 
 class VideoModel(BaseModel):
+    class Processing(models.TextChoices):
+        NONE = "none", "None"
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     category = models.ForeignKey(VideoCategoryModel, on_delete=models.SET_NULL, null=True, blank=True, related_name="videos")
     video = EmbedVideoField(blank=True, null=True)
     file = models.FileField(upload_to="videos/direct/", blank=True, null=True)
     cover = models.ImageField(upload_to="videos/covers/", blank=True, null=True)
+    cover_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     views = models.PositiveIntegerField(default=0)
     uploader = models.ForeignKey(UserModel, on_delete=models.SET_NULL, null=True, blank=True, related_name="uploaded_videos")
+    # HLS transcoding of the direct upload (see video.transcode)
+    processing_status = models.CharField(max_length=20, choices=Processing.choices, default=Processing.NONE)
+    hls_manifest = models.CharField(max_length=255, blank=True, default="", editable=False)
+    duration = models.FloatField(null=True, blank=True, editable=False)
+
+    objects = VideoManager()
 
     def __str__(self):
         return self.title
@@ -35,6 +51,35 @@ class VideoModel(BaseModel):
         verbose_name_plural = "Videos"
 
 
+class VideoTranscodeJobModel(BaseModel):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    video = models.ForeignKey(VideoModel, on_delete=models.CASCADE, related_name="transcode_jobs")
+    # The upload this job is for; a newer upload cancels the job
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "video_transcode_job"
+        verbose_name = "Video Transcode Job"
+        verbose_name_plural = "Video Transcode Jobs"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="video_transcode_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id} - {self.status}"
+
+
 class VideoLikeModel(BaseModel):
     user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="video_likes")
     video = models.ForeignKey(VideoModel, on_delete=models.CASCADE, related_name="likes")
@@ -58,6 +103,9 @@ class VideoCommentModel(BaseModel):
         db_table = "video_comment"
         verbose_name = "Video Comment"
         verbose_name_plural = "Video Comments"
+        indexes = [
+            models.Index(fields=["video", "created_at", "id"], name="video_comment_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.video.title}"
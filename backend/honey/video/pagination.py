@@ -0,0 +1,43 @@
+from django.db.models import Q
+
+from chat.pagination import decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class CommentCursorPagination:
+    """
+    Keyset pagination over (created_at, id), newest comments first.
+
+    ?cursor=<cursor>  the older comments after this cursor
+    ?limit=<n>        page size, capped at MAX_PAGE_SIZE
+    """
+
+    def __init__(self, request):
+        self.cursor = request.query_params.get("cursor")
+        self.limit = self.get_limit(request.query_params.get("limit"))
+
+    @staticmethod
+    def get_limit(value):
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset):
+        if self.cursor:
+            created_at, pk = decode_cursor(self.cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        page = list(queryset.order_by("-created_at", "-id")[:self.limit + 1])
+        self.has_more = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            "results": data,
+            "next_cursor": encode_cursor(self.page[-1]) if self.has_more else None,
+            "has_more": self.has_more,
+        }
@@ -1,6 +1,9 @@
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
 from .models import VideoModel, VideoLikeModel, VideoCategoryModel, VideoCommentModel
 from authentication.serializers import UserSerializer
+from core.images import RenditionsField
 
 class VideoCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,28 +22,60 @@ class VideoCommentSerializer(serializers.ModelSerializer):
 class VideoSerializer(serializers.ModelSerializer):
     video_embed = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
+    comments_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
-    comments = VideoCommentSerializer(many=True, read_only=True)
     uploader = UserSerializer(read_only=True)
+    stream_url = serializers.SerializerMethodField()
+    cover_renditions = RenditionsField('cover')
+    hls_url = serializers.SerializerMethodField()
 
     class Meta:
         model = VideoModel
         fields = [
             'id', 'title', 'description', 'video', 'video_embed', 
-            'file', 'cover', 'views', 'created_at', 'likes_count', 
-            'is_liked', 'category', 'category_name', 'comments', 'uploader'
+            'file', 'cover', 'cover_renditions', 'views', 'created_at', 'likes_count', 
+            'comments_count', 'is_liked', 'category', 'category_name', 'uploader', 'stream_url',
+            'processing_status', 'hls_url', 'duration'
         ]
+        read_only_fields = ['processing_status', 'duration']
 
     def get_video_embed(self, obj):
         if obj.video:
             return obj.video.url
         return None
 
+    def get_stream_url(self, obj):
+        if not obj.file:
+            return None
+        url = reverse('video:video-file', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_hls_url(self, obj):
+        # Adaptive stream of the direct upload, once transcoded
+        if obj.processing_status != VideoModel.Processing.READY or not obj.hls_manifest:
+            return None
+        url = default_storage.url(obj.hls_manifest)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    # The three stats below come from VideoModel.objects.with_stats() when
+    # listing; a single video (e.g. just created) is counted directly
+
     def get_likes_count(self, obj):
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.likes.count()
 
+    def get_comments_count(self, obj):
+        if hasattr(obj, 'comments_count'):
+            return obj.comments_count
+        return obj.comments.count()
+
     def get_is_liked(self, obj):
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return VideoLikeModel.objects.filter(user=request.user, video=obj).exists()
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import VideoModel
+from .transcode import HLS_DIR, delete_tree, queue_transcode
+
+
+def _file_name(instance):
+    # Read without the descriptor so a deferred file isn't fetched
+    value = instance.__dict__.get("file")
+    return getattr(value, "name", value) or ""
+
+
+@receiver(post_init, sender=VideoModel)
+def remember_video_file(sender, instance, **kwargs):
+    if "file" in instance.__dict__:
+        instance._loaded_file = _file_name(instance)
+
+
+@receiver(post_save, sender=VideoModel)
+def video_saved(sender, instance, created, update_fields=None, **kwargs):
+    if "file" not in instance.__dict__ or (update_fields is not None and "file" not in update_fields):
+        return
+    name = _file_name(instance)
+    if name == getattr(instance, "_loaded_file", ""):
+        return
+    instance._loaded_file = name
+    transaction.on_commit(lambda: queue_transcode(instance))
+
+
+@receiver(post_delete, sender=VideoModel)
+def video_deleted(sender, instance, **kwargs):
+    # Every HLS ladder ever published for the video lives under its own directory
+    prefix = f"{HLS_DIR}/{instance.pk}"
+    transaction.on_commit(lambda: delete_tree(prefix))
@@ -1,3 +1,337 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import UserModel
+from .management.commands import transcode_videos
+from .models import VideoModel, VideoTranscodeJobModel
+from .transcode import HLS_LADDER, JobCancelled, TranscodeError, hls_command, queue_transcode, queue_untranscoded
+from .view_counter import ViewCounter
+
+Status = VideoTranscodeJobModel.Status
+
+
+class VideoViewCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["video_views"].clear()
+        self.client = APIClient()
+        self.first = VideoModel.objects.create(title="First")
+        self.second = VideoModel.objects.create(title="Second")
+        # Long enough that only the test flushes
+        self.counter = ViewCounter(interval=3600)
+        self.addCleanup(self.stop_timer)
+
+    def stop_timer(self):
+        if self.counter._timer is not None:
+            self.counter._timer.cancel()
+
+    def views(self, video):
+        return VideoModel.objects.values_list("views", flat=True).get(pk=video.pk)
+
+    def post_play(self, video, **headers):
+        with mock.patch("video.views.view_counter", self.counter):
+            return self.client.post(f"/api/v1/video/videos/{video.pk}/view/", **headers)
+
+    def play(self, video, **headers):
+        response = self.post_play(video, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.data["counted"]
+
+    def test_repeat_plays_by_one_viewer_count_once(self):
+        self.assertTrue(self.play(self.first, HTTP_USER_AGENT="phone"))
+        self.assertFalse(self.play(self.first, HTTP_USER_AGENT="phone"))
+        self.assertTrue(self.play(self.first, HTTP_USER_AGENT="laptop"))
+        self.assertTrue(self.play(self.second, HTTP_USER_AGENT="phone"))
+
+        self.assertEqual(self.counter.pending(self.first.pk), 2)
+        self.assertEqual(self.counter.pending(self.second.pk), 1)
+
+    def test_dedup_keys_stay_out_of_the_default_cache(self):
+        user = UserModel.objects.create_user("viewer", "viewer@example.com", "pass", phone="+998904000000")
+        self.client.force_authenticate(user)
+        self.play(self.first)
+
+        key = f"video_view:{self.first.pk}:user:{user.pk}"
+        self.assertIsNotNone(caches["video_views"].get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_plays_are_rate_limited_per_address(self):
+        for index in range(59):
+            self.play(self.first, HTTP_USER_AGENT=f"agent {index}")
+        response = self.post_play(self.first, HTTP_USER_AGENT="agent 59")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        self.assertEqual(self.post_play(self.first, REMOTE_ADDR="10.0.0.2").status_code, 200)
+        self.assertEqual(self.counter.pending(self.first.pk), 60)
+
+    def test_views_are_buffered_until_a_flush(self):
+        self.counter.add(self.first.pk)
+        self.counter.add(self.first.pk)
+
+        self.assertEqual(self.views(self.first), 0)
+        self.assertIsNotNone(self.counter._timer)
+
+    def test_flush_writes_every_video_in_one_update(self):
+        self.counter.add(self.first.pk, 3)
+        self.counter.add(self.second.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(self.views(self.first), 3)
+        self.assertEqual(self.views(self.second), 1)
+        self.assertEqual(self.counter.pending(self.first.pk), 0)
+        self.assertIsNone(self.counter._timer)
+
+    def test_failed_flush_keeps_the_views_and_retries(self):
+        self.counter.add(self.first.pk, 2)
+        with mock.patch.object(QuerySet, "update", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.counter.flush()
+
+        self.assertEqual(self.counter.pending(self.first.pk), 2)
+        # Retried even if no other view comes in
+        self.assertIsNotNone(self.counter._timer)
+        self.counter.flush()
+        self.assertEqual(self.views(self.first), 2)
+
+
+def fake_run(command, timeout):
+    """Stands in for ffmpeg: writes what the HLS or poster run would."""
+    output = command[-1]
+    if output.endswith("index.m3u8"):
+        output_dir = os.path.dirname(os.path.dirname(output))
+        with open(os.path.join(output_dir, "master.m3u8"), "w") as file:
+            file.write("#EXTM3U\n")
+        for name in os.listdir(output_dir):
+            if os.path.isdir(os.path.join(output_dir, name)):
+                with open(os.path.join(output_dir, name, "index.m3u8"), "w") as file:
+                    file.write("#EXTM3U\n")
+    else:
+        with open(output, "wb") as file:
+            file.write(b"jpeg")
+    return b""
+
+
+class TranscodeTestMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, VIDEO_TRANSCODE_WORKER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for target, replacement in [
+            ("video.transcode.run", mock.Mock(side_effect=fake_run)),
+            ("video.transcode.probe", mock.Mock(return_value=(640, 360, 12.0, True))),
+        ]:
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.worker = transcode_videos.Command(stdout=mock.Mock(), stderr=mock.Mock())
+        self.worker.max_attempts = 2
+        self.worker.timeout = 60
+
+    def upload(self, video=None, name="clip.mp4"):
+        video = video or VideoModel(title="Clip")
+        video.file.save(name, ContentFile(b"video"), save=False)
+        video.save()
+        queue_transcode(video)
+        return video
+
+    def job(self, video):
+        return VideoTranscodeJobModel.objects.filter(video=video).latest("created_at")
+
+    def stored(self, path):
+        return default_storage.exists(path) and (
+            not os.path.isdir(default_storage.path(path)) or bool(os.listdir(default_storage.path(path)))
+        )
+
+
+class TranscodeJobTests(TranscodeTestMixin, TestCase):
+    def test_a_claimed_job_runs_to_ready(self):
+        video = self.upload()
+        job = self.worker.claim()
+        self.assertEqual(job.status, Status.RUNNING)
+        self.assertEqual(VideoModel.objects.get(pk=video.pk).processing_status, VideoModel.Processing.PROCESSING)
+        self.assertIsNone(self.worker.claim())
+
+        self.assertTrue(self.worker.process(job))
+        video.refresh_from_db()
+        self.assertEqual(self.job(video).status, Status.DONE)
+        self.assertEqual(video.processing_status, VideoModel.Processing.READY)
+        self.assertEqual(video.duration, 12.0)
+        self.assertTrue(default_storage.exists(video.hls_manifest))
+        self.assertTrue(default_storage.exists(video.cover.name))
+
+    def test_a_new_ladder_replaces_the_old_one(self):
+        video = self.upload()
+        self.worker.process(self.worker.claim())
+        first = VideoModel.objects.get(pk=video.pk).hls_manifest
+        queue_transcode(video)
+        self.worker.process(self.worker.claim())
+
+        second = VideoModel.objects.get(pk=video.pk).hls_manifest
+        self.assertNotEqual(first, second)
+        self.assertFalse(self.stored(first.rsplit("/", 1)[0]))
+        self.assertTrue(default_storage.exists(second))
+
+    def test_a_failed_run_is_retried_with_backoff_then_fails(self):
+        video = self.upload()
+        with mock.patch("video.transcode.run", side_effect=TranscodeError("bad input")):
+            self.assertFalse(self.worker.process(self.worker.claim()))
+            job = self.job(video)
+            self.assertEqual((job.status, job.last_error), (Status.PENDING, "bad input"))
+            self.assertGreater(job.next_attempt_at, timezone.now() + timedelta(seconds=40))
+            self.assertEqual(VideoModel.objects.get(pk=video.pk).processing_status, VideoModel.Processing.PENDING)
+            self.assertIsNone(self.worker.claim())
+
+            job.next_attempt_at = timezone.now()
+            job.save(update_fields=["next_attempt_at"])
+            self.assertFalse(self.worker.process(self.worker.claim()))
+
+        job = self.job(video)
+        self.assertEqual((job.status, job.attempts), (Status.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(VideoModel.objects.get(pk=video.pk).processing_status, VideoModel.Processing.FAILED)
+
+    def test_a_running_job_past_its_lease_is_claimed_again(self):
+        self.upload()
+        job = self.worker.claim()
+        VideoTranscodeJobModel.objects.filter(pk=job.pk).update(next_attempt_at=timezone.now())
+
+        again = self.worker.claim()
+        self.assertEqual((again.pk, again.attempts), (job.pk, 2))
+        # The first worker's outcome no longer counts
+        self.assertFalse(self.worker.process(job))
+        self.assertEqual(self.job(job.video).status, Status.RUNNING)
+
+    def test_a_new_upload_cancels_the_running_job(self):
+        video = self.upload()
+        job = self.worker.claim()
+
+        def upload_midway(command, timeout):
+            self.upload(VideoModel.objects.get(pk=video.pk), name="other.mp4")
+            return fake_run(command, timeout)
+
+        with mock.patch.object(transcode_videos, "RENEW_EVERY", 0), \
+                mock.patch("video.transcode.run", side_effect=upload_midway) as run:
+            self.assertFalse(self.worker.process(job))
+            with self.assertRaises(JobCancelled):
+                self.worker.renew(job)
+        # The renewal before the poster run stopped it
+        self.assertEqual(run.call_count, 1)
+
+        self.assertEqual(VideoTranscodeJobModel.objects.get(pk=job.pk).status, Status.CANCELLED)
+        self.assertEqual(self.job(video).status, Status.PENDING)
+        self.assertFalse(self.stored(f"videos/hls/{video.pk}"))
+
+    def test_a_source_replaced_before_publishing_leaves_no_output(self):
+        video = self.upload()
+        job = self.worker.claim()
+        replace = VideoModel.objects.filter(pk=video.pk)
+
+        def replace_midway(command, timeout):
+            replace.update(file="videos/direct/other.mp4")
+            return fake_run(command, timeout)
+
+        with mock.patch("video.transcode.run", side_effect=replace_midway):
+            self.assertFalse(self.worker.process(job))
+
+        self.assertEqual(VideoTranscodeJobModel.objects.get(pk=job.pk).status, Status.CANCELLED)
+        self.assertFalse(self.stored(f"videos/hls/{video.pk}"))
+        self.assertFalse(self.stored("videos/covers"))
+
+    def test_deleting_a_video_deletes_its_streams(self):
+        video = self.upload()
+        self.worker.process(self.worker.claim())
+        self.assertTrue(self.stored(f"videos/hls/{video.pk}"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            video.delete()
+        self.assertFalse(self.stored(f"videos/hls/{video.pk}"))
+
+    def test_finished_jobs_are_purged_after_the_keep_period(self):
+        video = self.upload()
+        self.worker.process(self.worker.claim())
+        failed = VideoTranscodeJobModel.objects.create(
+            video=video, source="old.mp4", status=Status.FAILED, finished_at=timezone.now() - timedelta(days=30),
+        )
+        self.worker.purge(timedelta(days=7))
+        self.assertEqual(VideoTranscodeJobModel.objects.count(), 2)
+
+        VideoTranscodeJobModel.objects.update(finished_at=timezone.now() - timedelta(days=8))
+        self.worker.purge(timedelta(days=7))
+        self.assertEqual(list(VideoTranscodeJobModel.objects.all()), [failed])
+
+    def test_without_a_worker_uploads_are_not_queued_until_asked(self):
+        with override_settings(VIDEO_TRANSCODE_WORKER=False):
+            video = self.upload()
+        self.assertFalse(VideoTranscodeJobModel.objects.exists())
+        self.assertEqual(video.processing_status, VideoModel.Processing.NONE)
+
+        self.assertEqual(queue_untranscoded(), 1)
+        self.assertEqual(queue_untranscoded(), 0)
+        self.assertEqual(self.job(video).source, video.file.name)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "SKIP LOCKED needs PostgreSQL")
+class TranscodeClaimLockTests(TranscodeTestMixin, TransactionTestCase):
+    def test_a_job_locked_by_another_worker_is_skipped(self):
+        self.upload()
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    VideoTranscodeJobModel.objects.select_for_update().get(status=Status.PENDING)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait(10)
+        try:
+            self.assertIsNone(self.worker.claim())
+        finally:
+            release.set()
+            holder.join()
+        self.assertIsNotNone(self.worker.claim())
+
+
+class HlsCommandTests(unittest.TestCase):
+    def value_after(self, command, flag):
+        return command[command.index(flag) + 1]
+
+    def test_every_rung_gets_its_own_video_and_audio_stream(self):
+        command = hls_command("in.mp4", "out", HLS_LADDER[:2], has_audio=True)
+
+        self.assertEqual(self.value_after(command, "-var_stream_map"), "v:0,a:0,name:240p v:1,a:1,name:360p")
+        self.assertEqual(command.count("0:a:0"), 2)
+        self.assertEqual(self.value_after(command, "-c:a:1"), "aac")
+        self.assertEqual(self.value_after(command, "-b:a:1"), "96k")
+        self.assertEqual(self.value_after(command, "-b:v:1"), "800k")
+        self.assertIn("[v1]scale=-2:360[v1out]", self.value_after(command, "-filter_complex"))
+
+    def test_silent_sources_map_no_audio(self):
+        command = hls_command("in.mp4", "out", HLS_LADDER[:2], has_audio=False)
+
+        self.assertEqual(self.value_after(command, "-var_stream_map"), "v:0,name:240p v:1,name:360p")
+        self.assertNotIn("0:a:0", command)
+        self.assertNotIn("-ac", command)
@@ -0,0 +1,258 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import VideoModel, VideoTranscodeJobModel
+
+# (name, height, video kbit/s, audio kbit/s); rungs taller than the source are skipped
+HLS_LADDER = (
+    ("240p", 240, 400, 64),
+    ("360p", 360, 800, 96),
+    ("480p", 480, 1400, 128),
+    ("720p", 720, 2800, 128),
+    ("1080p", 1080, 5000, 160),
+)
+SEGMENT_SECONDS = 6
+HLS_DIR = "videos/hls"
+MASTER_PLAYLIST = "master.m3u8"
+
+
+class TranscodeError(Exception):
+    pass
+
+
+class JobCancelled(TranscodeError):
+    """The job was cancelled, or claimed by another worker, while it ran."""
+
+
+class SourceReplaced(JobCancelled):
+    """The upload changed after the job was queued; a newer job handles it."""
+
+
+OPEN_STATUSES = [VideoTranscodeJobModel.Status.PENDING, VideoTranscodeJobModel.Status.RUNNING]
+
+
+def queue_transcode(video):
+    """
+    Cancel the video's queued and running jobs and, if a transcode_videos
+    worker runs (VIDEO_TRANSCODE_WORKER), queue one for its current upload.
+    The video stays at NONE, served as uploaded, until the worker claims it.
+    """
+    VideoTranscodeJobModel.objects.filter(video=video, status__in=OPEN_STATUSES).update(
+        status=VideoTranscodeJobModel.Status.CANCELLED, finished_at=timezone.now(),
+    )
+    video.processing_status = VideoModel.Processing.NONE
+    VideoModel.objects.filter(pk=video.pk).update(processing_status=video.processing_status, updated_at=timezone.now())
+    if not video.file or not settings.VIDEO_TRANSCODE_WORKER:
+        return None
+    return VideoTranscodeJobModel.objects.create(video=video, source=video.file.name)
+
+
+def queue_untranscoded():
+    """Queue a job for every upload still served as uploaded and not queued yet; returns how many."""
+    open_jobs = VideoTranscodeJobModel.objects.filter(video=OuterRef("pk"), status__in=OPEN_STATUSES)
+    videos = (
+        VideoModel.objects
+        .exclude(file="").exclude(file__isnull=True)
+        .filter(processing_status=VideoModel.Processing.NONE)
+        .exclude(Exists(open_jobs))
+    )
+    jobs = VideoTranscodeJobModel.objects.bulk_create([
+        VideoTranscodeJobModel(video_id=video_id, source=source)
+        for video_id, source in videos.values_list("pk", "file")
+    ])
+    return len(jobs)
+
+
+def run(command, timeout):
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout, check=False)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"{command[0]} timed out after {timeout}s")
+    except FileNotFoundError:
+        raise TranscodeError(f"{command[0]} is not installed")
+    if result.returncode:
+        raise TranscodeError(result.stderr.decode(errors="replace")[-2000:])
+    return result.stdout
+
+
+def probe(path, timeout):
+    """(width, height, duration, has audio) of a media file."""
+    output = run([
+        settings.FFPROBE_BINARY, "-v", "error", "-print_format", "json", "-show_streams", "-show_format", path,
+    ], timeout)
+    info = json.loads(output)
+    streams = info.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    if not video:
+        raise TranscodeError("No video stream")
+    has_audio = any(stream.get("codec_type") == "audio" for stream in streams)
+    duration = float(info.get("format", {}).get("duration") or video.get("duration") or 0)
+    return int(video["width"]), int(video["height"]), duration, has_audio
+
+
+def ladder_for(height):
+    rungs = [rung for rung in HLS_LADDER if rung[1] <= height]
+    return rungs or HLS_LADDER[:1]
+
+
+def hls_command(source, output_dir, rungs, has_audio):
+    """One ffmpeg run: decode once, scale per rung, segment every variant on the same keyframes."""
+    split = f"[0:v]split={len(rungs)}" + "".join(f"[v{index}]" for index in range(len(rungs)))
+    scales = [
+        # -2 keeps the aspect ratio with an even width, as H.264 requires
+        f"[v{index}]scale=-2:{height}[v{index}out]"
+        for index, (_, height, _, _) in enumerate(rungs)
+    ]
+    command = [
+        settings.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", "-i", source,
+        "-filter_complex", ";".join([split, *scales]),
+    ]
+    stream_map = []
+    for index, (name, _, video_rate, audio_rate) in enumerate(rungs):
+        command += [
+            "-map", f"[v{index}out]",
+            f"-c:v:{index}", "libx264", f"-b:v:{index}", f"{video_rate}k",
+            f"-maxrate:v:{index}", f"{video_rate * 107 // 100}k", f"-bufsize:v:{index}", f"{video_rate * 3 // 2}k",
+        ]
+        if has_audio:
+            command += ["-map", "0:a:0", f"-c:a:{index}", "aac", f"-b:a:{index}", f"{audio_rate}k"]
+            stream_map.append(f"v:{index},a:{index},name:{name}")
+        else:
+            stream_map.append(f"v:{index},name:{name}")
+    if has_audio:
+        command += ["-ac", "2"]
+    command += [
+        # Uploads may be 4:4:4 or 10-bit; players expect 8-bit 4:2:0
+        "-pix_fmt", "yuv420p", "-preset", "veryfast", "-profile:v", "main", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+        "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%05d.ts"),
+        "-master_pl_name", MASTER_PLAYLIST,
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_dir, "%v", "index.m3u8"),
+    ]
+    return command
+
+
+def poster_command(source, output, duration):
+    # A frame a little way in is more telling than the usual black first frame
+    offset = min(duration * 0.1, 10) if duration else 0
+    return [
+        settings.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{offset:.2f}", "-i", source,
+        "-frames:v", "1", "-q:v", "3", output,
+    ]
+
+
+def publish(local_dir, prefix, renew=None):
+    """Copy a directory tree into media storage under prefix."""
+    for root, _, files in os.walk(local_dir):
+        for name in files:
+            if renew:
+                renew()
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, local_dir).replace(os.sep, "/")
+            with open(path, "rb") as file:
+                default_storage.save(f"{prefix}/{relative}", File(file))
+
+
+def delete_tree(prefix):
+    try:
+        directories, files = default_storage.listdir(prefix)
+    except FileNotFoundError:
+        return
+    for name in files:
+        default_storage.delete(f"{prefix}/{name}")
+    for name in directories:
+        delete_tree(f"{prefix}/{name}")
+    try:
+        # Local storage keeps the emptied directories; remote storage has none
+        os.rmdir(default_storage.path(prefix))
+    except (NotImplementedError, OSError):
+        pass
+
+
+def local_copy(file, workdir):
+    """A local path of the stored upload, copying it out of remote storage if needed."""
+    try:
+        return file.path
+    except NotImplementedError:
+        path = os.path.join(workdir, "source" + os.path.splitext(file.name)[1])
+        with file.open("rb") as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        return path
+
+
+def transcode(job, timeout, renew=None):
+    """
+    Turn the job's upload into an HLS ladder plus a poster frame. Output goes
+    to a fresh directory per job, so a stream being watched is only replaced
+    once the new one is complete.
+
+    renew, if given, is called before every step and every published file to
+    extend the worker's lease on the job; it raises JobCancelled to stop.
+    """
+    renew = renew or (lambda: None)
+    video = job.video
+    if video.file.name != job.source:
+        raise SourceReplaced(job.source)
+
+    with tempfile.TemporaryDirectory(prefix="transcode-") as workdir:
+        renew()
+        source = local_copy(video.file, workdir)
+        renew()
+        _, height, duration, has_audio = probe(source, timeout)
+        output_dir = os.path.join(workdir, "hls")
+        rungs = ladder_for(height)
+        for name, _, _, _ in rungs:
+            os.makedirs(os.path.join(output_dir, name))
+        renew()
+        run(hls_command(source, output_dir, rungs, has_audio), timeout)
+        poster = os.path.join(workdir, "poster.jpg")
+        renew()
+        run(poster_command(source, poster, duration), timeout)
+
+        prefix = f"{HLS_DIR}/{video.pk}/{uuid.uuid4().hex[:12]}"
+        poster_name = None
+        try:
+            publish(output_dir, prefix, renew)
+            if not video.cover:
+                with open(poster, "rb") as file:
+                    poster_name = default_storage.save(f"videos/covers/{video.pk}.jpg", File(file))
+
+            with transaction.atomic():
+                video = VideoModel.objects.select_for_update().filter(pk=video.pk).first()
+                if not video or video.file.name != job.source:
+                    # Replaced or deleted while transcoding; a newer job, if any, takes over
+                    raise SourceReplaced(job.source)
+                previous = video.hls_manifest
+                video.hls_manifest = f"{prefix}/{MASTER_PLAYLIST}"
+                video.duration = duration or None
+                video.processing_status = VideoModel.Processing.READY
+                update_fields = ["hls_manifest", "duration", "processing_status", "updated_at"]
+                if poster_name and not video.cover:
+                    video.cover = poster_name
+                    update_fields.append("cover")
+                video.save(update_fields=update_fields)
+        except BaseException:
+            # Nothing refers to this job's output yet
+            delete_tree(prefix)
+            if poster_name:
+                default_storage.delete(poster_name)
+            raise
+    if poster_name and video.cover.name != poster_name:
+        # The video got a cover of its own meanwhile
+        default_storage.delete(poster_name)
+    if previous:
+        delete_tree(previous.rsplit("/", 1)[0])
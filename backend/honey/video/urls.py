@@ -1,12 +1,15 @@
 from django.urls import path
-from .views import VideoViewSet, VideoCategoryViewSet
+from .views import VideoViewSet, VideoCategoryViewSet, video_file
 
 app_name = "video"
 
 urlpatterns = [
     path("videos/", VideoViewSet.as_view({"get": "list", "post": "create"}), name="video-list"),
     path("videos/<uuid:pk>/", VideoViewSet.as_view({"delete": "destroy"}), name="video-detail"),
+    path("videos/<uuid:pk>/file/", video_file, name="video-file"),
     path("videos/<uuid:pk>/like/", VideoViewSet.as_view({"post": "like"}), name="video-like"),
     path("videos/<uuid:pk>/comment/", VideoViewSet.as_view({"post": "comment"}), name="video-comment"),
+    path("videos/<uuid:pk>/comments/", VideoViewSet.as_view({"get": "comments"}), name="video-comments"),
+    path("videos/<uuid:pk>/view/", VideoViewSet.as_view({"post": "view"}), name="video-view"),
     path("categories/", VideoCategoryViewSet.as_view({"get": "list", "post": "create"}), name="video-category-list"),
 ]
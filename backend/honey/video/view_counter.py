@@ -0,0 +1,114 @@
+import atexit
+import hashlib
+import logging
+import threading
+
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from authentication.ratelimit import SlidingWindowLimiter, client_ip
+
+from .models import VideoModel
+
+logger = logging.getLogger(__name__)
+
+# A viewer counts once per video in this window
+VIEW_DEDUP_WINDOW = 30 * 60
+# Buffered views reach the database at most this many seconds late
+FLUSH_INTERVAL = 10
+
+# Plays per client address; anonymous plays are cheap to fake
+view_limiter = SlidingWindowLimiter("video-view", limit=60, window=60)
+
+
+def viewer_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    # No session for anonymous API clients: address and browser stand in for one
+    raw = f"{client_ip(request)}|{request.headers.get('User-Agent', '')}"
+    return "anon:" + hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def is_new_view(video_id, viewer):
+    """
+    True the first time a viewer plays a video within the dedup window. The
+    keys live in their own cache, so a flood of them can't evict anything else.
+    """
+    return caches["video_views"].add(f"video_view:{video_id}:{viewer}", 1, VIEW_DEDUP_WINDOW)
+
+
+class ViewCounter:
+    """
+    Per-process buffer of video view increments.
+
+    Plays only touch memory; a timer writes everything buffered since the
+    last flush in one UPDATE, so a popular video's row is locked once per
+    interval instead of once per play. Buffered views are written at exit
+    too; a killed process loses at most one interval of them.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def add(self, video_id, count=1):
+        with self._lock:
+            self._pending[video_id] = self._pending.get(video_id, 0) + count
+            self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self, video_id):
+        with self._lock:
+            return self._pending.get(video_id, 0)
+
+    def flush(self):
+        """Write the buffered views; returns how many videos were updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            return VideoModel.objects.filter(pk__in=pending).update(
+                views=F("views") + Case(
+                    *[When(pk=video_id, then=Value(count)) for video_id, count in pending.items()],
+                    default=Value(0), output_field=IntegerField(),
+                ),
+                # Moves the video list's ETag, so new counts show up
+                updated_at=timezone.now(),
+            )
+        except Exception:
+            # Put them back for the next flush rather than lose them, and make
+            # sure there is one even if no other view comes in
+            with self._lock:
+                for video_id, count in pending.items():
+                    self._pending[video_id] = self._pending.get(video_id, 0) + count
+                self._schedule()
+            raise
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not flush video views")
+        finally:
+            # The timer thread's own connection
+            connection.close()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
@@ -1,4 +1,7 @@
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_safe
 from rest_framework import viewsets, status
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -6,8 +9,37 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from core.conditional import conditional_response
+from core.delivery import serve_file
 from .models import VideoModel, VideoLikeModel, VideoCategoryModel, VideoCommentModel
+from .pagination import CommentCursorPagination
 from .serializers import VideoSerializer, VideoCategorySerializer, VideoCommentSerializer
+from authentication.ratelimit import client_ip
+from .view_counter import is_new_view, view_counter, view_limiter, viewer_key
+
+
+def filter_videos(queryset, request):
+    search = request.query_params.get('search')
+    category = request.query_params.get('category')
+
+    if search:
+        queryset = queryset.filter(Q(title__icontains=search))
+
+    if category and category != 'Barchasi':
+        queryset = queryset.filter(category__name=category)
+    return queryset
+
+
+def touch_video(video_id):
+    # Likes and comments are part of the video's payload, and so of its ETag
+    VideoModel.objects.filter(pk=video_id).update(updated_at=timezone.now())
+
+
+@require_safe
+def video_file(request, pk):
+    """The uploaded video file with Range support, for seeking in the player."""
+    video = get_object_or_404(VideoModel.objects.only("file"), pk=pk)
+    return serve_file(request, video.file)
 
 
 class VideoCategoryViewSet(viewsets.ModelViewSet):
@@ -50,17 +82,13 @@ class VideoViewSet(viewsets.ViewSet):
         responses={200: VideoSerializer(many=True)},
         tags=["Videos"],
     )
+    @conditional_response(
+        lambda request: filter_videos(VideoModel.objects.all(), request),
+        related=("category", "uploader"), per_user=True,
+    )
     def list(self, request):
-        queryset = VideoModel.objects.select_related('uploader', 'category').all().order_by("-created_at")
-        search = request.query_params.get('search')
-        category = request.query_params.get('category')
-        
-        if search:
-            queryset = queryset.filter(Q(title__icontains=search))
-        
-        if category and category != 'Barchasi':
-            queryset = queryset.filter(category__name=category)
-            
+        queryset = VideoModel.objects.select_related('uploader', 'category').with_stats(request.user)
+        queryset = filter_videos(queryset, request).order_by("-created_at")
         serializer = VideoSerializer(queryset, many=True, context={"request": request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -87,12 +115,62 @@ class VideoViewSet(viewsets.ViewSet):
             return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
         
         like, created = VideoLikeModel.objects.get_or_create(user=request.user, video=video)
+        touch_video(video.pk)
         if not created:
             like.delete()
             return Response({"message": "Unliked", "is_liked": False}, status=status.HTTP_200_OK)
         
         return Response({"message": "Liked", "is_liked": True}, status=status.HTTP_201_CREATED)
 
+    @swagger_auto_schema(
+        operation_summary="Count a view",
+        operation_description=(
+            "Call when playback starts. Repeat plays by the same viewer within 30 minutes are not counted; "
+            "counted views reach the list within a few seconds."
+        ),
+        responses={200: "counted: whether this play was counted", 404: "Not found", 429: "Too many plays"},
+        tags=["Videos"],
+    )
+    @action(detail=True, methods=['post'])
+    def view(self, request, pk=None):
+        ip = client_ip(request)
+        blocked_for = view_limiter.blocked_for(ip) or view_limiter.hit(ip)
+        if blocked_for:
+            return Response(
+                {"detail": "Too many plays. Try again later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(blocked_for)},
+            )
+
+        video_id = VideoModel.objects.filter(pk=pk).values_list('pk', flat=True).first()
+        if not video_id:
+            return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        counted = is_new_view(video_id, viewer_key(request))
+        if counted:
+            view_counter.add(video_id)
+        return Response({"counted": counted}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Video comments",
+        operation_description="Newest first. Pass next_cursor back as ?cursor= for older comments.",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={200: VideoCommentSerializer(many=True), 404: "Not found"},
+        tags=["Videos"],
+    )
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        if not VideoModel.objects.filter(pk=pk).exists():
+            return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        paginator = CommentCursorPagination(request)
+        comments = paginator.paginate_queryset(VideoCommentModel.objects.filter(video_id=pk).select_related('user'))
+        serializer = VideoCommentSerializer(comments, many=True, context={"request": request})
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def comment(self, request, pk=None):
         video = VideoModel.objects.filter(pk=pk).first()
@@ -104,5 +182,6 @@ class VideoViewSet(viewsets.ViewSet):
             return Response({"detail": "Text is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         comment = VideoCommentModel.objects.create(video=video, user=request.user, text=text)
+        touch_video(video.pk)
         serializer = VideoCommentSerializer(comment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -31,6 +31,7 @@ export const API_ENDPOINTS = {
     AUTH: {
         REGISTER: "/api/v1/auth/register/",        // POST {username,email,phone,password,password_confirm}
         VERIFY_EMAIL: "/api/v1/auth/verify-email/",// POST {email,code}
+        RESEND_VERIFICATION: "/api/v1/auth/verify-email/resend/", // POST {email}
         LOGIN: "/api/v1/auth/login/",              // POST {username,password} → {access,refresh,user}
         LOGOUT: "/api/v1/auth/logout/",            // POST {refresh_token,access_token}
         REFRESH: "/api/v1/auth/token/refresh/",    // POST {refresh} → {access}
@@ -48,7 +49,7 @@ export const API_ENDPOINTS = {
 
     // --- Library ---
     LIBRARY: {
-        BOOKS: "/api/v1/library/books/",                          // GET ?search=&category=
+        BOOKS: "/api/v1/library/books/",                          // GET ?search=&category=&genre=&language=&year_min=&year_max=&is_premium=&sort=&cursor=&limit= → {results,next_cursor,has_more,facets}
         BOOK_DETAIL: (id: string) => `/api/v1/library/books/${id}/`,  // GET
         CATEGORIES: "/api/v1/library/categories/",                // GET
         GENRES: "/api/v1/library/genres/",                        // GET
@@ -88,6 +89,8 @@ export const API_ENDPOINTS = {
         DETAIL: (id: string) => `/api/v1/video/videos/${id}/`,
         LIKE: (id: string) => `/api/v1/video/videos/${id}/like/`,
         COMMENT: (id: string) => `/api/v1/video/videos/${id}/comment/`,
+        COMMENTS: (id: string) => `/api/v1/video/videos/${id}/comments/`, // GET ?cursor= → {results, next_cursor, has_more}
+        VIEW: (id: string) => `/api/v1/video/videos/${id}/view/`, // POST → {counted}
         CATEGORIES: "/api/v1/video/categories/",
     },
 
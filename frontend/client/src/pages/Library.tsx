@@ -5,13 +5,15 @@ interface Book {
    id: string;
    title: string;
    author: string;
-   description: string;
+   description?: string;
    genre?: { name: string };
    category?: { name: string };
    image?: string;
+   image_renditions?: Record<'webp' | 'jpg', Record<string, string>> | null;
    youtube_url?: string;
    library_url?: string;
    file?: string;
+   stream_url?: string | null;
    is_premium?: boolean;
    avg_rating?: number;
    year?: number;
@@ -26,9 +28,13 @@ interface UserBook {
    is_read: boolean;
 }
 
+// Katalog kartochkalari uchun kichik WebP nusxa, bo'lmasa asl rasm
+const coverUrl = (book: Book, width = '320') => book.image_renditions?.webp?.[width] || book.image;
+
 const Library: React.FC = () => {
    const user = JSON.parse(localStorage.getItem('honey_user') || 'null');
    const [books, setBooks] = useState<Book[]>([]);
+   const [nextCursor, setNextCursor] = useState<string | null>(null);
    const [userBooks, setUserBooks] = useState<UserBook[]>([]);
    const [categories, setCategories] = useState<{ id: number; name: string }[]>([]);
    const [isLoading, setIsLoading] = useState(true);
@@ -53,25 +59,41 @@ const Library: React.FC = () => {
    }, []);
 
    // Kitoblar
-   const fetchBooks = async (search = '', catId: number | null = null) => {
-      setIsLoading(true);
+   const fetchBooks = async (search = '', catId: number | null = null, cursor: string | null = null) => {
+      if (!cursor) setIsLoading(true);
       try {
          let url = `${API_BASE_URL}${API_ENDPOINTS.LIBRARY.BOOKS}`;
          const params = new URLSearchParams();
          if (search) params.append('search', search);
          if (catId) params.append('category', String(catId));
+         if (cursor) params.append('cursor', cursor);
          if (params.toString()) url += `?${params.toString()}`;
 
          const res = await fetch(url, { headers: authHeaders() });
          if (res.ok) {
             const data = await res.json();
-            setBooks(data.results || data);
+            const page = data.results || data;
+            setBooks(prev => cursor ? [...prev, ...page] : page);
+            setNextCursor(data.next_cursor || null);
          }
       } catch { /* offline */ } finally {
          setIsLoading(false);
       }
    };
 
+   // Katalog qatorlarida tavsif yo'q, uni kitob ochilganda olamiz
+   const openBook = async (book: Book) => {
+      setSelectedBook(book);
+      if (book.description !== undefined) return;
+      try {
+         const res = await fetch(`${API_BASE_URL}${API_ENDPOINTS.LIBRARY.BOOK_DETAIL(book.id)}`, { headers: authHeaders() });
+         if (res.ok) {
+            const detail = await res.json();
+            setSelectedBook(current => current && current.id === book.id ? { ...current, ...detail } : current);
+         }
+      } catch { /* offline */ }
+   };
+
    // Mening kitoblarim
    const fetchUserBooks = async () => {
       try {
@@ -249,10 +271,10 @@ const Library: React.FC = () => {
                ) : (
                   <div className="grid grid-cols-2 md:grid-cols-4 lg:grid-cols-5 gap-8">
                      {books.map((book) => (
-                        <div key={book.id} onClick={() => setSelectedBook(book)} className="group cursor-pointer">
+                        <div key={book.id} onClick={() => openBook(book)} className="group cursor-pointer">
                            <div className="aspect-[3/4] rounded-2xl sm:rounded-[2.5rem] overflow-hidden mb-3 md:mb-6 glass-premium relative group-hover:scale-[1.03] transition-all duration-700 shadow-2xl bg-white/5">
                               {book.image ? (
-                                 <img src={book.image} className="w-full h-full object-cover opacity-80 group-hover:opacity-100 transition-opacity" alt={book.title} />
+                                 <img src={coverUrl(book)} loading="lazy" className="w-full h-full object-cover opacity-80 group-hover:opacity-100 transition-opacity" alt={book.title} />
                               ) : (
                                  <div className="w-full h-full flex items-center justify-center">
                                     <i className="fas fa-book text-4xl text-honey/30"></i>
@@ -267,12 +289,12 @@ const Library: React.FC = () => {
                               <div className="absolute top-2 md:top-4 right-2 md:right-4 bg-honey text-white px-2 md:px-3 py-0.5 rounded-md text-[6px] md:text-[8px] font-black uppercase">
                                  {book.genre?.name || 'Kitob'}
                               </div>
-                              {book.avg_rating && (
+                              {book.avg_rating ? (
                                  <div className="absolute bottom-2 md:bottom-4 left-2 md:left-4 flex items-center gap-1 md:gap-2">
                                     <i className="fas fa-star text-honey text-[8px] md:text-[10px]"></i>
                                     <span className="text-[8px] md:text-[10px] font-black text-white">{book.avg_rating.toFixed(1)}</span>
                                  </div>
-                              )}
+                              ) : null}
                            </div>
                            <h4 className="font-black text-xs md:text-lg text-white group-hover:text-honey transition-colors uppercase tracking-tight truncate px-1 leading-tight">{book.title}</h4>
                            <p className="text-gray-500 text-[7px] md:text-[10px] font-black uppercase tracking-widest mt-1 md:mt-2 px-1 opacity-60">{book.author}</p>
@@ -280,6 +302,13 @@ const Library: React.FC = () => {
                      ))}
                   </div>
                )}
+               {!isLoading && nextCursor && (
+                  <div className="flex justify-center mt-12">
+                     <button onClick={() => fetchBooks(searchTerm, selectedCategory, nextCursor)} className="bg-white/5 text-white px-12 py-5 uppercase tracking-widest text-xs rounded-2xl font-black hover:bg-honey transition-colors">
+                        Ko'proq ko'rsatish
+                     </button>
+                  </div>
+               )}
             </>
          ) : (
             // Mening kitoblarim
@@ -299,7 +328,7 @@ const Library: React.FC = () => {
                         <div className="aspect-[3/4] rounded-2xl sm:rounded-[2.5rem] overflow-hidden mb-3 glass-premium relative shadow-2xl bg-white/5">
                            {ub.book.image ? (
                               <img
-                                 src={ub.book.image}
+                                 src={coverUrl(ub.book)}
                                  className="w-full h-full object-cover opacity-80 cursor-pointer"
                                  alt={ub.book.title}
                                  onClick={() => setSelectedBook(ub.book)}
@@ -341,7 +370,7 @@ const Library: React.FC = () => {
 
                   <div className="w-full lg:w-96 aspect-[3/4] rounded-2xl sm:rounded-[3rem] overflow-hidden shadow-2xl border border-white/10 shrink-0 bg-white/5">
                      {selectedBook.image ? (
-                        <img src={selectedBook.image} className="w-full h-full object-cover" alt={selectedBook.title} />
+                        <img src={coverUrl(selectedBook, '640')} className="w-full h-full object-cover" alt={selectedBook.title} />
                      ) : (
                         <div className="w-full h-full flex items-center justify-center">
                            <i className="fas fa-book text-6xl text-honey/30"></i>
@@ -399,7 +428,7 @@ const Library: React.FC = () => {
                         {/* O'qish/ko'rish havolasi */}
                         {(selectedBook.library_url || selectedBook.file) && (
                            <a
-                              href={selectedBook.file || selectedBook.library_url}
+                              href={selectedBook.stream_url || selectedBook.file || selectedBook.library_url}
                               target="_blank"
                               rel="noreferrer"
                               className="flex-1 sm:flex-none bg-cyan-500 text-black font-black px-6 sm:px-10 py-4 sm:py-5 rounded-xl sm:rounded-2xl flex items-center justify-center gap-3 shadow-xl hover:scale-105 transition-all text-[10px] sm:text-xs"
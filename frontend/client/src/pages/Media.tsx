@@ -15,13 +15,17 @@ interface BackendVideo {
   video: string;
   video_embed: string;
   file: string;
+  stream_url?: string | null;
   cover: string;
+  cover_renditions?: Record<'webp' | 'jpg', Record<string, string>> | null;
   views: number;
   likes_count: number;
   is_liked: boolean;
   category_name: string;
-  comments: any[];
+  comments_count: number;
   uploader?: { username: string; avatar?: string };
+  hls_url?: string | null;
+  duration?: number | null;
 }
 
 interface Video {
@@ -31,6 +35,7 @@ interface Video {
   url: string;
   embedUrl: string;
   file?: string;
+  hlsUrl?: string;
   thumbnail: string;
   duration: string;
   likes: number;
@@ -38,17 +43,49 @@ interface Video {
   views: string;
   category: string;
   description: string;
-  comments: any[];
+  commentsCount: number;
   uploaderAvatar?: string;
   uploaderName?: string;
 }
 
+// Safari va iOS HLS'ni o'zi o'ynatadi; boshqalarga oddiy fayl beriladi
+const canPlayHls = typeof document !== 'undefined'
+  && document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+
+const formatDuration = (seconds?: number | null) => {
+  if (!seconds) return '';
+  const total = Math.round(seconds);
+  const m = Math.floor(total / 60);
+  const s = total % 60;
+  return `${m}:${s.toString().padStart(2, '0')}`;
+};
+
 const CATEGORIES = ['Barchasi', 'Dizayn', 'Dasturlash', 'Biznes', 'Marketing', 'Psixologiya'];
 
 // --- Video Comments Component ---
-const VideoComments: React.FC<{ videoId: string; comments: any[]; onCommentAdded: () => void }> = ({ videoId, comments, onCommentAdded }) => {
+const VideoComments: React.FC<{ videoId: string; count: number; onCommentAdded: () => void }> = ({ videoId, count, onCommentAdded }) => {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [comments, setComments] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+
+  // Fikrlar sahifalab yuklanadi: eng yangilari birinchi
+  const loadComments = async (cursor: string | null = null) => {
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`${API_BASE_URL}${API_ENDPOINTS.VIDEO.COMMENTS(videoId)}${query}`);
+      if (res.ok) {
+        const data = await res.json();
+        setComments(prev => cursor ? [...prev, ...data.results] : data.results);
+        setNextCursor(data.next_cursor);
+      }
+    } catch (e) { }
+  };
+
+  useEffect(() => {
+    setComments([]);
+    loadComments();
+  }, [videoId]);
 
   const handleSend = async () => {
     if (!input.trim()) return;
@@ -64,6 +101,7 @@ const VideoComments: React.FC<{ videoId: string; comments: any[]; onCommentAdded
       });
       if (res.ok) {
         setInput('');
+        loadComments();
         onCommentAdded();
       }
     } catch (e) { } finally { setLoading(false); }
@@ -73,7 +111,7 @@ const VideoComments: React.FC<{ videoId: string; comments: any[]; onCommentAdded
     <div className="glass p-6 sm:p-12 rounded-[2rem] sm:rounded-[4rem] border border-white/10 flex flex-col h-[600px]">
       <h3 className="text-2xl font-black text-white uppercase tracking-tighter mb-8 flex items-center gap-3">
         <i className="fas fa-comments text-honey"></i>
-        FIKRLAR ({comments.length})
+        FIKRLAR ({Math.max(count, comments.length)})
       </h3>
       <div className="flex-1 overflow-y-auto custom-scrollbar space-y-6 mb-6 pr-2">
         {comments.length === 0 ? (
@@ -94,6 +132,14 @@ const VideoComments: React.FC<{ videoId: string; comments: any[]; onCommentAdded
             </div>
           ))
         )}
+        {nextCursor && (
+          <button
+            onClick={() => loadComments(nextCursor)}
+            className="w-full text-honey font-black uppercase text-[10px] py-3"
+          >
+            Ko'proq ko'rsatish
+          </button>
+        )}
       </div>
       <div className="flex gap-4 p-2 bg-white/5 rounded-2xl border border-white/10 focus-within:border-honey/50 transition-all">
         <input
@@ -169,15 +215,16 @@ const Media: React.FC = () => {
             channel: 'Honey Academy',
             url: v.video || '',
             embedUrl: v.video_embed || (yid ? `https://www.youtube.com/embed/${yid}` : ''),
-            file: v.file,
-            thumbnail: v.cover || '',
-            duration: '12:00',
+            file: v.stream_url || v.file,
+            hlsUrl: v.hls_url || undefined,
+            thumbnail: v.cover_renditions?.webp?.['640'] || v.cover || '',
+            duration: formatDuration(v.duration),
             likes: v.likes_count || 0,
             isLiked: v.is_liked || false,
             views: v.views >= 1000 ? (v.views / 1000).toFixed(1) + 'K' : v.views.toString(),
             category: v.category_name || 'Barchasi',
             description: v.description || "",
-            comments: v.comments || [],
+            commentsCount: v.comments_count || 0,
             uploaderAvatar: v.uploader?.avatar,
             uploaderName: v.uploader?.username
           };
@@ -204,6 +251,16 @@ const Media: React.FC = () => {
     fetchVideos();
   }, []);
 
+  // Ko'rishni hisoblash: server bir tomoshabinni 30 daqiqada bir marta sanaydi
+  useEffect(() => {
+    if (!selectedVideo) return;
+    const token = getAuthToken();
+    fetch(`${API_BASE_URL}${API_ENDPOINTS.VIDEO.VIEW(selectedVideo.id)}`, {
+      method: 'POST',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    }).catch(err => console.error(err));
+  }, [selectedVideo?.id]);
+
   const handleCommentAdded = () => {
     fetchVideos();
   };
@@ -306,7 +363,7 @@ const Media: React.FC = () => {
               <div className="absolute inset-0 border border-honey/40 rounded-2xl sm:rounded-[4rem] z-10 pointer-events-none"></div>
               {selectedVideo.file ? (
                 <video
-                  src={selectedVideo.file}
+                  src={canPlayHls && selectedVideo.hlsUrl ? selectedVideo.hlsUrl : selectedVideo.file}
                   controls
                   autoPlay
                   className="w-full h-full relative z-0"
@@ -352,7 +409,7 @@ const Media: React.FC = () => {
               </div>
             </div>
 
-            <VideoComments videoId={selectedVideo.id} comments={selectedVideo.comments} onCommentAdded={handleCommentAdded} />
+            <VideoComments videoId={selectedVideo.id} count={selectedVideo.commentsCount} onCommentAdded={handleCommentAdded} />
           </div>
 
           <div>
@@ -116,7 +116,10 @@ const Messenger: React.FC = () => {
       });
       if (res.ok) {
         const data = await res.json();
-        setChatMessages(data.results || data);
+        const users = data.users || {};
+        setChatMessages((data.results || data).map((m: any) => (
+          typeof m.sender === 'string' ? { ...m, sender: users[m.sender] || { id: m.sender, username: '' } } : m
+        )));
       }
     } catch { /* offline */ } finally {
       setChatMessagesLoading(false);